@@ -1,22 +1,149 @@
+import importlib.util
 import os
+import time
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from Release.charts import CHART_FORMAT, render_line_chart
+from Release.storage import get_output_paths
 
 # ------------------- Utility Functions ------------------- #
 
+# Candidate formats tried against a sample of the date column, most common first.
+# 'ISO8601' lets pandas take its fast path for every ISO variant at once.
+DATE_FORMATS = [
+    'ISO8601',
+    '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d',
+    '%m-%d-%Y', '%d-%m-%Y', '%d.%m.%Y',
+    '%m/%d/%y', '%d/%m/%y',
+    '%m/%d/%Y %H:%M', '%d/%m/%Y %H:%M', '%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S',
+    '%Y%m%d', '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y', '%b %Y', '%B %Y',
+]
+DATE_SAMPLE_SIZE = 500
+# A UTC offset following a time of day. Offsets are dropped rather than
+# applied: "2023-01-06T23:30-05:00" is a sale on the 6th, not the 7th.
+# Arrow-backed strings make the offset regex and the strip ~20x faster.
+TEXT_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else 'string'
+UTC_OFFSET_PATTERN = r'(\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)\s*(?:Z|UTC|GMT|[+-]\d{2}(?::?\d{2})?)$'
+
+# Header fragments used to find the columns the analysis needs.
+DATE_COLUMNS = ['date', 'timestamp', 'order date', 'sale date']
+SALES_COLUMNS = ['sales', 'revenue', 'amount', 'total']
+EXPENSE_COLUMNS = ['expenses', 'cost', 'spend', 'expenditure']
+
+
 def try_parse_date(date):
     try:
-        return pd.to_datetime(date, errors='coerce', infer_datetime_format=True)
+        return pd.to_datetime(date, errors='coerce')
     except Exception as e:
         print(f"❌ Error parsing date '{date}': {e}")
         return None
 
+
+def _to_naive(parsed):
+    # Drop the zone but keep the wall time, so a sale stays on its local day
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        return parsed.dt.tz_localize(None)
+    return parsed
+
+
+def _strip_offsets(values):
+    """Remove a trailing UTC offset (Z, +05:00, -0500) after a time of day, keeping the local wall time."""
+    return values.str.replace(UTC_OFFSET_PATTERN, r'\1', regex=True)
+
+
+def _parse_with_format(values, fmt):
+    try:
+        return _to_naive(pd.to_datetime(values, format=fmt, errors='coerce'))
+    except (ValueError, TypeError):
+        # Anything pandas refuses to vectorize is left to the per-value fallback.
+        return pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+
+
+def detect_date_formats(values, sample_size=DATE_SAMPLE_SIZE):
+    """Return the formats that match a sample of the values, best match first."""
+    sample = values.dropna()
+    sample = sample[sample != ''].head(sample_size)
+    if sample.empty:
+        return []
+    hits = {}
+    for fmt in DATE_FORMATS:
+        matched = int(_parse_with_format(sample, fmt).notna().sum())
+        if matched:
+            hits[fmt] = matched
+            if matched == len(sample):
+                break
+    # Stable sort keeps DATE_FORMATS order for ties (e.g. month-first before day-first).
+    return sorted(hits, key=hits.get, reverse=True)
+
+
+def parse_dates(column: pd.Series, formats=None):
+    """
+    Parse a whole date column at once.
+
+    The format is detected from a sample and applied to the full column in one
+    vectorized pass; other detected formats are tried on the rows that are
+    still missing, and only what is left goes through per-value parsing
+    (once per distinct value). formats, if given, are tried before detection
+    runs, which lets chunked readers reuse what earlier chunks found. Returns
+    the parsed column and a stats dict with the row counts and the formats
+    that were found, plus the seconds spent. Timestamps keep their own wall
+    time: UTC offsets and zones are dropped, not converted.
+    """
+    start = time.perf_counter()
+    stats = {'rows': len(column), 'parsed': 0, 'dropped': 0, 'formats': {}, 'fallback': 0}
+
+    if pd.api.types.is_datetime64_any_dtype(column):
+        parsed = _to_naive(column)
+        stats['formats']['datetime'] = int(parsed.notna().sum())
+    elif pd.api.types.is_numeric_dtype(column):
+        parsed = pd.to_datetime(column, errors='coerce')
+        stats['formats']['numeric'] = int(parsed.notna().sum())
+    else:
+        values = _strip_offsets(column.astype(TEXT_DTYPE).str.strip())
+        parsed = pd.Series(pd.NaT, index=column.index, dtype='datetime64[ns]')
+        pending = values.notna() & (values != '')
+
+        def apply_format(fmt):
+            attempt = _parse_with_format(values[pending], fmt)
+            matched = attempt.notna()
+            if matched.any():
+                parsed[attempt.index[matched]] = attempt[matched]
+                stats['formats'][fmt] = int(matched.sum())
+                pending[attempt.index[matched]] = False
+
+        tried = set()
+        for fmt in formats or []:
+            if not pending.any():
+                break
+            apply_format(fmt)
+            tried.add(fmt)
+
+        if pending.any():
+            for fmt in detect_date_formats(values[pending]):
+                if not pending.any():
+                    break
+                if fmt not in tried:
+                    apply_format(fmt)
+
+        if pending.any():
+            leftovers = values[pending]
+            lookup = {}
+            for value in leftovers.unique():
+                result = try_parse_date(value)
+                if result is not None and not pd.isna(result):
+                    lookup[value] = result.tz_localize(None) if result.tzinfo else result
+            if lookup:
+                recovered = pd.to_datetime(leftovers.map(lookup), errors='coerce')
+                recovered = recovered.dropna()
+                parsed[recovered.index] = recovered
+                stats['fallback'] = len(recovered)
+                stats['formats']['fallback'] = len(recovered)
+
+    stats['parsed'] = int(parsed.notna().sum())
+    stats['dropped'] = stats['rows'] - stats['parsed']
+    stats['seconds'] = time.perf_counter() - start
+    return parsed, stats
+
 def map_column(possible_names, df_columns):
     for name in possible_names:
         for col in df_columns:
@@ -24,171 +151,592 @@ def map_column(possible_names, df_columns):
                 return col
     return None
 
-def get_output_paths():
-    date_str = datetime.today().strftime('%Y-%m-%d')
-    report_dir = f'reports/{date_str}'
-    chart_dir = f'charts/{date_str}'
-    os.makedirs(report_dir, exist_ok=True)
-    os.makedirs(chart_dir, exist_ok=True)
-    return report_dir, chart_dir
+def find_columns(names, warn=True):
+    """
+    Map the date, sales and expense columns onto a header.
 
-# ------------------- Data Preprocessing ------------------- #
-
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [col.strip().lower() for col in df.columns]
-
-    date_col = map_column(['date', 'timestamp', 'order date', 'sale date'], df.columns)
-    sales_col = map_column(['sales', 'revenue', 'amount', 'total'], df.columns)
-    expenses_col = map_column(['expenses', 'cost', 'spend', 'expenditure'], df.columns)
+    Returns the original names (date, sales, expenses); expenses is None when
+    the file has no expense column. Raises ValueError if date or sales is missing.
+    """
+    names = list(names)
+    normalized = [str(name).strip().lower() for name in names]
+    date_col = map_column(DATE_COLUMNS, normalized)
+    sales_col = map_column(SALES_COLUMNS, normalized)
+    expenses_col = map_column(EXPENSE_COLUMNS, normalized)
 
     if not date_col:
         raise ValueError("❌ Could not detect a valid 'Date' column.")
     if not sales_col:
         raise ValueError("❌ Could not detect a valid 'Sales' column.")
-    if not expenses_col:
+    if not expenses_col and warn:
         print("⚠️ Expenses column not found. Defaulting to 0.")
 
-    df[date_col] = df[date_col].apply(try_parse_date)
+    def original(col):
+        return names[normalized.index(col)] if col else None
+
+    return original(date_col), original(sales_col), original(expenses_col)
+
+# ------------------- Data Preprocessing ------------------- #
+
+def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
+    # A shallow copy is enough: columns are only replaced or added, never
+    # written in place, so the caller's frame is left untouched
+    df = df.copy(deep=False)
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    date_col, sales_col, expenses_col = find_columns(df.columns)
+
+    df[date_col], parse_stats = parse_dates(df[date_col])
     df.dropna(subset=[date_col], inplace=True)
+    df.attrs['date_parse'] = parse_stats
+
+    formats = ', '.join(f"{fmt} ({count})" for fmt, count in parse_stats['formats'].items()) or 'none'
+    print(f"📅 Parsed {parse_stats['parsed']} of {parse_stats['rows']} dates, "
+          f"dropped {parse_stats['dropped']}. Formats: {formats}")
 
     df.sort_values(by=date_col, inplace=True)
     df['sales'] = pd.to_numeric(df[sales_col], errors='coerce').fillna(0)
-    df['expenses'] = pd.to_numeric(df.get(expenses_col, 0), errors='coerce').fillna(0)
+    df['expenses'] = pd.to_numeric(df[expenses_col], errors='coerce').fillna(0) if expenses_col else 0.0
     df['profit'] = df['sales'] - df['expenses']
     df.rename(columns={date_col: 'date'}, inplace=True)
 
     return df
 
-# ------------------- Report Generation ------------------- #
+# ------------------- Period Aggregation ------------------- #
+
+REPORT_TYPES = ['weekly', 'monthly', 'quarterly', 'yearly']
+RESAMPLE_RULES = {'weekly': 'W-MON', 'monthly': 'ME', 'quarterly': 'QE', 'yearly': 'YE'}
+# Columns of every daily / period table; sales_sq is the sum of squared row sales.
+PERIOD_COLUMNS = ['sales', 'expenses', 'profit', 'rows', 'sales_sq']
+
+
+def parse_report_types(value) -> list:
+    """
+    Normalize an analysis_type request into a list of report types.
+
+    Accepts a single type, 'all', a comma-separated string or a list. The
+    result is de-duplicated and ordered finest first.
+    """
+    if isinstance(value, str):
+        value = [part.strip().lower() for part in value.split(',') if part.strip()]
+    requested = set(value or [])
+    if 'all' in requested:
+        requested = set(REPORT_TYPES)
+    invalid = requested - set(REPORT_TYPES)
+    if not requested or invalid:
+        raise ValueError(f"❌ Invalid report type. Choose from: {', '.join(REPORT_TYPES)}, or all")
+    return [report_type for report_type in REPORT_TYPES if report_type in requested]
+
+
+def build_daily_table(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resample preprocessed rows into one line per day.
+
+    Only sales, expenses, a row count and the sum of squared row sales are
+    aggregated (profit is derived), so the table stays small whatever else
+    the upload contains. Input that is already aggregated per day carries
+    its own 'rows' and 'sales_sq' columns, which are summed instead. The
+    caller's frame is not modified.
+    """
+    if 'date' not in data.columns or 'sales' not in data.columns:
+        raise ValueError("❌ Missing 'date' or 'sales' columns in data.")
+
+    dates = data['date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors='coerce')
+    expenses = data['expenses'] if 'expenses' in data.columns else 0.0
+    rows = data['rows'] if 'rows' in data.columns else 1
+    sales_sq = data['sales_sq'] if 'sales_sq' in data.columns else data['sales'] ** 2
+
+    frame = pd.DataFrame({'sales': data['sales'], 'expenses': expenses, 'rows': rows, 'sales_sq': sales_sq})
+    frame.index = pd.DatetimeIndex(dates, name='date')
+    table = frame[frame.index.notna()].resample('D').sum()
+    table['profit'] = table['sales'] - table['expenses']
+    return table[PERIOD_COLUMNS]
+
+
+def rollup_periods(table: pd.DataFrame, report_type: str) -> pd.DataFrame:
+    """Roll a finer period table (e.g. daily) up into report_type periods."""
+    if report_type not in RESAMPLE_RULES:
+        raise ValueError("❌ Invalid report type. Choose from weekly, monthly, quarterly, or yearly.")
+    summed = [col for col in PERIOD_COLUMNS if col != 'profit' and col in table.columns]
+    rolled = table[summed].resample(RESAMPLE_RULES[report_type]).sum()
+    rolled['profit'] = rolled['sales'] - rolled['expenses']
+    return rolled[[col for col in PERIOD_COLUMNS if col in rolled.columns]]
 
-def generate_report(data, report_type, filename=None):
-    report_dir, _ = get_output_paths()
-    if not filename:
-        filename = os.path.join(report_dir, 'business_analysis_report.pdf')
 
-    resample_map = {'weekly': 'W-MON', 'monthly': 'M', 'quarterly': 'Q', 'yearly': 'A-DEC'}
-    if report_type not in resample_map:
+def build_period_table(data: pd.DataFrame, report_type: str) -> pd.DataFrame:
+    """Resample preprocessed rows into one line per report_type period."""
+    if report_type not in RESAMPLE_RULES:
         raise ValueError("❌ Invalid report type. Choose from weekly, monthly, quarterly, or yearly.")
+    return rollup_periods(build_daily_table(data), report_type)
 
-    # Ensure date column is datetime
-    if not pd.api.types.is_datetime64_any_dtype(data['date']):
-        data['date'] = pd.to_datetime(data['date'], errors='coerce')
 
-    data_resampled = data.resample(resample_map[report_type], on='date').sum()
+def _period_label(timestamp):
+    return timestamp.strftime('%Y-%m-%d')
 
-    total_revenue = data['sales'].sum()
-    total_expenses = data['expenses'].sum()
-    profit = total_revenue - total_expenses
-    avg_revenue = data['sales'].mean()
-    profit_margin = (profit / total_revenue * 100) if total_revenue > 0 else 0
 
-    # Extra metrics
-    if not data_resampled.empty:
-        highest = data_resampled['sales'].idxmax()
-        lowest = data_resampled['sales'].idxmin()
-        std_dev = data_resampled['sales'].std()
-    else:
-        highest = lowest = std_dev = None
+def sample_std(total, total_sq, count):
+    """Sample standard deviation from a sum, a sum of squares and a count."""
+    if count < 2:
+        return None
+    variance = (total_sq - total * total / count) / (count - 1)
+    return float(np.sqrt(max(variance, 0.0)))
 
-    # AI Insights
+
+def count_declines(previous, current) -> int:
+    """Count period-over-period drops the way Series.pct_change() < 0 does."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.asarray(current, dtype=float) / np.asarray(previous, dtype=float) - 1
+    return int((change < 0).sum())
+
+
+def period_insights(profit_margin, period_count, declines, first_sales, last_sales, std_dev, mean_sales) -> list:
+    """The AI insight rules, evaluated from summary statistics only."""
     insights = []
     if profit_margin < 20:
         insights.append("📌 Profit margins are below 20%. Consider adjusting pricing or reducing costs.")
-    if len(data_resampled) > 3 and (data_resampled['sales'].pct_change().dropna() < 0).sum() >= 3:
+    if period_count > 3 and declines >= 3:
         insights.append("⚠️ Sales have been dropping for multiple periods. Consider launching promotions.")
-    if len(data_resampled) > 1:
-        if data_resampled['sales'].iloc[-1] > data_resampled['sales'].iloc[0]:
+    if period_count > 1:
+        if last_sales > first_sales:
             insights.append("📈 Revenue is increasing over time.")
-        elif data_resampled['sales'].iloc[-1] < data_resampled['sales'].iloc[0]:
+        elif last_sales < first_sales:
             insights.append("📉 Revenue has decreased over the observed period.")
-    if std_dev and std_dev > data_resampled['sales'].mean() * 0.5:
+    if std_dev and std_dev > mean_sales * 0.5:
         insights.append("📊 Revenue is highly volatile. Consider strategies to stabilize income.")
+    return insights
 
-    # PDF generation
-    c = canvas.Canvas(filename, pagesize=letter)
-    width, height = letter
 
-    font_path = os.path.join("fonts", "NotoSans-Regular.ttf")
-    if os.path.exists(font_path):
-        pdfmetrics.registerFont(TTFont("Noto", font_path))
-        font_name = "Noto"
-    else:
-        font_name = "Helvetica"
-
-    c.setFont(font_name, 16)
-    y = height - inch
-    c.drawString(inch, y, f"{report_type.capitalize()} Business Report")
-    y -= 0.5 * inch
-
-    c.setFont(font_name, 12)
-    c.drawString(inch, y, f"💰 Total Revenue: ${total_revenue:,.2f}")
-    y -= 0.3 * inch
-    c.drawString(inch, y, f"📊 Avg Revenue per {report_type}: ${avg_revenue:,.2f}")
-    y -= 0.3 * inch
-    c.drawString(inch, y, f"💸 Total Expenses: ${total_expenses:,.2f}")
-    y -= 0.3 * inch
-    c.drawString(inch, y, f"🏆 Profit Margin: {profit_margin:.2f}%")
-    y -= 0.3 * inch
-
-    if highest and lowest:
-        c.drawString(inch, y, f"🔺 Highest Revenue Period: {highest.strftime('%Y-%m-%d')} (${data_resampled['sales'].max():,.2f})")
-        y -= 0.3 * inch
-        c.drawString(inch, y, f"🔻 Lowest Revenue Period: {lowest.strftime('%Y-%m-%d')} (${data_resampled['sales'].min():,.2f})")
-        y -= 0.3 * inch
-        c.drawString(inch, y, f"📈 Revenue Volatility (Std Dev): ${std_dev:,.2f}")
-        y -= 0.5 * inch
-
-    if insights:
-        c.setFont(font_name, 12)
-        c.drawString(inch, y, "🤖 AI Business Recommendations:")
-        y -= 0.3 * inch
-        for insight in insights:
-            c.drawString(inch + 15, y, f"- {insight}")
-            y -= 0.25 * inch
-            if y < inch:
-                c.showPage()
-                c.setFont(font_name, 12)
-                y = height - inch
-
-    c.save()
-    print(f"✅ PDF report saved to {filename}")
+def summarize_periods(table: pd.DataFrame, report_type: str) -> dict:
+    """Compute the report metrics and insights from a period table, as plain JSON types."""
+    sales = table['sales']
+    total_revenue = float(sales.sum())
+    total_expenses = float(table['expenses'].sum())
+    row_count = int(table['rows'].sum())
 
-# ------------------- Chart Generation ------------------- #
+    # Extra metrics
+    highest = lowest = None
+    if not table.empty:
+        highest = {'period': _period_label(sales.idxmax()), 'sales': float(sales.max())}
+        lowest = {'period': _period_label(sales.idxmin()), 'sales': float(sales.min())}
+    std_dev = float(sales.std()) if len(table) > 1 else None
+    row_std_dev = None
+    if 'sales_sq' in table.columns:
+        row_std_dev = sample_std(total_revenue, float(table['sales_sq'].sum()), row_count)
+
+    values = sales.to_numpy(dtype=float)
+    return build_metrics(
+        report_type, row_count, total_revenue, total_expenses, highest, lowest, std_dev, row_std_dev,
+        declines=count_declines(values[:-1], values[1:]),
+        first_sales=values[0] if len(values) else 0.0,
+        last_sales=values[-1] if len(values) else 0.0,
+        mean_sales=float(values.mean()) if len(values) else 0.0,
+        table=table,
+    )
+
+
+def build_metrics(report_type, row_count, total_revenue, total_expenses, highest, lowest, std_dev, row_std_dev,
+                  declines, first_sales, last_sales, mean_sales, table) -> dict:
+    """Assemble the metrics dict shared by full and incremental analyses."""
+    profit = total_revenue - total_expenses
+    avg_revenue = total_revenue / row_count if row_count else 0.0
+    profit_margin = (profit / total_revenue * 100) if total_revenue > 0 else 0.0
 
-def plot_revenue_trends(df, report_type='monthly'):
-    import matplotlib.pyplot as plt
-    import pandas as pd
-    import os
-    from Release.analyzer import get_output_paths  # Import get_output_paths properly
+    # AI Insights
+    insights = period_insights(profit_margin, len(table), declines, first_sales, last_sales, std_dev, mean_sales)
+
+    return {
+        'report_type': report_type,
+        'rows': row_count,
+        'total_revenue': total_revenue,
+        'total_expenses': total_expenses,
+        'profit': profit,
+        'avg_revenue': avg_revenue,
+        'profit_margin': profit_margin,
+        'highest_period': highest,
+        'lowest_period': lowest,
+        'std_dev': std_dev,
+        'row_std_dev': row_std_dev,
+        'insights': insights,
+        'periods': [
+            {'period': _period_label(period), 'sales': float(sales),
+             'expenses': float(expenses), 'profit': float(sales - expenses)}
+            for period, sales, expenses in zip(table.index, table['sales'], table['expenses'])
+        ],
+    }
+
+# ------------------- Dimension Analytics ------------------- #
+
+# Header fragments of columns results can be broken down by (store, SKU, region...).
+DIMENSION_COLUMNS = [
+    'store', 'shop', 'branch', 'outlet', 'location', 'region', 'country', 'city',
+    'product', 'sku', 'item', 'category', 'brand', 'channel', 'segment',
+]
+# Dimensions with more distinct values than this (order IDs and the like) are skipped.
+MAX_DIMENSION_VALUES = int(os.getenv("DIMENSION_MAX_VALUES", 10_000))
+TOP_N = int(os.getenv("DIMENSION_TOP_N", 5))
+# Label for rows whose dimension value is missing.
+BLANK_VALUE = '(blank)'
+# Columns of a dimension table, one row per day, dimension and value.
+DIMENSION_TABLE_COLUMNS = ['date', 'dimension', 'value', 'sales', 'expenses', 'rows']
+
+
+def parse_dimensions(value) -> list:
+    """
+    Normalize a dimensions request into a list of lowercase column names.
+
+    Accepts None or '' (no dimensions), 'auto' (detect them from the header),
+    a comma-separated string or a list. 'auto' is kept as a list entry and
+    resolved against the header by resolve_dimensions.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    names = []
+    for name in value:
+        name = str(name).strip().lower()
+        if name and name != 'none' and name not in names:
+            names.append(name)
+    return names
+
+
+def parse_top_n(value) -> int:
+    """Validate a top-N request; None means the default TOP_N."""
+    if value is None or value == '':
+        return TOP_N
+    try:
+        top_n = int(value)
+    except (TypeError, ValueError):
+        top_n = 0
+    if top_n < 1:
+        raise ValueError("❌ top_n must be a whole number of at least 1.")
+    return top_n
+
+
+def find_dimensions(names) -> list:
+    """Return the header columns that look like dimensions, skipping date, sales and expenses."""
+    names = list(names)
+    core = set(find_columns(names, warn=False))
+    dimensions = []
+    for name in names:
+        normalized = str(name).strip().lower()
+        if name not in core and any(fragment in normalized for fragment in DIMENSION_COLUMNS):
+            dimensions.append(name)
+    return dimensions
+
+
+def resolve_dimensions(requested, names) -> list:
+    """
+    Map a parse_dimensions list onto a header and return the original column names.
+
+    'auto' expands to find_dimensions(names); explicit names are matched
+    case-insensitively and raise ValueError when the header lacks them.
+    """
+    lowered = {str(name).strip().lower(): name for name in names}
+    dimensions = []
+    for name in requested:
+        if name == 'auto':
+            found = find_dimensions(names)
+        elif name in lowered:
+            found = [lowered[name]]
+        else:
+            raise ValueError(f"❌ Dimension column '{name}' not found.")
+        dimensions.extend(col for col in found if col not in dimensions)
+    return dimensions
+
+
+def _empty_dimension_table():
+    return pd.DataFrame({
+        'date': pd.Series(dtype='datetime64[ns]'),
+        'dimension': pd.Categorical([]),
+        'value': pd.Categorical([]),
+        'sales': pd.Series(dtype='float64'),
+        'expenses': pd.Series(dtype='float64'),
+        'rows': pd.Series(dtype='int64'),
+    })
+
+
+def build_dimension_table(data: pd.DataFrame, dimensions, max_values=MAX_DIMENSION_VALUES) -> pd.DataFrame:
+    """
+    Aggregate preprocessed rows per day and value of every dimension in one groupby.
+
+    Each dimension's categorical codes are shifted into one shared key space
+    and stacked, so a single groupby over (day, key) yields the daily sales,
+    expenses and row count of every value of every dimension. The result is
+    a long table (DIMENSION_TABLE_COLUMNS) with categorical dimension and
+    value columns, sized by days x values rather than by rows. Dimensions
+    with more than max_values distinct values are skipped with a warning.
+    """
+    if data.empty or not dimensions:
+        return _empty_dimension_table()
+
+    days = data['date'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype('int64')
+    first_day = int(days.min())
+    days -= first_day
+
+    used, keys, labels, owners = [], [], [], []
+    offset = 0
+    for dim in dimensions:
+        values = data[dim]
+        categorical = values.array if isinstance(values.dtype, pd.CategoricalDtype) else pd.Categorical(values)
+        # Empty strings (pyarrow reads empty cells as '') count as missing too
+        categories = [str(category).strip() or BLANK_VALUE for category in categorical.categories]
+        if len(categories) > max_values:
+            print(f"⚠️ Skipping dimension '{dim}': {len(categories)} distinct values (max {max_values}).")
+            continue
+        codes = np.asarray(categorical.codes, dtype='int64')
+        if (codes < 0).any():
+            codes = np.where(codes < 0, len(categories), codes)
+            categories.append(BLANK_VALUE)
+        keys.append(codes + offset)
+        labels.extend(categories)
+        owners.extend([len(used)] * len(categories))
+        used.append(str(dim))
+        offset += len(categories)
+    if not used:
+        return _empty_dimension_table()
+
+    # One int64 key per (day, dimension value) pair; the groupby sees every dimension at once
+    stacked = np.tile(days, len(keys)) * offset + np.concatenate(keys)
+    sales = data['sales'].to_numpy(dtype='float64')
+    expenses = data['expenses'].to_numpy(dtype='float64') if 'expenses' in data.columns else np.zeros(len(data))
+    grouped = pd.DataFrame({
+        'sales': np.tile(sales, len(keys)),
+        'expenses': np.tile(expenses, len(keys)),
+    }).groupby(stacked, sort=True).agg(
+        sales=('sales', 'sum'),
+        expenses=('expenses', 'sum'),
+        rows=('sales', 'size'),
+    )
+
+    pair = grouped.index.to_numpy()
+    key = pair % offset
+    values, value_codes = np.unique(np.asarray(labels, dtype=object), return_inverse=True)
+    return pd.DataFrame({
+        'date': (pair // offset + first_day).astype('datetime64[D]').astype('datetime64[ns]'),
+        'dimension': pd.Categorical.from_codes(np.asarray(owners)[key], categories=used),
+        'value': pd.Categorical.from_codes(value_codes[key], categories=values),
+        'sales': grouped['sales'].to_numpy(),
+        'expenses': grouped['expenses'].to_numpy(),
+        'rows': grouped['rows'].to_numpy(dtype='int64'),
+    })
+
+
+def combine_dimension_tables(tables) -> pd.DataFrame:
+    """Sum dimension tables built from separate chunks or files into one."""
+    tables = [table for table in tables if not table.empty]
+    if not tables:
+        return _empty_dimension_table()
+    if len(tables) == 1:
+        return tables[0]
+    combined = pd.concat(
+        [table.astype({'dimension': str, 'value': str}) for table in tables], ignore_index=True,
+    ).groupby(['date', 'dimension', 'value'], sort=True)[['sales', 'expenses', 'rows']].sum().reset_index()
+    dimensions = list(dict.fromkeys(dim for table in tables for dim in table['dimension'].cat.categories))
+    combined['dimension'] = pd.Categorical(combined['dimension'], categories=dimensions)
+    combined['value'] = combined['value'].astype('category')
+    return combined[DIMENSION_TABLE_COLUMNS]
+
+
+def _ranked(totals, by, top_n):
+    """
+    Rank values by sales within each group of by, with their sales share.
+
+    Returns the top_n values of every group and, per group, the values
+    ranked below them summed into one 'other' line (with their count).
+    """
+    totals = totals[totals['rows'] > 0]
+    share = totals['sales'] / totals.groupby(by, observed=True)['sales'].transform('sum') * 100
+    totals = totals.assign(profit=totals['sales'] - totals['expenses'], share=share.fillna(0.0))
+    totals = totals.sort_values(by + ['sales'], ascending=[True] * len(by) + [False], kind='stable')
+    totals['rank'] = totals.groupby(by, observed=True).cumcount() + 1
+    rest = totals[totals['rank'] > top_n].groupby(by, observed=True).agg(
+        values=('rank', 'size'), sales=('sales', 'sum'), expenses=('expenses', 'sum'),
+        profit=('profit', 'sum'), rows=('rows', 'sum'), share=('share', 'sum'),
+    )
+    return totals[totals['rank'] <= top_n], rest
+
+
+def _other_entry(rest, key):
+    """The 'other' line of one ranking, or None when every value made the top."""
+    if key not in rest.index:
+        return None
+    line = rest.loc[key]
+    return {'values': int(line['values']), 'sales': float(line['sales']), 'expenses': float(line['expenses']),
+            'profit': float(line['profit']), 'rows': int(line['rows']), 'share': float(line['share'])}
+
+
+def _ranking_entries(frame):
+    return [
+        {'rank': int(rank), 'value': str(value), 'sales': float(sales), 'expenses': float(expenses),
+         'profit': float(profit), 'rows': int(rows), 'share': float(share)}
+        for rank, value, sales, expenses, profit, rows, share in zip(
+            frame['rank'], frame['value'], frame['sales'], frame['expenses'],
+            frame['profit'], frame['rows'], frame['share'],
+        )
+    ]
+
+
+def summarize_dimensions(table: pd.DataFrame, report_type: str, top_n=TOP_N) -> dict:
+    """
+    Rank every dimension's values per report_type period from a dimension table.
+
+    One groupby rolls all dimensions up to periods at once and one sort
+    ranks them. Returns, per dimension, the number of distinct values, the
+    top_n values overall and the top_n of every period, each with sales,
+    expenses, profit, rows and their percentage share of the period's sales.
+    Every ranking also has an 'other' entry summing the values below the
+    top_n (None when there are none).
+    """
+    if report_type not in RESAMPLE_RULES:
+        raise ValueError("❌ Invalid report type. Choose from weekly, monthly, quarterly, or yearly.")
+    if table.empty:
+        return {}
+    amounts = ['sales', 'expenses', 'rows']
+    periods = table.groupby(
+        ['dimension', pd.Grouper(key='date', freq=RESAMPLE_RULES[report_type]), 'value'], observed=True,
+    )[amounts].sum().reset_index()
+    overall = table.groupby(['dimension', 'value'], observed=True)[amounts].sum().reset_index()
+    distinct = overall[overall['rows'] > 0].groupby('dimension', observed=True)['value'].size()
+    periods, period_rest = _ranked(periods, ['dimension', 'date'], top_n)
+    overall, overall_rest = _ranked(overall, ['dimension'], top_n)
+
+    summary = {}
+    for dimension, ranked in overall.groupby('dimension', observed=True, sort=False):
+        summary[str(dimension)] = {'values': int(distinct[dimension]), 'top': _ranking_entries(ranked),
+                                   'other': _other_entry(overall_rest, dimension), 'periods': []}
+    for (dimension, period), ranked in periods.groupby(['dimension', 'date'], observed=True, sort=True):
+        summary[str(dimension)]['periods'].append({'period': _period_label(period), 'top': _ranking_entries(ranked),
+                                                   'other': _other_entry(period_rest, (dimension, period))})
+    return summary
+
+
+def dimension_appendix(sections) -> list:
+    """
+    Turn summarize_dimensions output into PDF tables.
+
+    sections maps report type to its dimension summary; every dimension gets
+    one overall ranking plus, per report type, its forecast leaders (when
+    forecast) and a per-period top-N table, as (title, header, rows).
+    """
+    def money(amount):
+        return f"${amount:,.2f}"
+
+    def label(value):
+        return value if len(value) <= 32 else value[:31] + '…'
+
+    def other(ranking, prefix=""):
+        entry = ranking.get('other')
+        if not entry:
+            return []
+        return [(f"{prefix}Other ({entry['values']} values)", money(entry['sales']),
+                 money(entry['profit']), f"{entry['share']:.1f}%")]
+
+    tables = []
+    overall = next(iter(sections.values()), {})
+    for dimension, summary in overall.items():
+        tables.append((
+            f"Top {dimension} overall ({summary['values']} values)",
+            [dimension.capitalize(), "Sales", "Profit", "Share"],
+            [(f"{entry['rank']}. {label(entry['value'])}", money(entry['sales']),
+              money(entry['profit']), f"{entry['share']:.1f}%") for entry in summary['top']] + other(summary),
+        ))
+    for report_type, dimensions in sections.items():
+        for dimension, summary in dimensions.items():
+            if summary.get('forecast'):
+                tables.append((
+                    f"Forecast {dimension} ({report_type})",
+                    [dimension.capitalize(), "Forecast", "Change", "Model"],
+                    [(label(entry['value']), money(entry['sales']),
+                      f"{entry['change']:+.1f}%" if entry['change'] is not None else "N/A",
+                      "Holt-Winters" if entry['model'] == 'holt_winters' else "Linear")
+                     for entry in summary['forecast']],
+                ))
+            # 'monthly' -> 'month', 'quarterly' -> 'quarter'...
+            tables.append((
+                f"Top {dimension} per {report_type[:-2]}",
+                [f"Period / {dimension}", "Sales", "Profit", "Share"],
+                [row for period in summary['periods'] for row in [
+                    (f"{period['period']}  {entry['rank']}. {label(entry['value'])}", money(entry['sales']),
+                     money(entry['profit']), f"{entry['share']:.1f}%") for entry in period['top']
+                ] + other(period, f"{period['period']}  ")],
+            ))
+    return tables
 
-    if 'date' not in df.columns or 'sales' not in df.columns:
-        raise ValueError("Missing 'date' or 'sales' columns in data.")
+# ------------------- Report Generation ------------------- #
 
-    df['date'] = pd.to_datetime(df['date'])
+def generate_report(data, report_type, filename=None, chart=None):
+    """
+    Write the PDF report for preprocessed rows (the output of preprocess_data).
 
-    if report_type == 'weekly':
-        df_grouped = df.resample('W-Mon', on='date').sum()
-    elif report_type == 'monthly':
-        df_grouped = df.resample('M', on='date').sum()
-    elif report_type == 'quarterly':
-        df_grouped = df.resample('Q', on='date').sum()
-    elif report_type == 'yearly':
-        df_grouped = df.resample('Y', on='date').sum()
-    else:
-        raise ValueError("Invalid report type. Choose weekly, monthly, quarterly, or yearly.")
-
-    report_dir, chart_dir = get_output_paths()
-    chart_path = os.path.join(chart_dir, f"sales_{report_type}_plot.png")
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(df_grouped.index, df_grouped['sales'], marker='o')
-    plt.title(f'Sales Trends ({report_type.capitalize()})')
-    plt.xlabel('Date')
-    plt.ylabel('Sales')
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig(chart_path)
-    plt.close()
-
-    print(f"📊 Sales trend chart saved to {chart_path}")
+    chart optionally holds the chart's PNG bytes (or path) to embed.
+    """
+    table = build_period_table(data, report_type)
+    charts = {report_type: chart} if chart is not None else None
+    return generate_combined_report({report_type: summarize_periods(table, report_type)}, filename, charts)
+
+
+def generate_combined_report(sections, filename=None, charts=None, appendix=None):
+    """
+    Write one PDF with a section per report type; sections maps report type to its metrics.
+
+    charts optionally maps report type to the chart's PNG bytes (or path), which
+    is embedded in that section. appendix adds (title, header, rows) tables at the end.
+    """
+    if not filename:
+        report_dir, _ = get_output_paths()
+        filename = os.path.join(report_dir, 'business_analysis_report.pdf')
+
+    # ReportLab is only imported once a PDF is actually written
+    from Release.reports import write_business_report
+
+    seconds = write_business_report(filename, sections, charts, appendix)
+    print(f"✅ PDF report saved to {filename} in {seconds:.3f}s")
+    return seconds
+
+# ------------------- Chart Generation ------------------- #
+
+def chart_spec(table, report_type, chart_path=None, fmt=None, forecast=None) -> dict:
+    """
+    Return the render_line_chart arguments for a period table's sales trend.
+
+    forecast is the metrics' forecast dict; it is drawn from the last actual
+    period on, with its band.
+    """
+    if 'sales' not in table.columns:
+        raise ValueError("Missing 'sales' column in period table.")
+    drawn = None
+    if forecast and forecast['periods'] and len(table):
+        periods = forecast['periods']
+        last_sales = float(table['sales'].iloc[-1])
+        drawn = {
+            'x': [table.index[-1]] + [pd.Timestamp(p['period']) for p in periods],
+            'y': [last_sales] + [p['sales'] for p in periods],
+            'lower': [last_sales] + [p['lower'] for p in periods],
+            'upper': [last_sales] + [p['upper'] for p in periods],
+        }
+    return {
+        'x': table.index.values,
+        'y': table['sales'].values,
+        'title': f'Sales Trends ({report_type.capitalize()})',
+        'xlabel': 'Date',
+        'ylabel': 'Sales',
+        'path': chart_path,
+        'fmt': fmt,
+        'forecast': drawn,
+    }
+
+
+def plot_revenue_trends(df, report_type='monthly', chart_path=None, fmt=None):
+    """Plot per-period sales from preprocessed rows (the output of preprocess_data)."""
+    if 'date' not in df.columns or 'sales' not in df.columns:
+        raise ValueError("Missing 'date' or 'sales' columns in data.")
+    table = build_period_table(df, report_type)
+    if not chart_path:
+        report_dir, chart_dir = get_output_paths()
+        chart_path = os.path.join(chart_dir, f"sales_{report_type}_plot.{fmt or CHART_FORMAT}")
+
+    rendered = render_line_chart(**chart_spec(table, report_type, chart_path, fmt))
+    print(f"📊 Sales trend chart saved to {chart_path} in {rendered['seconds']:.3f}s")
+    return rendered
@@ -0,0 +1,445 @@
+"""
+Batch analysis of a directory or glob of files.
+
+Every file is analysed in its own process-pool task and gets its own
+report folder. The per-day tables the workers keep are then summed into
+one consolidated cross-file report, so its metrics are exactly those of a
+single analysis over all files together. Files whose size, modification
+time (or, failing that, content hash) match the last run are skipped and
+their previous outputs reused.
+
+Usage:
+    python -m Release.batch data/ --analysis-type monthly
+    python -m Release.batch "exports/store_*.csv" --workers 8 --force
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from Release.analyzer import combine_dimension_tables, parse_dimensions, parse_report_types, parse_top_n
+from Release.cache import hash_file
+from Release.charts import CHART_FORMAT
+from Release.jobs import QueueFullError
+from Release.main import analyze_data, analyze_table
+from Release.utils import SUPPORTED_EXTENSIONS
+
+# ------------------- Settings ------------------- #
+
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", os.path.join("outputs", "batch"))
+# Directory the /batch API may read from; targets outside it are refused.
+BATCH_ROOT = os.getenv("BATCH_ROOT", "data")
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", os.cpu_count() or 1))
+# Recycle workers so memory from one large file is returned to the OS.
+BATCH_TASKS_PER_WORKER = int(os.getenv("BATCH_TASKS_PER_WORKER", 50))
+# How long an API batch waits before retrying a file the full job queue refused.
+QUEUE_RETRY_SECONDS = 1.0
+
+STATE_FILE = "batch_state.json"
+SUMMARY_FILE = "batch_summary.json"
+
+
+def collect_files(target, recursive=False):
+    """Return the supported files in a directory, or matching a glob pattern, sorted by path."""
+    if os.path.isdir(target):
+        pattern = os.path.join(target, "**", "*") if recursive else os.path.join(target, "*")
+    else:
+        pattern = target
+    files = [
+        path for path in glob.glob(pattern, recursive=recursive or "**" in pattern)
+        if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS)
+    ]
+    if not files:
+        raise ValueError(f"❌ No supported files found for '{target}'.")
+    return sorted(files)
+
+
+def _file_dir(output_dir, path):
+    """Per-file output folder: a readable name plus a short hash of the full path."""
+    name = re.sub(r"[^A-Za-z0-9_-]+", "_", os.path.basename(path)).strip("_") or "file"
+    tag = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    return os.path.join(output_dir, "files", f"{name}-{tag}")
+
+
+# ------------------- State ------------------- #
+
+def _load_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _unchanged(entry, path, analysis_key):
+    """
+    Whether a file still matches its entry from the last run.
+
+    Size and modification time decide without reading the file; only a file
+    of the same size with a new modification time is hashed, so one that
+    was touched but not edited is still recognised. The entry's outputs must
+    still exist. Returns the (possibly refreshed) entry or None, and the
+    file's hash if it was computed on the way.
+    """
+    if not entry or entry.get("analysis_key") != analysis_key:
+        return None, None
+    outputs = ("pdf_report", "daily_table") + (("dimension_table",) if "dimension_table" in entry else ())
+    if not all(os.path.exists(entry.get(key) or "") for key in outputs):
+        return None, None
+    stat = os.stat(path)
+    if entry["size"] != stat.st_size:
+        return None, None
+    if entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry, None
+    digest = hash_file(path)
+    if entry.get("digest") == digest:
+        return dict(entry, mtime_ns=stat.st_mtime_ns), digest
+    return None, digest
+
+
+def retained_paths(output_dir):
+    """
+    What the artifact sweeper must leave in a batch output directory.
+
+    That is the state and summary, the consolidated report and the latest
+    outputs of every file that still exists, so the next run can skip
+    unchanged files however long ago the last one was.
+    """
+    state = _load_state(output_dir)
+    paths = [os.path.join(output_dir, name) for name in (STATE_FILE, SUMMARY_FILE, "consolidated")]
+    return paths + [entry["output_dir"] for key, entry in state.items()
+                    if entry.get("output_dir") and os.path.exists(key)]
+
+
+# ------------------- Worker Side ------------------- #
+
+def analyze_file(path, analysis_type, output_dir, chart_format=CHART_FORMAT, dimensions=(), top_n=None,
+                 digest=None):
+    """
+    Analyse one file inside a pool worker and return a compact summary.
+
+    The full metrics stay in the file's own report; the summary carries the
+    totals, the paths of the report and of the kept per-day table, the
+    file's hash (from the result cache's lookup, or digest if the skip check
+    already computed it) and the telemetry.
+    """
+    start = time.perf_counter()
+    stat = os.stat(path)
+    result = analyze_data(path, analysis_type, output_dir=output_dir, chart_format=chart_format,
+                          keep_daily=True, dimensions=dimensions, top_n=top_n, digest=digest)
+    entry = {
+        "path": path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": result.get("digest", digest),
+        "output_dir": output_dir,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    if "error" in result:
+        return dict(entry, status="failed", error=result["error"])
+
+    metrics = next(iter(result["metrics"].values()))
+    if "dimension_table" in result:
+        entry["dimension_table"] = result["dimension_table"]
+    return dict(
+        entry,
+        status="analysed",
+        pdf_report=result["pdf_report"],
+        chart_images=result["chart_images"],
+        daily_table=result["daily_table"],
+        rows=metrics["rows"],
+        total_revenue=metrics["total_revenue"],
+        total_expenses=metrics["total_expenses"],
+        profit=metrics["profit"],
+        profit_margin=metrics["profit_margin"],
+        telemetry=result["telemetry"],
+    )
+
+
+# ------------------- Batch Runs ------------------- #
+
+def _consolidate(entries, report_types, output_dir, chart_format, dimensions=(), top_n=None):
+    """Sum every file's per-day (and per-dimension) tables and write the cross-file report."""
+    tables = [pd.read_parquet(entry["daily_table"]) for entry in entries]
+    daily = pd.concat(tables, ignore_index=True)
+    dimension_table = None
+    if dimensions:
+        dimension_table = combine_dimension_tables([
+            pd.read_parquet(entry["dimension_table"]) for entry in entries if entry.get("dimension_table")
+        ])
+    appendix = [(
+        "Per-file totals",
+        ["File", "Sales", "Expenses", "Profit"],
+        [
+            (os.path.basename(entry["path"]), f"${entry['total_revenue']:,.2f}",
+             f"${entry['total_expenses']:,.2f}", f"${entry['profit']:,.2f}")
+            for entry in sorted(entries, key=lambda entry: entry["total_revenue"], reverse=True)
+        ],
+    )]
+    return analyze_table(daily, report_types, output_dir=os.path.join(output_dir, "consolidated"),
+                         chart_format=chart_format, appendix=appendix, dimension_table=dimension_table,
+                         top_n=top_n)
+
+
+def analyze_batch(target, analysis_type="monthly", output_dir=BATCH_OUTPUT_DIR, workers=None, force=False,
+                  recursive=False, chart_format=CHART_FORMAT, progress=None, dimensions=None,
+                  top_n=None, submit=None, window=None) -> dict:
+    """
+    Analyse every supported file in a directory or matching a glob, in parallel.
+
+    Each file is analysed in a process pool of workers processes (default:
+    one per core) and gets its report under output_dir/files/. Files that
+    have not changed since the last run into the same output_dir are
+    skipped unless force is set. A consolidated report over all successfully
+    analysed files is written to output_dir/consolidated/. progress, if
+    given, is called with each finished file's entry. dimensions and top_n
+    add store / SKU / region rankings to every report as in analyze_data;
+    the consolidated report ranks them across all files. submit, if given,
+    queues the files on an existing pool (e.g. JobManager.run, so API
+    batches share the job workers) instead of starting one; then at most
+    window files are queued at a time, and a file the pool refuses with
+    QueueFullError is retried once a slot frees up.
+
+    Returns a summary with one entry per file, the consolidated result, and
+    the throughput in rows per second over the files analysed in this run.
+    The summary is also written to output_dir/batch_summary.json.
+    """
+    start = time.perf_counter()
+    report_types = parse_report_types(analysis_type)
+    dimensions = parse_dimensions(dimensions)
+    top_n = parse_top_n(top_n)
+    files = collect_files(target, recursive)
+    os.makedirs(output_dir, exist_ok=True)
+    analysis_key = f"{'+'.join(report_types)}.{chart_format}"
+    if dimensions:
+        analysis_key += f".{','.join(dimensions)}.top{top_n}"
+
+    state = _load_state(output_dir)
+    entries, pending = {}, []
+    for path in files:
+        key = os.path.abspath(path)
+        entry, digest = (None, None) if force else _unchanged(state.get(key), path, analysis_key)
+        if entry:
+            entries[key] = dict(entry, status="skipped")
+        else:
+            pending.append((path, digest))
+    print(f"📦 Batch of {len(files)} file(s): {len(pending)} to analyse, {len(entries)} unchanged")
+
+    if pending:
+        executor = None
+        if submit is None:
+            executor = ProcessPoolExecutor(
+                max_workers=max(1, min(workers or BATCH_WORKERS, len(pending))),
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=BATCH_TASKS_PER_WORKER,
+            )
+            submit = executor.submit
+        try:
+            queue, futures, done = list(pending), {}, 0
+            window = window or len(pending)
+            while queue or futures:
+                while queue and len(futures) < window:
+                    path, digest = queue[0]
+                    try:
+                        future = submit(analyze_file, path, report_types, _file_dir(output_dir, path), chart_format,
+                                        dimensions, top_n, digest)
+                    except QueueFullError:
+                        if futures:
+                            break
+                        time.sleep(QUEUE_RETRY_SECONDS)
+                        continue
+                    futures[future] = queue.pop(0)[0]
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = futures.pop(future)
+                    done += 1
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        entry = {"path": path, "status": "failed", "error": f"❌ Job failed: {e}"}
+                    entries[os.path.abspath(path)] = entry
+                    if entry["status"] == "failed":
+                        print(f"❌ [{done}/{len(pending)}] {path}: {entry['error']}")
+                    else:
+                        print(f"✅ [{done}/{len(pending)}] {path}: {entry['rows']:,} rows in "
+                              f"{entry['seconds']:.2f}s")
+                    if progress:
+                        progress(entry)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    # Keep state for every file seen so far, including those outside this run's target
+    state.update({
+        key: dict(entry, analysis_key=analysis_key)
+        for key, entry in entries.items() if entry["status"] != "failed"
+    })
+    for key, entry in entries.items():
+        if entry["status"] == "failed":
+            state.pop(key, None)
+    _save_state(output_dir, state)
+
+    ordered = [entries[os.path.abspath(path)] for path in files]
+    succeeded = [entry for entry in ordered if entry["status"] != "failed"]
+    consolidated = None
+    if succeeded:
+        consolidated = _consolidate(succeeded, report_types, output_dir, chart_format, dimensions, top_n)
+
+    seconds = time.perf_counter() - start
+    analysed = [entry for entry in ordered if entry["status"] == "analysed"]
+    skipped, failed = len(succeeded) - len(analysed), len(ordered) - len(succeeded)
+    rows_analysed = sum(entry["rows"] for entry in analysed)
+    summary = {
+        "summary": (f"✅ Batch complete: {len(analysed)} analysed, {skipped} skipped, "
+                    f"{failed} failed in {seconds:.2f} seconds."),
+        "analysis_types": report_types,
+        "files": ordered,
+        "analysed": len(analysed),
+        "skipped": skipped,
+        "failed": failed,
+        "rows": sum(entry["rows"] for entry in succeeded),
+        "rows_analysed": rows_analysed,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows_analysed / seconds, 1) if seconds else None,
+        "consolidated": consolidated,
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"🚀 {summary['summary']} Throughput: {summary['rows_per_second'] or 0:,.0f} rows/s "
+          f"({rows_analysed:,} rows analysed)")
+    return summary
+
+
+# ------------------- API Runs ------------------- #
+
+class BatchRunner:
+    """
+    Runs one batch at a time in a background thread and tracks its state.
+
+    With jobs (a JobManager) the files are analysed by its workers, so
+    batches and uploads share one pool: at most one file per worker is
+    queued at a time, and each counts against the job queue's max_pending.
+    """
+
+    def __init__(self, root=BATCH_ROOT, output_dir=BATCH_OUTPUT_DIR, jobs=None):
+        self.root = root
+        self.output_dir = output_dir
+        self.jobs = jobs
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, target):
+        """Return target as a path under root, or raise ValueError if it escapes it."""
+        if not target:
+            raise ValueError("❌ Give a directory or glob pattern to analyse.")
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, target))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"❌ Batch targets must be inside '{self.root}'.")
+        return path
+
+    def active_paths(self):
+        """The output directory while a batch runs, else its retained_paths (kept by the sweeper)."""
+        return [self.output_dir] if self.is_busy() else retained_paths(self.output_dir)
+
+    def is_busy(self):
+        with self._lock:
+            return any(batch["status"] == "running" for batch in self._batches.values())
+
+    def submit(self, target, analysis_type="monthly", chart_format=CHART_FORMAT, force=False, dimensions=None,
+               top_n=None):
+        """Start a batch and return its ID; raises QueueFullError while a batch runs or the job queue is full."""
+        path = self.resolve(target)
+        batch_id = uuid.uuid4().hex
+        if self.jobs and self.jobs.is_full():
+            pending = self.jobs.pending_count()
+            raise QueueFullError(f"❌ Server is busy ({pending} jobs pending). Please retry shortly.")
+        with self._lock:
+            if any(batch["status"] == "running" for batch in self._batches.values()):
+                raise QueueFullError("❌ A batch is already running. Please retry once it finishes.")
+            self._batches[batch_id] = {
+                "batch_id": batch_id,
+                "status": "running",
+                "target": target,
+                "done": 0,
+                "created_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+        thread = threading.Thread(
+            target=self._run, args=(batch_id, path, analysis_type, chart_format, force, dimensions, top_n),
+            daemon=True,
+        )
+        thread.start()
+        return batch_id
+
+    def _run(self, batch_id, path, analysis_type, chart_format, force, dimensions, top_n):
+        def progress(entry):
+            with self._lock:
+                self._batches[batch_id]["done"] += 1
+
+        try:
+            result, error = analyze_batch(path, analysis_type, self.output_dir, force=force,
+                                          chart_format=chart_format, progress=progress,
+                                          dimensions=dimensions, top_n=top_n,
+                                          submit=self.jobs.run if self.jobs else None,
+                                          window=self.jobs.max_workers if self.jobs else None), None
+        except Exception as e:
+            result, error = None, str(e) if str(e).startswith("❌") else f"❌ Batch failed: {e}"
+        with self._lock:
+            batch = self._batches[batch_id]
+            batch["status"] = "failed" if error else "done"
+            batch["result"] = result
+            batch["error"] = error
+            batch["finished_at"] = time.time()
+
+    def status(self, batch_id):
+        """Return the batch record including its summary once done, or None if unknown."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            return dict(batch) if batch is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse every file in a directory or glob in parallel.")
+    parser.add_argument("target", help="a directory or a glob pattern, e.g. 'data/store_*.csv'")
+    parser.add_argument("--analysis-type", default="monthly", help="report type(s), comma-separated, or 'all'")
+    parser.add_argument("--output", default=BATCH_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--chart-format", default=CHART_FORMAT)
+    parser.add_argument("--recursive", action="store_true", help="include sub-directories")
+    parser.add_argument("--force", action="store_true", help="re-analyse files even if unchanged")
+    parser.add_argument("--dimensions", default=None, help="'auto' or comma-separated columns to rank, e.g. store,sku")
+    parser.add_argument("--top-n", type=int, default=None, help="values ranked per period for each dimension")
+    args = parser.parse_args()
+
+    try:
+        summary = analyze_batch(args.target, args.analysis_type, args.output, args.workers, args.force,
+                                args.recursive, args.chart_format, dimensions=args.dimensions, top_n=args.top_n)
+    except ValueError as e:
+        print(e)
+        return 2
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
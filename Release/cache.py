@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+# ------------------- Settings ------------------- #
+
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join("outputs", "cache"))
+CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", 512)) * 1024 * 1024
+# Bump when the pipeline output changes so stale entries are never served.
+CACHE_VERSION = 5
+
+HASH_CHUNK_SIZE = 1024 * 1024
+RESULT_FILE = "result.json"
+
+
+def hash_file(filepath: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _copy_file(src, dst):
+    """
+    Copy src over dst through a temporary file.
+
+    Never a hardlink: output directories are reused (batch runs write each
+    file's reports to the same folder), and rewriting a linked file in place
+    would change the cached copy with it.
+    """
+    tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _map_artifacts(result, func):
+    """Return a copy of result with func applied to every artifact path in it."""
+    mapped = dict(result)
+    for key in ("pdf_report", "chart_image", "daily_table", "dimension_table"):
+        if mapped.get(key):
+            mapped[key] = func(mapped[key])
+    if mapped.get("chart_images"):
+        mapped["chart_images"] = {name: func(path) for name, path in mapped["chart_images"].items()}
+    return mapped
+
+
+# ------------------- Result Cache ------------------- #
+
+class ResultCache:
+    """
+    Content-addressed cache of finished analyses.
+
+    Results (PDF, charts and summary) are keyed on the SHA-256 of the
+    uploaded bytes plus the analysis type(s); the preprocessed frame is keyed on the
+    digest (plus an optional variant, e.g. the Excel sheet read) and stored as
+    Parquet, so a new period on a known file skips reading and preprocessing.
+    Raw Excel sheets are stored the same way under an "xlsx-" variant. Small
+    JSON parameter sets (fitted forecast models) are kept under params/. Entries
+    are evicted least-recently-used first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.results_dir = os.path.join(root, "results")
+        self.frames_dir = os.path.join(root, "frames")
+        self.params_dir = os.path.join(root, "params")
+
+    def _result_dir(self, digest, analysis_type):
+        return os.path.join(self.results_dir, f"{digest}_{analysis_type}_v{CACHE_VERSION}")
+
+    def _frame_path(self, digest, variant=""):
+        suffix = f"_{variant}" if variant else ""
+        return os.path.join(self.frames_dir, f"{digest}{suffix}_v{CACHE_VERSION}.parquet")
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # ----- results ----- #
+
+    def get_result(self, digest, analysis_type, output_dir=None):
+        """
+        Return the cached result for this content and analysis type, or None.
+
+        With output_dir the cached files are copied there, so the caller gets
+        paths that survive later evictions and count as new for the
+        artifact sweeper's retention.
+        """
+        entry = self._result_dir(digest, analysis_type)
+        try:
+            with open(os.path.join(entry, RESULT_FILE)) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(entry)
+
+        def restore(name):
+            cached_path = os.path.join(entry, name)
+            if not os.path.exists(cached_path):
+                raise FileNotFoundError(cached_path)
+            if not output_dir:
+                return cached_path
+            os.makedirs(output_dir, exist_ok=True)
+            target = os.path.join(output_dir, name)
+            # Replace whatever an earlier run left there; a copy also gets a fresh
+            # mtime, where a hardlink would let the sweeper expire it at once
+            _copy_file(cached_path, target)
+            return target
+
+        try:
+            return _map_artifacts(result, restore)
+        except FileNotFoundError:
+            return None
+
+    def put_result(self, digest, analysis_type, result):
+        """Store a finished result; artifact files are copied (not linked) in under their base names."""
+        entry = self._result_dir(digest, analysis_type)
+        if os.path.exists(entry):
+            return
+        staging = os.path.join(self.results_dir, f".tmp_{uuid.uuid4().hex}")
+        os.makedirs(staging, exist_ok=True)
+        def store(path):
+            name = os.path.basename(path)
+            target = os.path.join(staging, name)
+            if not os.path.exists(target):
+                _copy_file(path, target)
+            return name
+
+        try:
+            stored = _map_artifacts(result, store)
+            with open(os.path.join(staging, RESULT_FILE), "w") as f:
+                json.dump(stored, f)
+            # Another worker may have stored the same entry meanwhile; keep theirs.
+            os.rename(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    # ----- preprocessed frames ----- #
+
+    def get_frame(self, digest, variant=""):
+        """Return the cached frame for this content (and variant), or None."""
+        path = self._frame_path(digest, variant)
+        if not os.path.exists(path):
+            return None
+        try:
+            frame = pd.read_parquet(path)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable cached frame {path}: {e}")
+            return None
+        self._touch(path)
+        return frame
+
+    def put_frame(self, digest, frame, variant=""):
+        path = self._frame_path(digest, variant)
+        if os.path.exists(path):
+            return
+        os.makedirs(self.frames_dir, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # Parquet needs pyarrow; without it the cache simply holds results only.
+            print(f"⚠️ Could not cache preprocessed frame: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    # ----- model parameters ----- #
+
+    def get_params(self, key):
+        """Return the parameters stored under key, or None."""
+        path = os.path.join(self.params_dir, f"{key}_v{CACHE_VERSION}.json")
+        try:
+            with open(path) as f:
+                params = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return params
+
+    def put_params(self, key, params):
+        """Store (or replace) a JSON-serialisable parameter set under key."""
+        os.makedirs(self.params_dir, exist_ok=True)
+        path = os.path.join(self.params_dir, f"{key}_v{CACHE_VERSION}.json")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(params, f)
+        os.replace(tmp_path, path)
+
+    # ----- eviction ----- #
+
+    def _entries(self):
+        for folder in (self.results_dir, self.frames_dir, self.params_dir):
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.startswith(".tmp_") or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    yield os.path.getmtime(path), _tree_size(path), path
+                except OSError:
+                    pass
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+            total -= size
+            print(f"🧹 Evicted cache entry {os.path.basename(path)}")
+
+
+result_cache = ResultCache()
@@ -0,0 +1,168 @@
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# matplotlib is imported on the first render, so importing this module (for
+# its settings) costs nothing until a chart is actually drawn.
+
+# ------------------- Settings ------------------- #
+
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png")
+CHART_FORMATS = ("png", "svg")
+CHART_SIZE = (10, 6)
+CHART_DPI = 100
+# Threads used when several charts are rendered for one job. Agg rendering
+# holds the GIL, so one thread is fastest unless the host has idle cores
+# and the job renders many large charts; jobs already run in parallel
+# across the process pool.
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 1))
+
+# Fixed margins replace a tight_layout() pass per chart; they fit the
+# default tick and label sizes at CHART_SIZE.
+CHART_MARGINS = {'left': 0.1, 'right': 0.97, 'bottom': 0.12, 'top': 0.92}
+
+
+# ------------------- Figure Templates ------------------- #
+
+class _FigureTemplate:
+    """
+    A figure, axes and line built once and re-used for every chart of its shape.
+
+    Rendering only swaps the data, title and labels, so the cost of building
+    the artists and computing the layout is paid once per thread.
+    """
+
+    def __init__(self, size, dpi, dates, markers, rotate_labels):
+        import matplotlib.dates as mdates
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=size, dpi=dpi)
+        self.figure.subplots_adjust(**CHART_MARGINS)
+        self.axes = self.figure.add_subplot()
+        self.axes.grid(True)
+        self.line, = self.axes.plot([], [], marker='o' if markers else None, linestyle='-')
+        self.forecast_line, = self.axes.plot([], [], linestyle='--', color='tab:orange')
+        self.band = None
+        if dates:
+            locator = mdates.AutoDateLocator()
+            self.axes.xaxis.set_major_locator(locator)
+            self.axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        if rotate_labels:
+            self.axes.tick_params(axis='x', labelrotation=45)
+        self.dates = dates
+
+    def _to_axis(self, x):
+        if self.dates:
+            import matplotlib.dates as mdates
+
+            return mdates.date2num(np.asarray(x, dtype='datetime64[ns]'))
+        return np.asarray(x, dtype=float)
+
+    def render(self, x, y, title, xlabel, ylabel, fmt, forecast=None):
+        self.line.set_data(self._to_axis(x), np.asarray(y, dtype=float))
+        # The forecast line and its band are swapped per chart like the data
+        if self.band is not None:
+            self.band.remove()
+            self.band = None
+        if forecast:
+            fx = self._to_axis(forecast['x'])
+            self.forecast_line.set_data(fx, np.asarray(forecast['y'], dtype=float))
+            if forecast.get('lower') is not None:
+                self.band = self.axes.fill_between(fx, forecast['lower'], forecast['upper'],
+                                                   color='tab:orange', alpha=0.15, linewidth=0)
+            self.axes.legend([self.line, self.forecast_line], ['Sales', 'Forecast'], loc='upper left')
+        else:
+            self.forecast_line.set_data([], [])
+            if self.axes.get_legend() is not None:
+                self.axes.get_legend().remove()
+        self.axes.relim()
+        if self.band is not None:
+            # relim() only sees lines; make room for the band too
+            self.axes.update_datalim(np.column_stack([np.concatenate([fx, fx]),
+                                                      np.concatenate([forecast['lower'], forecast['upper']])]))
+        self.axes.autoscale_view()
+        self.axes.set_title(title)
+        self.axes.set_xlabel(xlabel)
+        self.axes.set_ylabel(ylabel)
+
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.backends.backend_svg import FigureCanvasSVG
+
+        buffer = io.BytesIO()
+        canvas = FigureCanvasSVG(self.figure) if fmt == 'svg' else FigureCanvasAgg(self.figure)
+        if fmt == 'svg':
+            canvas.print_svg(buffer)
+        else:
+            canvas.print_png(buffer)
+        return buffer.getvalue()
+
+
+_templates = threading.local()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_template(size, dpi, dates, markers, rotate_labels):
+    cache = getattr(_templates, 'figures', None)
+    if cache is None:
+        cache = _templates.figures = {}
+    key = (tuple(size), dpi, dates, markers, rotate_labels)
+    if key not in cache:
+        cache[key] = _FigureTemplate(size, dpi, dates, markers, rotate_labels)
+    return cache[key]
+
+
+# ------------------- Rendering ------------------- #
+
+def render_line_chart(x, y, title, xlabel='Date', ylabel='Sales', path=None, fmt=None,
+                      size=CHART_SIZE, dpi=CHART_DPI, markers=True, rotate_labels=False, forecast=None) -> dict:
+    """
+    Render a single-series line chart without touching pyplot.
+
+    fmt is 'png' (rendered at exactly size x dpi pixels) or 'svg'; it
+    defaults to CHART_FORMAT. x may hold dates or numbers. forecast, if
+    given, is a dict of x and y (plus optional lower / upper band) drawn as
+    a dashed continuation. The chart is written to path when given. Returns
+    a dict with the path, format, the encoded bytes and the render time in
+    seconds.
+    """
+    fmt = (fmt or CHART_FORMAT).lower()
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"❌ Unsupported chart format '{fmt}'. Choose from: {', '.join(CHART_FORMATS)}")
+
+    start = time.perf_counter()
+    x = np.asarray(x)
+    if x.dtype.kind in 'OUS':
+        # Timestamps or date strings; anything else is not plottable on this axis.
+        x = x.astype('datetime64[ns]')
+    dates = np.issubdtype(x.dtype, np.datetime64)
+    template = _get_template(size, dpi, dates, markers, rotate_labels)
+    data = template.render(x, y, title, xlabel, ylabel, fmt, forecast)
+    if path:
+        with open(path, 'wb') as f:
+            f.write(data)
+    seconds = time.perf_counter() - start
+
+    return {'path': path, 'format': fmt, 'data': data, 'seconds': seconds}
+
+
+def render_charts(specs, max_workers=CHART_WORKERS) -> list:
+    """
+    Render several charts, in parallel threads when max_workers > 1.
+
+    specs is a list of keyword-argument dicts for render_line_chart; the
+    results come back in the same order. Every thread keeps its own figure
+    templates, so no figure is ever shared between threads.
+    """
+    global _pool
+    if len(specs) <= 1 or max_workers <= 1:
+        return [render_line_chart(**spec) for spec in specs]
+    # The pool outlives the call so its threads keep their cached templates.
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chart')
+    return list(_pool.map(lambda spec: render_line_chart(**spec), specs))
@@ -0,0 +1,471 @@
+"""
+Dedicated Excel ingestion.
+
+.xlsx sheets are read straight from the zip: the sheet XML is decompressed
+in blocks and only the cells of the projected columns are pulled out with
+one compiled pattern per column letter, then typed column by column. No
+cell objects are created for the rest of the sheet, which is what makes
+openpyxl (and pd.read_excel on top of it) slow on large exports. Sheets the
+scanner does not understand fall back to openpyxl. Legacy .xls goes through
+xlrd column by column.
+"""
+import hashlib
+import html
+import os
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+# ------------------- Settings ------------------- #
+
+# Rows searched for a header when none is given.
+HEADER_SCAN_ROWS = 20
+# Decompressed sheet XML is scanned in blocks of about this size.
+READ_BLOCK_BYTES = 4 * 1024 * 1024
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_ANY_CELL = re.compile(rb'<c r="([A-Z]{1,3})(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_TYPE_ATTR = re.compile(rb'\bt="(\w+)"')
+_STYLE_ATTR = re.compile(rb'\bs="(\d+)"')
+_VALUE = re.compile(rb'<v>([^<]*)</v>')
+_TEXT = re.compile(rb'<t(?:\s[^>]*)?>([^<]*)</t>')
+_SHARED_STRING = re.compile(rb'<si>(.*?)</si>|<si/>', re.S)
+_PHONETIC = re.compile(rb'<rPh\b.*?</rPh>', re.S)
+# Rows or cells written with a namespace prefix (<x:row>, <x:c r=...>)
+_PREFIXED = re.compile(rb'</?\w+:(?:row|c)[\s>/]')
+
+
+class UnsupportedSheet(Exception):
+    """The sheet XML uses a layout the fast scanner does not handle."""
+
+
+def sheet_variant(sheet=None, header_row=None):
+    """Return a cache tag for a sheet/header choice; empty for the defaults."""
+    if sheet is None and header_row is None:
+        return ""
+    return "sheet-" + hashlib.sha1(f"{sheet!r}:{header_row!r}".encode()).hexdigest()[:12]
+
+
+def parse_header_row(value):
+    """Validate a 1-based header row number as shown in Excel; None means auto-detect."""
+    if value in (None, ""):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("❌ Header row must be a whole number (1 = first row).")
+    if value < 1:
+        raise ValueError("❌ Header row must be 1 or greater.")
+    return value
+
+
+def _text(raw):
+    text = raw.decode("utf-8")
+    return html.unescape(text) if "&" in text else text
+
+
+def _inline_text(inner):
+    return "".join(_text(part) for part in _TEXT.findall(_PHONETIC.sub(b"", inner)))
+
+
+def _column_index(letters):
+    """Column number of a cell reference's letters (A=1); xlrd's 0-based ints pass through."""
+    if isinstance(letters, int):
+        return letters
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index
+
+
+# ------------------- XLSX Workbook ------------------- #
+
+class XlsxWorkbook:
+    """
+    Sheet lookup, shared strings and date styles of one .xlsx file.
+
+    Shared strings and styles are parsed on first use only, so a sheet of
+    plain numbers never pays for the string table.
+    """
+
+    def __init__(self, filepath):
+        try:
+            self.zip = zipfile.ZipFile(filepath)
+        except zipfile.BadZipFile:
+            raise ValueError("❌ The file is not a valid .xlsx workbook.")
+        self._strings = None
+        self._date_styles = None
+        try:
+            self.sheets, self.date1904 = self._read_workbook()
+        except (KeyError, ElementTree.ParseError):
+            self.zip.close()
+            raise UnsupportedSheet("workbook.xml not found")
+
+    def close(self):
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_workbook(self):
+        workbook = ElementTree.fromstring(self.zip.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(self.zip.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{_PKG_NS}Relationship")}
+
+        sheets = []
+        for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+            target = targets.get(sheet.get(f"{_REL_NS}id"), "")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            sheets.append((sheet.get("name"), path))
+
+        properties = workbook.find(f"{_MAIN_NS}workbookPr")
+        date1904 = properties is not None and properties.get("date1904", "0").lower() in ("1", "true")
+        return sheets, date1904
+
+    def sheet_path(self, sheet=None):
+        """Resolve a sheet name or 0-based index (default: the first sheet) to its XML part."""
+        if not self.sheets:
+            raise ValueError("❌ The workbook has no sheets.")
+        if sheet is None:
+            return self.sheets[0]
+        for name, path in self.sheets:
+            if name == sheet:
+                return name, path
+        if isinstance(sheet, int) or str(sheet).isdigit():
+            index = int(sheet)
+            if index < len(self.sheets):
+                return self.sheets[index]
+        names = ", ".join(name for name, _ in self.sheets)
+        raise ValueError(f"❌ Sheet '{sheet}' not found. Available sheets: {names}")
+
+    @property
+    def shared_strings(self):
+        if self._strings is None:
+            try:
+                data = self.zip.read("xl/sharedStrings.xml")
+            except KeyError:
+                data = b""
+            strings = []
+            for inner in _SHARED_STRING.findall(data):
+                if inner.startswith(b"<t>") and inner.endswith(b"</t>") and b"<" not in inner[3:-4]:
+                    strings.append(_text(inner[3:-4]))
+                else:
+                    strings.append(_inline_text(inner))
+            self._strings = np.array(strings, dtype=object)
+        return self._strings
+
+    @property
+    def date_styles(self):
+        """Indexes of the cell styles whose number format shows a date or time."""
+        if self._date_styles is None:
+            from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+            try:
+                styles = ElementTree.fromstring(self.zip.read("xl/styles.xml"))
+            except KeyError:
+                styles = None
+            formats = dict(BUILTIN_FORMATS)
+            date_styles = set()
+            if styles is not None:
+                for fmt in styles.iter(f"{_MAIN_NS}numFmt"):
+                    formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode", "")
+                cell_xfs = styles.find(f"{_MAIN_NS}cellXfs")
+                for index, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+                    if is_date_format(formats.get(int(xf.get("numFmtId", 0)), "")):
+                        date_styles.add(index)
+            self._date_styles = date_styles
+        return self._date_styles
+
+    # ----- sheet scanning ----- #
+
+    def blocks(self, path):
+        """
+        Yield the decompressed sheet XML in blocks that end on a row boundary.
+
+        Every block is checked against the layout the cell patterns expect
+        (unprefixed <c r="..."> cells); anything else raises UnsupportedSheet,
+        so the sheet is read through openpyxl instead of losing cells.
+        """
+        with self.zip.open(path) as stream:
+            chunk = stream.read(READ_BLOCK_BYTES)
+            # Exporters prefix every element or none, so the first chunk tells
+            if _PREFIXED.search(chunk):
+                raise UnsupportedSheet("namespace-prefixed rows or cells")
+            tail = b""
+            while chunk:
+                data = tail + chunk
+                cut = data.rfind(b"</row>")
+                if cut < 0:
+                    tail = data
+                else:
+                    yield _checked(data[:cut + 6])
+                    tail = data[cut + 6:]
+                chunk = stream.read(READ_BLOCK_BYTES)
+            if tail:
+                yield _checked(tail)
+
+    def header_rows(self, path, last_row):
+        """Return {row number: {column letters: value}} for rows up to last_row."""
+        rows = {}
+        for block in self.blocks(path):
+            cells = _ANY_CELL.findall(block)
+            for letters, row, attrs, inner in cells:
+                row = int(row)
+                if row <= last_row:
+                    value = self._column([row], [attrs], [inner])
+                    if len(value) and not pd.isna(value.iloc[0]):
+                        rows.setdefault(row, {})[letters.decode()] = value.iloc[0]
+            if not cells or int(cells[-1][1]) >= last_row:
+                break
+        return rows
+
+    def read_columns(self, path, letters, first_row):
+        """Return {letters: Series indexed by row number} for rows from first_row on."""
+        patterns = {
+            column: re.compile(b'<c r="' + column.encode() + rb'(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+            for column in letters
+        }
+        parts = {column: ([], [], []) for column in letters}
+        for block in self.blocks(path):
+            for column, pattern in patterns.items():
+                cells = pattern.findall(block)
+                if cells:
+                    rows, attrs, inner = zip(*cells)
+                    parts[column][0].extend(rows)
+                    parts[column][1].extend(attrs)
+                    parts[column][2].extend(inner)
+
+        columns = {}
+        for column, (rows, attrs, inner) in parts.items():
+            rows = np.array(rows, dtype=bytes).astype(np.int64) if rows else np.array([], dtype=np.int64)
+            keep = rows >= first_row
+            columns[column] = self._column(
+                rows[keep],
+                [value for value, kept in zip(attrs, keep) if kept],
+                [value for value, kept in zip(inner, keep) if kept],
+            )
+        return columns
+
+    def _column(self, rows, attrs, inner):
+        """Type one column's cells: numbers, dates (by cell style or t="d"), shared/inline strings."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return pd.Series([], dtype=object)
+
+        # Every distinct attribute string is decoded once: most cells share a handful
+        codes, uniques = pd.factorize(pd.Series(attrs, dtype=object))
+        kinds, dated = [], []
+        for value in uniques:
+            kind = _TYPE_ATTR.search(value)
+            style = _STYLE_ATTR.search(value)
+            kinds.append(kind.group(1).decode() if kind else "n")
+            dated.append(style is not None and int(style.group(1)) in self.date_styles)
+        kind = np.asarray(kinds, dtype=object)[codes]
+        is_date = np.asarray(dated, dtype=bool)[codes]
+
+        raw = np.array(
+            [value[3:-4] if value[:3] == b"<v>" and value.endswith(b"</v>") else _value(value) for value in inner],
+            dtype=object,
+        )
+        pieces = []
+
+        numeric = (kind == "n") | (kind == "b")
+        if numeric.any():
+            numbers = _numbers(raw[numeric])
+            dates = is_date[numeric] & (kind[numeric] == "n")
+            if dates.any():
+                origin = "1904-01-01" if self.date1904 else "1899-12-30"
+                pieces.append(pd.Series(
+                    pd.to_datetime(numbers[dates], unit="D", origin=origin).round("ms"),
+                    index=rows[numeric][dates],
+                ))
+            if (~dates).any():
+                pieces.append(pd.Series(numbers[~dates], index=rows[numeric][~dates]))
+
+        shared = kind == "s"
+        if shared.any():
+            indexes = _numbers(raw[shared])
+            strings = self.shared_strings
+            valid = (indexes >= 0) & (indexes < len(strings))
+            values = np.full(len(indexes), None, dtype=object)
+            values[valid] = strings[indexes[valid].astype(np.int64)]
+            pieces.append(pd.Series(values, index=rows[shared], dtype=object))
+
+        # t="d": dates written as ISO 8601 text instead of serial numbers
+        iso = kind == "d"
+        if iso.any():
+            values = pd.to_datetime(pd.Series([_text(value) for value in raw[iso]]), format="ISO8601",
+                                    errors="coerce")
+            if values.dt.tz is not None:
+                values = values.dt.tz_localize(None)
+            pieces.append(pd.Series(values.to_numpy(), index=rows[iso]))
+
+        text = (kind == "str") | (kind == "inlineStr")
+        if text.any():
+            pieces.append(pd.Series([_text(value) for value in raw[text]], index=rows[text], dtype=object))
+
+        # Error cells (#N/A, #DIV/0!, ...) and unknown types stay missing
+        if not pieces:
+            return pd.Series([], dtype=object)
+        column = pd.concat(pieces) if len(pieces) > 1 else pieces[0]
+        return column.sort_index()
+
+
+def _checked(block):
+    """Return block, or raise UnsupportedSheet if a cell does not start with its r attribute."""
+    if block.count(b"<c ") + block.count(b"<c>") != block.count(b'<c r="'):
+        raise UnsupportedSheet("cells without a leading r attribute")
+    return block
+
+
+def _numbers(raw):
+    """Convert raw cell values to floats; anything unparseable becomes NaN."""
+    try:
+        return np.array(raw, dtype=bytes).astype(np.float64)
+    except ValueError:
+        return pd.to_numeric(pd.Series(raw).str.decode("utf-8"), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _value(inner):
+    """Return the raw value of a cell body: its <v> or, for inline strings, the text."""
+    match = _VALUE.search(inner)
+    if match:
+        return match.group(1)
+    if b"<is>" in inner:
+        return _inline_text(inner).encode("utf-8")
+    return b""
+
+
+# ------------------- Readers ------------------- #
+
+def _columnar(frame):
+    """
+    Give every column one storable type: float, datetime or text.
+
+    Mixed columns (dates typed as dates in some rows and as text in others,
+    amounts with currency text) become strings, which preprocess_data parses
+    and coerces the same way as CSV input.
+    """
+    for name in frame.columns:
+        column = frame[name]
+        if column.dtype != object:
+            continue
+        values = column.dropna()
+        if values.map(lambda value: isinstance(value, (int, float))).all():
+            frame[name] = pd.to_numeric(column)
+        elif values.map(lambda value: isinstance(value, pd.Timestamp)).all():
+            frame[name] = pd.to_datetime(column)
+        else:
+            frame[name] = column.map(lambda value: value if pd.isna(value) else str(value)).astype(object)
+    return frame
+
+
+def _pick_header(rows, pick_columns, header_row):
+    """Return (header row number, {letters: name}) of the header the projection accepts."""
+    candidates = [header_row] if header_row else sorted(rows)
+    errors = []
+    for row in candidates:
+        cells = rows.get(row, {})
+        names = {letters: str(value).strip() if not isinstance(value, float) or not value.is_integer()
+                 else str(int(value)) for letters, value in cells.items()}
+        ordered = sorted(names, key=_column_index)
+        try:
+            wanted = pick_columns([names[letters] for letters in ordered])
+        except ValueError as e:
+            errors.append(e)
+            continue
+        letters_by_name = {}
+        for letters in ordered:
+            letters_by_name.setdefault(names[letters], letters)
+        return row, {letters_by_name[name]: name for name in wanted}
+    if errors:
+        raise errors[0]
+    raise ValueError("❌ The sheet is empty.")
+
+
+def read_xlsx(filepath, pick_columns, sheet=None, header_row=None):
+    """
+    Read the projected columns of one .xlsx sheet.
+
+    pick_columns receives the header names and returns the ones to load
+    (raising ValueError when the header does not fit). sheet is a name or a
+    0-based index, header_row the 1-based row number of the header; without
+    it the first of the top HEADER_SCAN_ROWS rows that pick_columns accepts
+    is used.
+    """
+    try:
+        with XlsxWorkbook(filepath) as workbook:
+            name, path = workbook.sheet_path(sheet)
+            rows = workbook.header_rows(path, header_row or HEADER_SCAN_ROWS)
+            header, columns = _pick_header(rows, pick_columns, header_row)
+            data = workbook.read_columns(path, list(columns), header + 1)
+    except (UnsupportedSheet, KeyError, zipfile.BadZipFile) as e:
+        print(f"⚠️ Falling back to openpyxl for {os.path.basename(filepath)}: {e}")
+        return _read_with_pandas(filepath, pick_columns, sheet, header_row)
+
+    frame = pd.DataFrame({columns[letters]: data[letters] for letters in columns})
+    frame = frame.sort_index().reset_index(drop=True)
+    print(f"📗 Read {len(frame):,} rows x {len(columns)} columns from sheet '{name}'")
+    return _columnar(frame)
+
+
+def _read_with_pandas(filepath, pick_columns, sheet=None, header_row=None):
+    sheet_name = int(sheet) if isinstance(sheet, str) and sheet.isdigit() else (sheet or 0)
+    header = (header_row or 1) - 1
+    names = list(pd.read_excel(filepath, sheet_name=sheet_name, header=header, nrows=0).columns)
+    columns = pick_columns(names)
+    frame = pd.read_excel(filepath, sheet_name=sheet_name, header=header, usecols=columns)
+    return _columnar(frame[columns])
+
+
+def read_xls(filepath, pick_columns, sheet=None, header_row=None):
+    """Read the projected columns of a legacy .xls sheet through xlrd, one column at a time."""
+    try:
+        import xlrd
+    except ImportError:
+        raise ValueError("❌ Reading .xls files needs the xlrd package (pip install xlrd), or save the file as .xlsx.")
+
+    book = xlrd.open_workbook(filepath, on_demand=True)
+    try:
+        names = book.sheet_names()
+        if sheet is None:
+            index = 0
+        elif sheet in names:
+            index = names.index(sheet)
+        elif str(sheet).isdigit() and int(sheet) < len(names):
+            index = int(sheet)
+        else:
+            raise ValueError(f"❌ Sheet '{sheet}' not found. Available sheets: {', '.join(names)}")
+        worksheet = book.sheet_by_index(index)
+
+        rows = {
+            row + 1: {col: value for col, value in enumerate(worksheet.row_values(row)) if value != ""}
+            for row in range(min(worksheet.nrows, header_row or HEADER_SCAN_ROWS))
+        }
+        header, columns = _pick_header(rows, pick_columns, header_row)
+
+        data = {}
+        for col, name in columns.items():
+            values = worksheet.col_values(col, start_rowx=header)
+            types = worksheet.col_types(col, start_rowx=header)
+            data[name] = [
+                xlrd.xldate.xldate_as_datetime(value, book.datemode) if kind == xlrd.XL_CELL_DATE
+                else None if kind in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR)
+                else value
+                for value, kind in zip(values, types)
+            ]
+    finally:
+        book.release_resources()
+
+    frame = pd.DataFrame(data).dropna(how="all").reset_index(drop=True)
+    return _columnar(frame.map(lambda value: pd.Timestamp(value) if hasattr(value, "isoformat") else value))
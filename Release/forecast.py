@@ -0,0 +1,334 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from Bot.config import business_config
+from Release.analyzer import RESAMPLE_RULES
+from Release.cache import result_cache
+
+# ------------------- Settings ------------------- #
+
+# Forecast length in units of the configured data frequency ("next 12 months").
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", business_config.get('forecast_horizon', 12)))
+FORECAST_FREQUENCY = business_config.get('data_frequency', 'monthly')
+# 'auto' picks Holt-Winters or linear trend per series on a holdout; or force one of MODELS.
+FORECAST_MODEL = os.getenv("FORECAST_MODEL", "auto")
+MODELS = ('holt_winters', 'linear')
+
+SEASON_LENGTHS = {'weekly': 52, 'monthly': 12, 'quarterly': 4, 'yearly': 1}
+PERIOD_DAYS = {'daily': 1, 'weekly': 7, 'monthly': 365.25 / 12, 'quarterly': 365.25 / 4, 'yearly': 365.25}
+MIN_PERIODS = 3
+# Periods whose values identify a series across uploads for warm starts.
+FINGERPRINT_PERIODS = 4
+# z-score of the forecast band.
+INTERVAL_Z = 1.96
+
+# Holt-Winters smoothing grid searched for every series at once.
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+BETAS = (0.0, 0.02, 0.05, 0.1, 0.2)
+GAMMAS = (0.0, 0.05, 0.1, 0.2, 0.4)
+# Step of the local grid searched around cached parameters.
+WARM_STEP = 0.05
+# Series fitted together; bounds the (series x candidates x season) state arrays.
+SERIES_BLOCK = 256
+
+
+def horizon_for(report_type, horizon=FORECAST_HORIZON, frequency=FORECAST_FREQUENCY) -> int:
+    """Convert a horizon in frequency units to report_type periods (12 months -> 52 weeks, 4 quarters)."""
+    if horizon <= 0:
+        return 0
+    days = horizon * PERIOD_DAYS.get(frequency, PERIOD_DAYS['monthly'])
+    return max(1, int(round(days / PERIOD_DAYS[report_type])))
+
+
+# ------------------- Models ------------------- #
+
+def _holt_winters(Y, m, alpha, beta, gamma):
+    """
+    Run additive Holt-Winters for every series and parameter set at once.
+
+    Y is (series, periods); alpha, beta and gamma are (series, candidates).
+    Returns the one-step-ahead squared error sums and the final level, trend
+    and seasonal states, all with a leading (series, candidates) shape.
+    """
+    n_series, n_periods = Y.shape
+    first = Y[:, :m].mean(axis=1)
+    level = np.repeat(first[:, None], alpha.shape[1], axis=1)
+    if m > 1:
+        trend = (Y[:, m:2 * m].mean(axis=1) - first) / m
+        season = np.repeat((Y[:, :m] - first[:, None])[:, None, :], alpha.shape[1], axis=1)
+    else:
+        trend = Y[:, 1] - Y[:, 0] if n_periods > 1 else np.zeros(n_series)
+        season = np.zeros(alpha.shape + (1,))
+    trend = np.repeat(trend[:, None], alpha.shape[1], axis=1)
+    sse = np.zeros(alpha.shape)
+
+    for t in range(n_periods):
+        y = Y[:, t:t + 1]
+        s = season[:, :, t % m]
+        error = y - (level + trend + s)
+        sse += error * error
+        new_level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        season[:, :, t % m] = gamma * (y - new_level) + (1 - gamma) * s
+        level = new_level
+    return sse, level, trend, season
+
+
+def _grid(m):
+    gammas = GAMMAS if m > 1 else (0.0,)
+    return np.array([(a, b, g) for a in ALPHAS for b in BETAS for g in gammas])
+
+
+def _local_grid(params):
+    """Candidates around each series' cached (alpha, beta, gamma), clipped to [0, 1]."""
+    steps = np.array([-WARM_STEP, 0.0, WARM_STEP])
+    offsets = np.array(np.meshgrid(steps, steps, steps, indexing='ij')).reshape(3, -1).T
+    return np.clip(params[:, None, :] + offsets[None, :, :], 0.0, 1.0)
+
+
+def fit_holt_winters(Y, m, horizon, candidates=None) -> dict:
+    """
+    Fit additive Holt-Winters to every row of Y and forecast horizon periods.
+
+    candidates is a (series, n, 3) array of (alpha, beta, gamma) to search;
+    by default every series searches the full grid. The best candidate per
+    series is the one with the lowest one-step-ahead squared error.
+    """
+    if candidates is None:
+        grid = _grid(m)
+        candidates = np.broadcast_to(grid, (len(Y),) + grid.shape)
+    steps = np.arange(1, horizon + 1)
+    phase = (Y.shape[1] + steps - 1) % m
+    mean = np.empty((len(Y), horizon))
+    sigma = np.empty(len(Y))
+    params = np.empty((len(Y), 3))
+
+    for first in range(0, len(Y), SERIES_BLOCK):
+        block = slice(first, first + SERIES_BLOCK)
+        alpha, beta, gamma = (np.ascontiguousarray(candidates[block, :, i]) for i in range(3))
+        sse, level, trend, season = _holt_winters(Y[block], m, alpha, beta, gamma)
+        rows = np.arange(len(alpha))
+        best = sse.argmin(axis=1)
+        mean[block] = (level[rows, best][:, None] + steps[None, :] * trend[rows, best][:, None]
+                       + season[rows, best][:, phase])
+        sigma[block] = np.sqrt(sse[rows, best] / Y.shape[1])
+        params[block] = candidates[block][rows, best]
+    return {'mean': mean, 'sigma': sigma, 'params': params}
+
+
+def fit_linear(Y, m, horizon) -> dict:
+    """
+    Fit a linear trend, plus seasonal dummies when there are two full seasons,
+    to every row of Y with one least-squares solve, and forecast horizon periods.
+    """
+    n_periods = Y.shape[1]
+    seasonal = m > 1 and n_periods >= 2 * m
+
+    def design(t):
+        columns = [np.ones(len(t)), t.astype(float)]
+        if seasonal:
+            columns += [(t % m == phase).astype(float) for phase in range(1, m)]
+        return np.column_stack(columns)
+
+    X = design(np.arange(n_periods))
+    coef, *_ = np.linalg.lstsq(X, Y.T, rcond=None)
+    residuals = Y - (X @ coef).T
+    dof = max(1, n_periods - X.shape[1])
+    return {
+        'mean': (design(np.arange(n_periods, n_periods + horizon)) @ coef).T,
+        'sigma': np.sqrt((residuals ** 2).sum(axis=1) / dof),
+        'params': np.full((len(Y), 3), np.nan),
+    }
+
+
+def _holt_winters_feasible(n_periods, m):
+    return n_periods >= max(2 * m, MIN_PERIODS + 1)
+
+
+def forecast_matrix(Y, m, horizon, model=FORECAST_MODEL, warm=None) -> dict:
+    """
+    Forecast every row of Y (series x periods) horizon periods ahead.
+
+    With model='auto' Holt-Winters and the linear trend are both fitted on
+    all but the last periods, and each series keeps the model with the lower
+    holdout error, which is then fitted on the full history. warm is an
+    optional list, one entry per series, of cached {'model', 'params'} from
+    an earlier fit; those series skip the holdout and only search a small
+    grid around their cached parameters. Returns the forecast mean, a lower
+    and an upper band, and per series the model and parameters chosen.
+    """
+    Y = np.asarray(Y, dtype=float)
+    n_series, n_periods = Y.shape
+    warm = warm or [None] * n_series
+    hw_ok = _holt_winters_feasible(n_periods, m)
+
+    usable = [
+        bool(cached) and cached.get('model') in (MODELS if model == 'auto' else (model,))
+        and (hw_ok or cached['model'] == 'linear')
+        for cached in warm
+    ]
+    warm = [cached if ok else None for cached, ok in zip(warm, usable)]
+    cold = ~np.array(usable, dtype=bool)
+    chosen = np.array([cached['model'] if cached else 'linear' for cached in warm], dtype=object)
+    if model == 'holt_winters' and hw_ok:
+        chosen[cold] = 'holt_winters'
+    elif model == 'auto' and hw_ok and cold.any():
+        rows = np.flatnonzero(cold)
+        holdout = max(1, min(m, n_periods // 4))
+        if _holt_winters_feasible(n_periods - holdout, m):
+            train, test = Y[rows, :-holdout], Y[rows, -holdout:]
+            hw_error = np.abs(fit_holt_winters(train, m, holdout)['mean'] - test).mean(axis=1)
+            linear_error = np.abs(fit_linear(train, m, holdout)['mean'] - test).mean(axis=1)
+            chosen[rows[hw_error < linear_error]] = 'holt_winters'
+        else:
+            chosen[rows] = 'holt_winters'
+
+    mean = np.zeros((n_series, horizon))
+    sigma = np.zeros(n_series)
+    params = np.full((n_series, 3), np.nan)
+    hw_rows = np.flatnonzero(chosen == 'holt_winters')
+    warm_rows = np.array([index for index in hw_rows if warm[index] and warm[index].get('params')], dtype=int)
+    cold_rows = np.setdiff1d(hw_rows, warm_rows)
+    linear_rows = np.flatnonzero(chosen == 'linear')
+
+    for rows, candidates in (
+        (cold_rows, None),
+        (warm_rows, _local_grid(np.array([warm[index]['params'] for index in warm_rows], dtype=float))
+         if len(warm_rows) else None),
+    ):
+        if len(rows):
+            fit = fit_holt_winters(Y[rows], m, horizon, candidates)
+            mean[rows], sigma[rows], params[rows] = fit['mean'], fit['sigma'], fit['params']
+    if len(linear_rows):
+        fit = fit_linear(Y[linear_rows], m, horizon)
+        mean[linear_rows], sigma[linear_rows] = fit['mean'], fit['sigma']
+
+    # Sales cannot go negative; the band widens with the square root of the lead time
+    spread = INTERVAL_Z * sigma[:, None] * np.sqrt(np.arange(1, horizon + 1))[None, :]
+    return {
+        'mean': np.maximum(mean, 0.0),
+        'lower': np.maximum(mean - spread, 0.0),
+        'upper': np.maximum(mean + spread, 0.0),
+        'model': list(chosen),
+        'params': params,
+        'warm': len(warm_rows) + sum(1 for index in linear_rows if warm[index]),
+    }
+
+
+# ------------------- Report Forecasts ------------------- #
+
+def _fingerprint(report_type, table):
+    """Identify a dataset by its first periods, which later uploads of it keep."""
+    head = table['sales'].iloc[:FINGERPRINT_PERIODS]
+    text = f"{report_type}|{table.index[0].date()}|" + ",".join(f"{value:.2f}" for value in head)
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+def _dimension_series(dimension_table, report_type, periods):
+    """Per-period sales of every (dimension, value), aligned on the report's periods."""
+    sales = dimension_table.groupby(
+        ['dimension', 'value', pd.Grouper(key='date', freq=RESAMPLE_RULES[report_type])], observed=True,
+    )['sales'].sum().unstack('date')
+    return sales.reindex(columns=periods, fill_value=0.0).fillna(0.0)
+
+
+def _change(forecast_total, history, horizon):
+    """Percentage change of the forecast against the same number of latest actual periods."""
+    previous = float(history[-horizon:].sum()) if len(history) >= horizon else None
+    if not previous:
+        return None
+    return (forecast_total / previous - 1) * 100
+
+
+def forecast_report(table: pd.DataFrame, report_type: str, last_day=None, dimension_table=None,
+                    top_n=5, horizon=None, model=FORECAST_MODEL, use_cache=True) -> dict:
+    """
+    Forecast a period table's sales, and every dimension value's, in one batch.
+
+    The overall series and, with a dimension table, the series of every
+    store / SKU / region value are stacked into one matrix and fitted
+    together by forecast_matrix. A last period that ends after last_day is
+    still in progress; it is left out of the fit and forecast instead.
+    horizon defaults to FORECAST_HORIZON converted to report_type periods.
+
+    With use_cache the chosen models and parameters are stored under a
+    fingerprint of the first periods, so the next upload of the same
+    dataset warm-starts from them. Returns None when there is too little
+    history, otherwise the overall forecast plus, per dimension, the top_n
+    values by forecast sales.
+    """
+    start = time.perf_counter()
+    horizon = horizon_for(report_type) if horizon is None else horizon
+    if last_day is not None and len(table) and pd.Timestamp(last_day) < table.index[-1]:
+        table = table.iloc[:-1]
+    if horizon <= 0 or len(table) < MIN_PERIODS:
+        return None
+
+    m = SEASON_LENGTHS[report_type]
+    labels, rows = ['total'], [table['sales'].to_numpy(dtype=float)]
+    dimension_index = None
+    if dimension_table is not None and not dimension_table.empty:
+        series = _dimension_series(dimension_table, report_type, table.index)
+        dimension_index = series.index
+        labels += [f"{dimension}={value}" for dimension, value in dimension_index]
+        rows.append(series.to_numpy(dtype=float))
+    Y = np.vstack(rows)
+
+    key = _fingerprint(report_type, table) if use_cache and len(table) > FINGERPRINT_PERIODS else None
+    cached = (result_cache.get_params(key) or {}) if key else {}
+    fitted = forecast_matrix(Y, m, horizon, model, [cached.get(label) for label in labels])
+    if key:
+        result_cache.put_params(key, {
+            label: {'model': fitted['model'][index],
+                    'params': None if np.isnan(fitted['params'][index]).any() else fitted['params'][index].tolist()}
+            for index, label in enumerate(labels)
+        })
+
+    future = pd.date_range(table.index[-1], periods=horizon + 1, freq=RESAMPLE_RULES[report_type])[1:]
+    total = float(fitted['mean'][0].sum())
+    forecast = {
+        'model': fitted['model'][0],
+        'horizon': horizon,
+        'total': total,
+        'change': _change(total, Y[0], horizon),
+        'warm_start': bool(cached),
+        'periods': [
+            {'period': period.strftime('%Y-%m-%d'), 'sales': float(mean), 'lower': float(lower),
+             'upper': float(upper)}
+            for period, mean, lower, upper in zip(future, fitted['mean'][0], fitted['lower'][0], fitted['upper'][0])
+        ],
+        'dimensions': {},
+        'seconds': round(time.perf_counter() - start, 4),
+    }
+
+    if dimension_index is not None:
+        totals = fitted['mean'][1:].sum(axis=1)
+        ranked = pd.DataFrame({
+            'dimension': dimension_index.get_level_values(0).astype(str),
+            'value': dimension_index.get_level_values(1).astype(str),
+            'sales': totals,
+            'row': np.arange(1, len(totals) + 1),
+        }).sort_values(['dimension', 'sales'], ascending=[True, False], kind='stable')
+        for dimension, group in ranked.groupby('dimension', sort=False):
+            forecast['dimensions'][dimension] = [
+                {'value': value, 'sales': float(sales), 'change': _change(float(sales), Y[row], horizon),
+                 'model': fitted['model'][row]}
+                for value, sales, row in zip(group['value'][:top_n], group['sales'][:top_n], group['row'][:top_n])
+            ]
+    print(f"🔮 Forecast {horizon} {report_type} period(s) for {len(Y)} series in {forecast['seconds']:.3f}s"
+          f"{' (warm start)' if cached else ''}")
+    return forecast
+
+
+def forecast_insight(forecast, report_type) -> str:
+    """One recommendation line summarising a forecast."""
+    span = f"the next {forecast['horizon']} {report_type[:-2]}{'s' if forecast['horizon'] != 1 else ''}"
+    if forecast['change'] is None:
+        return f"🔮 Sales are forecast at ${forecast['total']:,.2f} over {span}."
+    trend = "grow" if forecast['change'] >= 0 else "fall"
+    return (f"🔮 Sales are forecast to {trend} {abs(forecast['change']):.1f}% over {span} "
+            f"(${forecast['total']:,.2f}).")
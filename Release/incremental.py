@@ -0,0 +1,282 @@
+import fcntl
+import json
+import os
+import re
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from Release.analyzer import (
+    REPORT_TYPES, RESAMPLE_RULES, build_daily_table, rollup_periods, sample_std, count_declines,
+    build_metrics, _period_label,
+)
+
+# ------------------- Settings ------------------- #
+
+STATE_DIR = os.getenv("DATASET_STATE_DIR", os.path.join("outputs", "datasets"))
+DATASET_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+STATE_FILE = "state.json"
+LOCK_FILE = ".lock"
+SUMMED_COLUMNS = ['sales', 'expenses', 'rows', 'sales_sq']
+
+
+def validate_dataset_id(dataset_id):
+    if not DATASET_ID_PATTERN.match(dataset_id or ""):
+        raise ValueError("❌ Dataset IDs may only use letters, digits, '-' and '_' (max 64 characters).")
+    return dataset_id
+
+
+# ------------------- Running Statistics ------------------- #
+
+def _empty_stats():
+    return {'n': 0, 's1': 0.0, 's2': 0.0, 'declines': 0, 'max': None, 'min': None}
+
+
+def _better(candidate, current, higher):
+    """Whether (label, value) beats current; ties go to the earlier period like idxmax/idxmin."""
+    if current is None:
+        return True
+    label, value = candidate
+    best_label, best_value = current
+    if value != best_value:
+        return value > best_value if higher else value < best_value
+    return label < best_label
+
+
+def _scan_extreme(table, higher):
+    sales = table['sales']
+    label = sales.idxmax() if higher else sales.idxmin()
+    return [_period_label(label), float(sales[label])]
+
+
+def _declines_at(values, positions):
+    """Declines for the pairs (i - 1, i) at the given positions."""
+    positions = positions[(positions >= 1) & (positions < len(values))]
+    return count_declines(values[positions - 1], values[positions])
+
+
+class DatasetState:
+    """
+    Running aggregates for one dataset that grows by appends.
+
+    For every report type the state keeps the per-period table (sales,
+    expenses, row counts, sums of squared row sales) plus running statistics
+    over the period sales: count, sum, sum of squares, number of declines and
+    the highest/lowest period. An append rolls only the new rows up, touches
+    only the periods they fall in, and adjusts the running statistics for
+    those periods and their neighbours; no history is re-read.
+    """
+
+    def __init__(self, dataset_id, root=STATE_DIR):
+        self.dataset_id = validate_dataset_id(dataset_id)
+        self.path = os.path.join(root, dataset_id)
+        self.totals = {'rows': 0, 'sales': 0.0, 'expenses': 0.0, 'sales_sq': 0.0}
+        self.tables = {}
+        self.stats = {}
+
+    # ----- persistence ----- #
+
+    @contextmanager
+    def locked(self):
+        """Hold an exclusive lock on the dataset so appends never interleave."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, STATE_FILE))
+
+    def load(self):
+        if not self.exists():
+            return self
+        with open(os.path.join(self.path, STATE_FILE)) as f:
+            saved = json.load(f)
+        self.totals = saved['totals']
+        self.stats = saved['stats']
+        for report_type in self.stats:
+            table = pd.read_parquet(os.path.join(self.path, f"{report_type}.parquet"))
+            table.index = pd.DatetimeIndex(table.index, freq=RESAMPLE_RULES[report_type], name='date')
+            self.tables[report_type] = table
+        return self
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        for report_type, table in self.tables.items():
+            path = os.path.join(self.path, f"{report_type}.parquet")
+            table.to_parquet(f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        state_path = os.path.join(self.path, STATE_FILE)
+        with open(f"{state_path}.tmp", "w") as f:
+            json.dump({'dataset_id': self.dataset_id, 'totals': self.totals, 'stats': self.stats}, f)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    # ----- updates ----- #
+
+    def append(self, rows: pd.DataFrame) -> dict:
+        """
+        Merge new rows (preprocessed rows or a daily table) into the state.
+
+        Returns how many rows and periods the append touched.
+        """
+        daily = build_daily_table(rows)
+        daily = daily[daily['rows'] > 0]
+        if daily.empty:
+            return {'rows': 0, 'periods_touched': {}}
+
+        for key in self.totals:
+            self.totals[key] += daily[key].sum().item()
+
+        touched = {}
+        for report_type in REPORT_TYPES:
+            touched[report_type] = self._merge(report_type, rollup_periods(daily, report_type))
+        return {'rows': int(daily['rows'].sum()), 'periods_touched': touched}
+
+    def _merge(self, report_type, delta):
+        delta = delta[delta['rows'] > 0][SUMMED_COLUMNS]
+        stats = self.stats.setdefault(report_type, _empty_stats())
+        table = self.tables.get(report_type)
+
+        if table is None or table.empty:
+            table = delta.resample(RESAMPLE_RULES[report_type]).sum()
+            values = table['sales'].to_numpy(dtype=float)
+            stats.update(
+                n=len(values), s1=float(values.sum()), s2=float((values ** 2).sum()),
+                declines=count_declines(values[:-1], values[1:]),
+                max=_scan_extreme(table, higher=True), min=_scan_extreme(table, higher=False),
+            )
+            self.tables[report_type] = table
+            return len(delta)
+
+        table = self._extend(report_type, table, stats, delta.index.min(), delta.index.max())
+
+        # Adjust the running statistics for the touched periods only
+        positions = table.index.get_indexer(delta.index)
+        sales = table['sales'].to_numpy(dtype=float, copy=True)
+        old = sales[positions]
+        pairs = np.unique(np.concatenate([positions, positions + 1]))
+        declines_before = _declines_at(sales, pairs)
+
+        new = old + delta['sales'].to_numpy(dtype=float)
+        sales[positions] = new
+        stats['declines'] += _declines_at(sales, pairs) - declines_before
+        stats['s1'] += float((new - old).sum())
+        stats['s2'] += float((new ** 2 - old ** 2).sum())
+
+        for column in SUMMED_COLUMNS:
+            table.iloc[positions, table.columns.get_loc(column)] += delta[column].to_numpy()
+
+        # Highest/lowest: compare the touched periods, rescan only if the
+        # current extreme itself moved the wrong way
+        labels = [_period_label(label) for label in table.index[positions]]
+        for higher, key in ((True, 'max'), (False, 'min')):
+            best_label = stats[key][0]
+            if best_label in labels:
+                index = labels.index(best_label)
+                moved_away = new[index] < old[index] if higher else new[index] > old[index]
+                if moved_away:
+                    stats[key] = _scan_extreme(table, higher)
+                    continue
+            for label, value in zip(labels, new):
+                if _better((label, float(value)), stats[key], higher):
+                    stats[key] = [label, float(value)]
+
+        self.tables[report_type] = table
+        return len(delta)
+
+    def _extend(self, report_type, table, stats, start, end):
+        """Add empty periods so [start, end] is covered, updating stats for them."""
+        rule = RESAMPLE_RULES[report_type]
+        first, last = table.index[0], table.index[-1]
+        before = pd.date_range(start, first, freq=rule, inclusive='left') if start < first else None
+        after = pd.date_range(last, end, freq=rule, inclusive='right') if end > last else None
+        if before is None and after is None:
+            return table
+
+        zeros = lambda index: pd.DataFrame(0, index=index, columns=table.columns).astype(table.dtypes)
+        parts = [part for part in (
+            zeros(before) if before is not None else None, table, zeros(after) if after is not None else None,
+        ) if part is not None]
+        extended = pd.concat(parts)
+        extended.index = pd.DatetimeIndex(extended.index, freq=rule, name='date')
+
+        sales = extended['sales'].to_numpy(dtype=float)
+        new_positions = []
+        if before is not None:
+            # Pairs (i - 1, i) that did not exist before: inside the new prefix and at its join
+            new_positions.extend(range(1, len(before) + 1))
+        if after is not None:
+            new_positions.extend(range(len(extended) - len(after), len(extended)))
+        stats['declines'] += _declines_at(sales, np.array(new_positions, dtype=int))
+        stats['n'] = len(extended)
+
+        for index in (before, after):
+            if index is None:
+                continue
+            label = _period_label(index[0])
+            for key, higher in (('max', True), ('min', False)):
+                if _better((label, 0.0), stats[key], higher):
+                    stats[key] = [label, 0.0]
+        return extended
+
+    # ----- reporting ----- #
+
+    def metrics(self, report_type) -> dict:
+        """Metrics for one report type, in the same shape as summarize_periods."""
+        table = self.tables.get(report_type)
+        if table is None:
+            raise ValueError(f"❌ Dataset '{self.dataset_id}' has no data yet.")
+        stats = self.stats[report_type]
+        highest = {'period': stats['max'][0], 'sales': stats['max'][1]}
+        lowest = {'period': stats['min'][0], 'sales': stats['min'][1]}
+        sales = table['sales']
+        return build_metrics(
+            report_type,
+            row_count=int(self.totals['rows']),
+            total_revenue=float(self.totals['sales']),
+            total_expenses=float(self.totals['expenses']),
+            highest=highest,
+            lowest=lowest,
+            std_dev=sample_std(stats['s1'], stats['s2'], stats['n']),
+            row_std_dev=sample_std(self.totals['sales'], self.totals['sales_sq'], self.totals['rows']),
+            declines=stats['declines'],
+            first_sales=float(sales.iloc[0]),
+            last_sales=float(sales.iloc[-1]),
+            mean_sales=stats['s1'] / stats['n'] if stats['n'] else 0.0,
+            table=table,
+        )
+
+
+def append_to_dataset(dataset_id, rows, report_types, root=STATE_DIR) -> dict:
+    """Merge rows into a dataset's persistent state and return the updated metrics."""
+    with DatasetState(dataset_id, root).locked() as state:
+        state.load()
+        appended = state.append(rows)
+        if appended['rows']:
+            state.save()
+        if not state.tables:
+            raise ValueError("❌ No valid rows found to append.")
+        return {
+            'dataset_id': dataset_id,
+            'appended_rows': appended['rows'],
+            'periods_touched': appended['periods_touched'],
+            'metrics': {report_type: state.metrics(report_type) for report_type in report_types},
+        }
+
+
+def dataset_metrics(dataset_id, report_types, root=STATE_DIR) -> dict:
+    """Return the current metrics of a dataset, or None if it does not exist."""
+    state = DatasetState(dataset_id, root)
+    if not state.exists():
+        return None
+    with state.locked():
+        state.load()
+    return {
+        'dataset_id': dataset_id,
+        'metrics': {report_type: state.metrics(report_type) for report_type in report_types},
+    }
@@ -0,0 +1,301 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from Release.incremental import append_to_dataset
+from Release.main import analyze_data, analyze_table, load_daily_table
+from Release.telemetry import peak_memory_bytes, profiled, record_job, reset_peak_memory
+
+# ------------------- Settings ------------------- #
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join("outputs", "jobs"))
+MAX_WORKERS = int(os.getenv("ANALYSIS_WORKERS", min(4, os.cpu_count() or 1)))
+# Jobs allowed to be queued or running at once; further submissions are refused.
+MAX_PENDING_JOBS = int(os.getenv("ANALYSIS_MAX_PENDING", MAX_WORKERS * 4))
+# Finished job records kept in memory for /jobs lookups.
+MAX_FINISHED_JOBS = int(os.getenv("ANALYSIS_MAX_FINISHED", 500))
+# Recycle workers so memory from one large file is returned to the OS.
+MAX_TASKS_PER_WORKER = int(os.getenv("ANALYSIS_TASKS_PER_WORKER", 20))
+
+PROGRESS_FILE = "progress.json"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+# ------------------- Worker Side ------------------- #
+
+def _write_progress(job_dir, stage):
+    path = os.path.join(job_dir, PROGRESS_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"stage": stage, "updated_at": time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+def run_job(job_dir, source, analysis_type, digest=None, options=None):
+    """
+    Entry point executed inside a pool worker.
+
+    source is a file path or a daily table; options are passed through to
+    analyze_data / analyze_table (e.g. chart_format), except profile
+    ('cprofile' or 'tracemalloc'), which captures a profile of the job into
+    job_dir. The peak resident memory of the job is added to the result's
+    telemetry.
+    """
+    _write_progress(job_dir, "started")
+    options = dict(options or {})
+    profile = options.pop("profile", None)
+    options.update(
+        analysis_type=analysis_type,
+        output_dir=job_dir,
+        progress=lambda stage: _write_progress(job_dir, stage),
+    )
+    reset_peak_memory()
+    capture = {}
+    try:
+        with profiled(profile, job_dir, capture):
+            if isinstance(source, str):
+                result = analyze_data(source, **options)
+            else:
+                result = analyze_table(source, digest=digest, **options)
+        if "telemetry" in result:
+            result["telemetry"].update(capture, peak_memory_bytes=peak_memory_bytes())
+        return result
+    finally:
+        _write_progress(job_dir, "finished")
+
+
+def append_job(dataset_id, source, analysis_type):
+    """Entry point for dataset appends: source is a daily table or the path of a spooled upload."""
+    table = load_daily_table(source) if isinstance(source, str) else source
+    return append_to_dataset(dataset_id, table, analysis_type)
+
+
+# ------------------- Job Manager ------------------- #
+
+class JobManager:
+    """Runs analyses in a bounded process pool and tracks their state."""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING_JOBS, jobs_dir=JOBS_DIR):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.jobs_dir = jobs_dir
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        # Untracked tasks (see run and call) that are queued or running
+        self._tasks = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=MAX_TASKS_PER_WORKER,
+            )
+        return self._executor
+
+    def _submit_task(self, fn, *args):
+        # Call with the lock held. A pool broken by a task outside job tracking is replaced here.
+        try:
+            return self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            return self._get_executor().submit(fn, *args)
+
+    def run(self, fn, *args):
+        """
+        Queue fn(*args) on the job pool without tracking it as a job; returns its future.
+
+        The task holds a queue slot until it ends, so it counts against
+        max_pending like a job and raises QueueFullError when the queue is
+        full. Batch runs queue their files here, so they share the job
+        workers (and the admission control) instead of starting a second
+        pool next to them.
+        """
+        with self._lock:
+            pending = self._pending()
+            if pending >= self.max_pending:
+                raise QueueFullError(f"❌ Server is busy ({pending} jobs pending). Please retry shortly.")
+            future = self._submit_task(fn, *args)
+            self._tasks += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        # A worker that died (usually OOM-killed) breaks the pool; later tasks get a fresh one.
+        broken = not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+        with self._lock:
+            if broken and self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._tasks -= 1
+
+    def _pending(self):
+        # Call with the lock held.
+        return self._tasks + sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending()
+
+    def is_full(self):
+        return self.pending_count() >= self.max_pending
+
+    def submit(self, source, analysis_type, cleanup=False, digest=None, **options):
+        """
+        Queue an analysis and return its job ID.
+
+        source is either a file path or a daily table built by
+        Release.streaming, in which case digest (the hash of the uploaded
+        bytes) lets the worker use the result cache. Extra keyword options
+        are forwarded to the analysis function. Raises QueueFullError when max_pending jobs are
+        already queued or running. With cleanup=True an input file is deleted
+        once the job ends.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+
+        with self._lock:
+            pending = self._pending()
+            if pending >= self.max_pending:
+                raise QueueFullError(f"❌ Server is busy ({pending} jobs pending). Please retry shortly.")
+            os.makedirs(job_dir, exist_ok=True)
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "analysis_type": analysis_type,
+                "output_dir": job_dir,
+                "input_path": source if isinstance(source, str) else None,
+                "created_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            future = self._submit_task(run_job, job_dir, source, analysis_type, digest, options)
+
+        cleanup_path = source if cleanup and isinstance(source, str) else None
+        future.add_done_callback(lambda f: self._finish(job_id, f, cleanup_path))
+        return job_id
+
+    def _finish(self, job_id, future, cleanup_path):
+        broken = False
+        try:
+            result = future.result()
+            error = result.get("error")
+        except BrokenProcessPool as e:
+            # A worker died (usually OOM-killed); start a fresh pool for later jobs.
+            result, error, broken = None, f"❌ Job failed: {e}", True
+        except Exception as e:
+            result, error = None, f"❌ Job failed: {e}"
+
+        with self._lock:
+            if broken and self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["status"] = "failed" if error else "done"
+                job["result"] = None if error else result
+                job["error"] = error
+                job["finished_at"] = time.time()
+                record_job(job["status"], job["result"], job["finished_at"] - job["created_at"])
+            self._prune()
+
+        if cleanup_path and os.path.exists(cleanup_path):
+            os.remove(cleanup_path)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the job pool for a request that waits for it; returns its future.
+
+        Nothing is written under jobs_dir and no job record is kept, but the
+        call counts against max_pending like a job (raising QueueFullError
+        when the queue is full) and is recorded in /metrics once it ends.
+        """
+        future = self.run(partial(fn, *args, **kwargs))
+        started_at = time.time()
+        future.add_done_callback(lambda f: self._record_call(f, started_at))
+        return future
+
+    def _record_call(self, future, started_at):
+        try:
+            result = future.result()
+            error = result.get("error")
+        except Exception:
+            result, error = None, True
+        record_job("failed" if error else "done", None if error else result, time.time() - started_at)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job["finished_at"] is not None]
+        if len(finished) > MAX_FINISHED_JOBS:
+            finished.sort(key=lambda job: job["finished_at"])
+            for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+                del self._jobs[job["job_id"]]
+
+    def _read_progress(self, job):
+        try:
+            with open(os.path.join(job["output_dir"], PROGRESS_FILE)) as f:
+                return json.load(f)["stage"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def status(self, job_id):
+        """Return a snapshot of the job without its result, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        job.pop("result")
+        progress = self._read_progress(job)
+        if job["status"] == "queued" and progress:
+            job["status"] = "running"
+        job["progress"] = progress or job["status"]
+        job.pop("output_dir")
+        job.pop("input_path")
+        return job
+
+    def result(self, job_id):
+        """Return the job record including its result, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def artifact(self, job_id, name):
+        """
+        Return the path of a finished job's PDF or chart called name, or None.
+
+        Only files listed in the job's result are served, so name can never
+        reach outside the job's outputs.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            result = job["result"] if job is not None else None
+        if not result:
+            return None
+        paths = [result.get("pdf_report")] + list(result.get("chart_images", {}).values())
+        for path in paths:
+            if path and os.path.basename(path) == name:
+                return path
+        return None
+
+    def active_paths(self):
+        """Output directories and input files of queued or running jobs (kept by the sweeper)."""
+        with self._lock:
+            active = [job for job in self._jobs.values() if job["status"] in ("queued", "running")]
+            return [path for job in active for path in (job["output_dir"], job["input_path"]) if path]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
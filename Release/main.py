@@ -1,55 +1,455 @@
+import hashlib
 import os
 import time
 import pandas as pd
-from Release.analyzer import preprocess_data, generate_report, plot_revenue_trends
+from Release.cache import hash_file, result_cache
+from Release.analyzer import (
+    preprocess_data, parse_report_types, build_daily_table, rollup_periods, summarize_periods,
+    generate_combined_report, chart_spec, parse_dimensions, parse_top_n, resolve_dimensions,
+    build_dimension_table, summarize_dimensions, dimension_appendix,
+)
+from Release.charts import CHART_FORMAT, CHART_FORMATS, render_charts
+from Release.excel import parse_header_row, sheet_variant
+from Release.forecast import forecast_insight, forecast_report
+from Release.storage import get_output_paths
+from Release.streaming import MEMORY_BUDGET_BYTES, aggregate_file, should_chunk
+from Release.telemetry import StageTimer
+from Release.utils import load_file
 
-def get_output_paths():
+def load_daily_table(filepath: str) -> pd.DataFrame:
     """
-    Create and return output paths for reports and charts.
+    Read and preprocess a file and return its per-day totals.
+
+    The file is aggregated chunk by chunk and the frame has the same columns
+    as a streamed upload's table, so spooled and streamed appends are
+    handled alike.
+    """
+    return aggregate_file(filepath)['table']
+
+
+def analyze_data(filepath: str, analysis_type='monthly', output_dir: str = None, progress=None,
+                 use_cache: bool = True, chart_format: str = CHART_FORMAT, sheet=None, header_row=None,
+                 chunked: bool = None, memory_budget: int = None, keep_daily: bool = False,
+                 dimensions=None, top_n: int = None, digest: str = None) -> dict:
     """
-    base_dir = "outputs"
-    report_dir = os.path.join(base_dir, "reports")
-    chart_dir = os.path.join(base_dir, "charts")
+    Run the full analysis for one file.
 
-    os.makedirs(report_dir, exist_ok=True)
-    os.makedirs(chart_dir, exist_ok=True)
+    analysis_type is one report type, a list of them, a comma-separated
+    string or 'all'; several types share one daily aggregate and produce a
+    single combined PDF plus one chart per type.
 
-    return report_dir, chart_dir
+    When output_dir is given the PDF and chart are written there, so concurrent
+    jobs never share output paths; otherwise every run gets its own
+    reports/<date>/<run> and charts/<date>/<run> directories. progress, if given, is called with the name
+    of each stage as it starts. chart_format is 'png' or 'svg'. With
+    use_cache the file is hashed first (unless its digest is given): a
+    repeated file and analysis type returns the cached outputs, and a known
+    file with a new analysis type reuses the cached preprocessed frame. The
+    result then carries the hash as "digest".
+    For Excel files sheet (name or 0-based index) and header_row (1-based)
+    choose what is read; both default to the first sheet and a detected header.
 
-def analyze_data(filepath: str, analysis_type: str = 'monthly') -> dict:
+    Files too large to load at once are analysed out of core: read in chunks
+    sized to memory_budget bytes (default ANALYSIS_MEMORY_BUDGET_MB) and
+    folded into per-day totals, with identical metrics. chunked=True forces
+    that mode, chunked=False loads the whole file, None decides by size.
+    keep_daily also writes the per-day table as Parquet next to the PDF and
+    returns its path as "daily_table" (batch runs combine these).
+
+    dimensions adds a breakdown by categorical columns such as store, SKU or
+    region: 'auto' detects them from the header, or name them in a list or
+    comma-separated string. They are read as categoricals and grouped per
+    day in one pass; the result's "dimensions" then holds, per report type
+    and dimension, the top_n values overall and per period (default
+    DIMENSION_TOP_N), and the PDF gets matching tables.
+
+    Every report type also gets a sales forecast for business_config's
+    forecast_horizon (Release.forecast) in its metrics, chart and PDF
+    section; with dimensions, every value is forecast in the same batch.
+
+    The result's "telemetry" holds the seconds spent per stage (hash, read,
+    preprocess with its date_parse share, resample, chart, pdf), the row
+    count and the bytes read. In chunked mode read covers the per-chunk
+    coercion too, and preprocess reports that share; "chunks" is the number
+    of chunks read.
+    """
     start_time = time.time()
     print(f"📂 Processing file: {filepath} with analysis type: {analysis_type}")
+    report_progress = StageTimer(progress)
 
     try:
-        # Read the uploaded file
-        if filepath.endswith('.csv'):
-            df = pd.read_csv(filepath)
-        elif filepath.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(filepath)
-        else:
-            return {"error": "❌ Unsupported file type. Please upload a CSV or Excel file."}
-    except Exception as e:
-        return {"error": f"❌ Failed to read file: {e}"}
+        report_types = parse_report_types(analysis_type)
+        chart_format = _parse_chart_format(chart_format)
+        header_row = parse_header_row(header_row)
+        dimensions = parse_dimensions(dimensions)
+        top_n = parse_top_n(top_n)
+    except ValueError as e:
+        return {"error": str(e)}
+    variant = sheet_variant(sheet, header_row)
+    # Dimension tables are cached next to the plain frame, keyed on the dimensions asked for
+    dimension_variant = _dimension_variant(variant, dimensions)
+    cache_key = _cache_key(report_types, chart_format, variant, dimensions, top_n)
+    if keep_daily:
+        # Earlier runs without keep_daily cached no per-day table to restore
+        cache_key += ".daily"
+
+    df = dimension_table = None
+    digest = digest if use_cache else None
+    if use_cache:
+        if not digest:
+            report_progress("hashing")
+            digest = hash_file(filepath)
+        cached = _cached_result(digest, cache_key, output_dir, start_time, report_progress,
+                                os.path.getsize(filepath))
+        if cached:
+            return dict(cached, digest=digest)
+        df = result_cache.get_frame(digest, variant)
+        if df is not None and dimensions:
+            dimension_table = result_cache.get_frame(digest, dimension_variant)
+            if dimension_table is None:
+                # The dimension columns were never cached; read the file again
+                df = None
+        if df is not None:
+            print(f"♻️ Reusing cached preprocessed data for {filepath}")
+
+    budget = memory_budget or MEMORY_BUDGET_BYTES
+    chunks = None
+    if df is None and chunked is None:
+        try:
+            chunked = should_chunk(filepath, budget)
+        except ValueError as e:
+            return {"error": str(e)}
+    if df is None and chunked:
+        try:
+            report_progress("reading")
+            ingested = aggregate_file(filepath, budget, sheet=sheet, header_row=header_row, dimensions=dimensions)
+        except ValueError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"❌ Failed to read file: {e}"}
+        stats = ingested["stats"]
+        report_progress.record("preprocess", stats["coerce_seconds"])
+        report_progress.record("date_parse", stats["seconds"])
+        if dimensions:
+            report_progress.record("groupby", stats["group_seconds"])
+        df, chunks = ingested["table"], stats["chunks"]
+        dimension_table = ingested.get("dimensions")
+        if digest:
+            report_progress("caching")
+            result_cache.put_frame(digest, df, variant)
+            if dimension_table is not None:
+                result_cache.put_frame(digest, dimension_table, dimension_variant)
+
+    if df is None:
+        try:
+            # Read the uploaded file
+            report_progress("reading")
+            df = load_file(filepath, extra_columns=dimensions, sheet=sheet, header_row=header_row,
+                           use_cache=use_cache, digest=digest)
+            # preprocess_data lowercases the header, so the dimensions are named likewise
+            resolved = [str(dim).strip().lower() for dim in resolve_dimensions(dimensions, df.columns)]
+        except ValueError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"❌ Failed to read file: {e}"}
+
+        try:
+            report_progress("preprocessing")
+            df = preprocess_data(df)
+            report_progress.record("date_parse", df.attrs['date_parse']['seconds'])
+            if dimensions:
+                report_progress("grouping")
+                dimension_table = build_dimension_table(df, resolved)
+        except Exception as e:
+            return {"error": f"❌ Error during analysis: {e}"}
+
+        if digest:
+            report_progress("caching")
+            result_cache.put_frame(digest, df[['date', 'sales', 'expenses', 'profit']], variant)
+            if dimension_table is not None:
+                result_cache.put_frame(digest, dimension_table, dimension_variant)
+
+    result = _render_outputs(df, report_types, output_dir, report_progress, start_time, chart_format,
+                             keep_daily=keep_daily, dimension_table=dimension_table, top_n=top_n,
+                             use_cache=use_cache)
+    if "error" not in result:
+        result["telemetry"] = _telemetry(report_progress, result, os.path.getsize(filepath))
+        if chunks is not None:
+            result["telemetry"]["chunks"] = chunks
+        if digest:
+            result_cache.put_result(digest, cache_key, result)
+            result["digest"] = digest
+    return result
+
+
+def analyze_table(table: pd.DataFrame, analysis_type='monthly', output_dir: str = None, progress=None,
+                  digest: str = None, chart_format: str = CHART_FORMAT, input_bytes: int = 0,
+                  appendix=None, dimension_table: pd.DataFrame = None, top_n: int = None) -> dict:
+    """
+    Run the analysis on an already aggregated daily table.
+
+    The table comes from Release.streaming (date, sales, expenses, profit,
+    rows, sales_sq), so there is nothing left to read or preprocess. digest is the
+    SHA-256 of the uploaded bytes; when given, results are cached under it.
+    input_bytes is the upload size, reported in the result's telemetry.
+    appendix holds extra (title, header, rows) tables for the end of the PDF.
+    dimension_table, a table from build_dimension_table, adds the top_n
+    dimension rankings as in analyze_data; it is not cached.
+    """
+    start_time = time.time()
+    print(f"📂 Processing daily table ({len(table)} days) with analysis type: {analysis_type}")
+    report_progress = StageTimer(progress)
 
     try:
-        # Run preprocessing and analysis
-        df = preprocess_data(df)
-        plot_revenue_trends(df, analysis_type)  # Using the analysis_type to plot the trends
-        generate_report(df, analysis_type)  # Using the analysis_type to generate the report
+        report_types = parse_report_types(analysis_type)
+        chart_format = _parse_chart_format(chart_format)
+        top_n = parse_top_n(top_n)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    if digest and dimension_table is None:
+        cached = _cached_result(digest, _cache_key(report_types, chart_format), output_dir, start_time,
+                                report_progress, input_bytes)
+        if cached:
+            return cached
+        result_cache.put_frame(digest, table)
+
+    result = _render_outputs(table, report_types, output_dir, report_progress, start_time, chart_format,
+                             appendix=appendix, dimension_table=dimension_table, top_n=top_n)
+    if "error" not in result:
+        result["telemetry"] = _telemetry(report_progress, result, input_bytes)
+        if digest and dimension_table is None:
+            result_cache.put_result(digest, _cache_key(report_types, chart_format), result)
+    return result
+
+
+def analyze_metrics(source, analysis_type='monthly', progress=None, use_cache: bool = True, digest: str = None,
+                    input_bytes: int = 0, sheet=None, header_row=None, dimensions=None, top_n: int = None) -> dict:
+    """
+    Compute the metrics only: no chart or PDF is drawn and nothing is written.
+
+    source is a file path, read in chunks like a chunked analyze_data, or a
+    daily table from Release.streaming (digest and input_bytes as for
+    analyze_table). The result holds "metrics" per report type (totals,
+    margin, insights, the per-period series and the forecast), "dimensions"
+    when dimensions are asked for (files only) and "telemetry". With
+    use_cache results are cached apart from the full analyses, and the
+    cached frames are shared with them.
+    """
+    start_time = time.time()
+    report_progress = StageTimer(progress)
+
+    try:
+        report_types = parse_report_types(analysis_type)
+        header_row = parse_header_row(header_row)
+        dimensions = parse_dimensions(dimensions)
+        top_n = parse_top_n(top_n)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    from_file = isinstance(source, (str, os.PathLike))
+    variant = sheet_variant(sheet, header_row) if from_file else ""
+    if from_file:
+        print(f"📂 Computing metrics for {source} with analysis type: {analysis_type}")
+        input_bytes = os.path.getsize(source)
+        if use_cache and not digest:
+            report_progress("hashing")
+            digest = hash_file(source)
+    else:
+        print(f"📂 Computing metrics for streamed table ({len(source)} days) with analysis type: {analysis_type}")
+        dimensions = []
+    use_cache = use_cache and bool(digest)
+    dimension_variant = _dimension_variant(variant, dimensions)
+    cache_key = _cache_key(report_types, "json", variant, dimensions, top_n)
+    if use_cache:
+        cached = _cached_result(digest, cache_key, None, start_time, report_progress, input_bytes)
+        if cached:
+            return cached
+
+    table, dimension_table = (None, None) if from_file else (source, None)
+    if from_file and use_cache:
+        table = result_cache.get_frame(digest, variant)
+        if table is not None and dimensions:
+            dimension_table = result_cache.get_frame(digest, dimension_variant)
+            if dimension_table is None:
+                table = None
+    if table is None:
+        try:
+            report_progress("reading")
+            ingested = aggregate_file(source, sheet=sheet, header_row=header_row, dimensions=dimensions)
+        except ValueError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"❌ Failed to read file: {e}"}
+        stats = ingested["stats"]
+        report_progress.record("preprocess", stats["coerce_seconds"])
+        report_progress.record("date_parse", stats["seconds"])
+        if dimensions:
+            report_progress.record("groupby", stats["group_seconds"])
+        table, dimension_table = ingested["table"], ingested.get("dimensions")
+        if use_cache:
+            report_progress("caching")
+            result_cache.put_frame(digest, table, variant)
+            if dimension_table is not None:
+                result_cache.put_frame(digest, dimension_table, dimension_variant)
+    elif use_cache and not from_file:
+        result_cache.put_frame(digest, table)
+
+    try:
+        _, _, metrics, dimension_metrics = _compute_metrics(table, report_types, report_progress,
+                                                            dimension_table, top_n, use_cache)
     except Exception as e:
-        return {"error": f"❌ Error during analysis: {e}"}
+        return {"error": str(e) if str(e).startswith("❌") else f"❌ Error during analysis: {e}"}
+
+    result = {
+        "summary": f"✅ Metrics computed. Time taken: {time.time() - start_time:.2f} seconds.",
+        "analysis_types": report_types,
+        "metrics": metrics,
+    }
+    if dimension_metrics is not None:
+        result["dimensions"] = dimension_metrics
+    result["telemetry"] = _telemetry(report_progress, result, input_bytes)
+    if use_cache:
+        result_cache.put_result(digest, cache_key, result)
+    return result
+
+
+def _parse_chart_format(chart_format):
+    chart_format = (chart_format or CHART_FORMAT).lower()
+    if chart_format not in CHART_FORMATS:
+        raise ValueError(f"❌ Invalid chart format. Choose from: {', '.join(CHART_FORMATS)}")
+    return chart_format
+
+
+def _cache_key(report_types, chart_format, variant="", dimensions=(), top_n=None):
+    key = f"{'+'.join(report_types)}.{chart_format}"
+    if variant:
+        key = f"{key}.{variant}"
+    if dimensions:
+        key = f"{key}.{_dimension_variant('', dimensions)}-top{top_n}"
+    return key
+
+
+def _dimension_variant(variant, dimensions):
+    if not dimensions:
+        return variant
+    tag = hashlib.sha1(",".join(dimensions).encode()).hexdigest()[:8]
+    return f"{variant}-dims-{tag}" if variant else f"dims-{tag}"
 
+
+def _cached_result(digest, cache_key, output_dir, start_time, timer, input_bytes=0):
+    result = result_cache.get_result(digest, cache_key, output_dir)
+    if result:
+        print(f"♻️ Serving cached {cache_key} analysis for {digest[:12]}")
+        result["summary"] = f"✅ Analysis complete (cached). Time taken: {time.time() - start_time:.2f} seconds."
+        result["telemetry"] = dict(_telemetry(timer, result, input_bytes), cached=True)
+    return result
+
+
+def _telemetry(timer, result, input_bytes=0):
+    metrics = next(iter(result.get("metrics", {}).values()), {})
+    return {
+        "timings": timer.finish(),
+        "rows": metrics.get("rows", 0),
+        "bytes": input_bytes,
+        "cached": False,
+    }
+
+
+def _compute_metrics(df, report_types, report_progress, dimension_table=None, top_n=None, use_cache=True):
+    """Return the daily table, the period tables, their metrics and the dimension metrics (or None)."""
+    # Aggregate per day once and roll every requested period up from it;
+    # the charts, the PDF and the JSON summary all read these tables
+    report_progress("aggregating")
+    daily = build_daily_table(df)
+    if not daily['rows'].sum():
+        raise ValueError("❌ No valid rows found: no date in the data could be parsed.")
+    tables = {report_type: rollup_periods(daily, report_type) for report_type in report_types}
+    metrics = {report_type: summarize_periods(table, report_type) for report_type, table in tables.items()}
+    dimension_metrics = None
+    if dimension_table is not None:
+        report_progress("grouping")
+        dimension_metrics = {
+            report_type: summarize_dimensions(dimension_table, report_type, top_n)
+            for report_type in report_types
+        }
+    # Forecast every period table, with every dimension value in the same batch
+    report_progress("forecasting")
+    last_day = daily.index.max() if len(daily) else None
+    for report_type, table in tables.items():
+        forecast = forecast_report(table, report_type, last_day, dimension_table, top_n, use_cache=use_cache)
+        if not forecast:
+            continue
+        for dimension, leaders in forecast.pop('dimensions').items():
+            if dimension_metrics and dimension in dimension_metrics[report_type]:
+                dimension_metrics[report_type][dimension]['forecast'] = leaders
+        metrics[report_type]['forecast'] = forecast
+        metrics[report_type]['insights'].append(forecast_insight(forecast, report_type))
+    return daily, tables, metrics, dimension_metrics
+
+
+def _render_outputs(df, report_types, output_dir, report_progress, start_time, chart_format,
+                    appendix=None, keep_daily=False, dimension_table=None, top_n=None, use_cache=True):
     # Get output paths
-    report_dir, chart_dir = get_output_paths()
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        report_dir = chart_dir = output_dir
+    else:
+        report_dir, chart_dir = get_output_paths()
     pdf_path = os.path.join(report_dir, "business_analysis_report.pdf")
-    chart_path = os.path.join(chart_dir, f"sales_{analysis_type}_plot.png")
+    chart_paths = {
+        report_type: os.path.join(chart_dir, f"sales_{report_type}_plot.{chart_format}")
+        for report_type in report_types
+    }
+
+    try:
+        daily, tables, metrics, dimension_metrics = _compute_metrics(
+            df, report_types, report_progress, dimension_table, top_n, use_cache)
+        daily_path = dimension_path = None
+        if keep_daily:
+            daily_path = os.path.join(report_dir, "daily_table.parquet")
+            daily.reset_index().to_parquet(daily_path, index=False)
+            if dimension_table is not None:
+                dimension_path = os.path.join(report_dir, "dimension_table.parquet")
+                dimension_table.to_parquet(dimension_path, index=False)
+        if dimension_metrics is not None:
+            appendix = list(appendix or []) + dimension_appendix(dimension_metrics)
+        report_progress("charting")
+        renders = render_charts([
+            chart_spec(table, report_type, chart_paths[report_type], chart_format,
+                       metrics[report_type].get('forecast'))
+            for report_type, table in tables.items()
+        ])
+        chart_timings = {report_type: round(render["seconds"], 4) for report_type, render in zip(tables, renders)}
+        print(f"📊 Rendered {len(renders)} {chart_format} chart(s): {chart_timings}")
+        report_progress("reporting")
+        # Raster charts go into the PDF straight from memory
+        charts = {
+            report_type: render["data"]
+            for report_type, render in zip(tables, renders) if render["format"] == "png"
+        }
+        pdf_seconds = generate_combined_report(metrics, filename=pdf_path, charts=charts, appendix=appendix)
+    except Exception as e:
+        return {"error": str(e) if str(e).startswith("❌") else f"❌ Error during analysis: {e}"}
 
     # Calculate processing time
     end_time = time.time()
     duration = end_time - start_time
 
-    return {
+    result = {
         "summary": f"✅ Analysis complete. Time taken: {duration:.2f} seconds.",
+        "analysis_types": report_types,
         "pdf_report": pdf_path,
-        "chart_image": chart_path
+        "chart_image": chart_paths[report_types[0]],
+        "chart_images": chart_paths,
+        "chart_timings": chart_timings,
+        "pdf_seconds": round(pdf_seconds, 4),
+        "metrics": metrics,
     }
+    if daily_path:
+        result["daily_table"] = daily_path
+    if dimension_metrics is not None:
+        result["dimensions"] = dimension_metrics
+    if dimension_path:
+        result["dimension_table"] = dimension_path
+    return result
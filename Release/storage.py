@@ -0,0 +1,198 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+# ------------------- Settings ------------------- #
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# Uploads spooled for analysis (Excel, JSON arrays); each is removed once its job ends.
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(UPLOAD_DIR, "spool"))
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+CHARTS_DIR = os.getenv("CHARTS_DIR", "charts")
+# Per-run output folders sit two levels down (reports/<date>/<run_id>); the
+# sweeper leaves anything shallower, such as files kept in the repository.
+RUN_DEPTH = 2
+
+# Files older than this are deleted by the sweeper.
+RETENTION_SECONDS = float(os.getenv("ARTIFACT_RETENTION_HOURS", 24)) * 3600
+# Disk quota per swept directory; the oldest files go first once it is exceeded.
+QUOTA_BYTES = int(os.getenv("ARTIFACT_QUOTA_MB", 1024)) * 1024 * 1024
+SWEEP_INTERVAL_SECONDS = float(os.getenv("ARTIFACT_SWEEP_SECONDS", 600))
+# Files touched this recently (uploads still arriving, jobs still writing)
+# are never deleted to meet a quota.
+SWEEP_GRACE_SECONDS = float(os.getenv("ARTIFACT_GRACE_SECONDS", 300))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_output_paths(run_id=None):
+    """
+    Create and return the (report_dir, chart_dir) pair for one run.
+
+    Runs without an output directory of their own write to
+    reports/<date>/<run_id> and charts/<date>/<run_id>, so no run overwrites
+    another's report. run_id defaults to a fresh random ID.
+    """
+    date_str = datetime.today().strftime('%Y-%m-%d')
+    run_id = run_id or uuid.uuid4().hex[:12]
+    report_dir = os.path.join(REPORTS_DIR, date_str, run_id)
+    chart_dir = os.path.join(CHARTS_DIR, date_str, run_id)
+    os.makedirs(report_dir, exist_ok=True)
+    os.makedirs(chart_dir, exist_ok=True)
+    return report_dir, chart_dir
+
+
+# ------------------- ETags ------------------- #
+
+@lru_cache(maxsize=1024)
+def _content_etag(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def artifact_etag(path, stat_result=None) -> str:
+    """
+    Return a strong ETag for a file, hashed from its contents.
+
+    The hash is remembered per path, mtime and size, so a file is read
+    once however often it is downloaded; identical reports (e.g. served
+    from the result cache) share a tag.
+    """
+    stat_result = stat_result or os.stat(path)
+    return _content_etag(os.path.abspath(path), stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    """True when an If-None-Match header value names etag (or is '*')."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+# ------------------- Sweeper ------------------- #
+
+def _files(root, min_depth=0):
+    for folder, _, names in os.walk(root):
+        relative = os.path.relpath(folder, root)
+        if (0 if relative == os.curdir else relative.count(os.sep) + 1) < min_depth:
+            continue
+        for name in names:
+            path = os.path.join(folder, name)
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            yield stat_result.st_mtime, stat_result.st_size, path
+
+
+def _remove_empty_dirs(root):
+    for folder, _, _ in sorted(os.walk(root), key=lambda entry: len(entry[0]), reverse=True):
+        if folder != root:
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+
+
+def sweep_directory(root, max_age=RETENTION_SECONDS, max_bytes=QUOTA_BYTES, keep=(), grace=SWEEP_GRACE_SECONDS,
+                    now=None, min_depth=0) -> dict:
+    """
+    Enforce retention and a disk quota on one directory tree.
+
+    Files older than max_age seconds are deleted, then the oldest remaining
+    files until the tree fits in max_bytes. Paths under any directory in
+    keep (e.g. running jobs) are left alone, as are files modified in the
+    last grace seconds when trimming to the quota. Only files at least
+    min_depth folders below root are swept or counted (RUN_DEPTH for the
+    per-run folders under reports/ and charts/). Emptied directories are
+    removed. Returns the files and bytes deleted and the bytes left.
+    """
+    if not os.path.isdir(root):
+        return {'root': root, 'files': 0, 'bytes': 0, 'remaining_bytes': 0}
+    now = now or time.time()
+    keep = tuple(os.path.join(os.path.abspath(path), "") for path in keep)
+
+    def kept(path):
+        path = os.path.join(os.path.abspath(path), "")
+        return any(path.startswith(prefix) for prefix in keep)
+
+    entries = sorted(_files(root, min_depth))
+    total = sum(size for _, size, _ in entries)
+    deleted, freed = 0, 0
+    for mtime, size, path in entries:
+        expired = now - mtime > max_age
+        over_quota = total > max_bytes and now - mtime > grace
+        if not (expired or over_quota) or kept(path):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        deleted += 1
+        freed += size
+    _remove_empty_dirs(root)
+    return {'root': root, 'files': deleted, 'bytes': freed, 'remaining_bytes': total}
+
+
+class ArtifactSweeper:
+    """
+    Background thread that sweeps the spooled uploads and output directories.
+
+    Every interval seconds each directory in roots gets sweep_directory; an
+    entry may also be a (directory, min_depth) pair. active, if given,
+    returns the paths to spare (inputs and output directories of queued or
+    running jobs and batches).
+    """
+
+    def __init__(self, roots=(SPOOL_DIR, (REPORTS_DIR, RUN_DEPTH), (CHARTS_DIR, RUN_DEPTH)),
+                 max_age=RETENTION_SECONDS, max_bytes=QUOTA_BYTES, interval=SWEEP_INTERVAL_SECONDS, active=None):
+        self.roots = list(roots)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.active = active
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self) -> list:
+        """Sweep every root once and return the per-root results."""
+        keep = list(self.active()) if self.active else []
+        results = []
+        for root in self.roots:
+            root, min_depth = root if isinstance(root, tuple) else (root, 0)
+            try:
+                result = sweep_directory(root, self.max_age, self.max_bytes, keep, min_depth=min_depth)
+            except Exception as e:
+                print(f"⚠️ Could not sweep {root}: {e}")
+                continue
+            if result['files']:
+                print(f"🧹 Swept {result['files']} file(s), {result['bytes'] / 1024 / 1024:.1f} MB from {root}")
+            results.append(result)
+        return results
+
+    def _run(self):
+        while True:
+            self.sweep()
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="artifact-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,530 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+import uuid
+
+import pandas as pd
+
+from Release.analyzer import (
+    build_dimension_table, combine_dimension_tables, find_columns, parse_dates, resolve_dimensions,
+)
+from Release.storage import SPOOL_DIR
+from Release.utils import (
+    HEADER_BYTES, _projection, detect_format, is_json_lines, _json_parse_options, load_file, read_header,
+)
+
+# Parsed blocks are folded into the daily table once this many are pending.
+COMPACT_EVERY = 32
+# Bytes buffered while looking for the first complete line of an upload.
+SNIFF_BYTES = 64 * 1024
+
+# Working memory one out-of-core analysis may use for its data.
+MEMORY_BUDGET_BYTES = int(os.getenv("ANALYSIS_MEMORY_BUDGET_MB", 512)) * 1024 * 1024
+# Share of the budget given to the chunk being parsed; the rest covers the
+# reader's read-ahead buffers and the daily table.
+CHUNK_BUDGET_SHARE = 0.4
+MIN_CHUNK_ROWS = 10_000
+# Peak bytes per row of an in-memory analysis (measured: about 200-300 for
+# three projected columns), used to decide when a file needs chunking.
+IN_MEMORY_ROW_BYTES = 300
+# Bytes per row of a chunk while it is parsed and coerced, beyond its raw text.
+CHUNK_ROW_BYTES = 300
+# A quoted CSV field spanning more than this is taken for a stray quote (such
+# as 12" pizza, which CSV readers keep as text) and the text is cut at its
+# last line break anyway, so the buffer stays bounded.
+MAX_RECORD_BYTES = int(os.getenv("CSV_MAX_RECORD_MB", 16)) * 1024 * 1024
+
+# ------------------- Per-Period Aggregation ------------------- #
+
+class PeriodAccumulator:
+    """
+    Folds (date, sales, expenses) frames into per-day partial sums.
+
+    Memory is bounded by the number of distinct days, not by the number of
+    rows fed in, and any coarser period can be resampled from the result.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self.rows = 0
+
+    def add(self, frame: pd.DataFrame):
+        if frame.empty:
+            return
+        day = frame['date'].dt.normalize()
+        daily = frame.assign(sales_sq=frame['sales'] ** 2).groupby(day).agg(
+            sales=('sales', 'sum'),
+            expenses=('expenses', 'sum'),
+            rows=('sales', 'size'),
+            sales_sq=('sales_sq', 'sum'),
+        )
+        self._parts.append(daily)
+        self.rows += len(frame)
+        if len(self._parts) >= COMPACT_EVERY:
+            self._compact()
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            self._parts = [pd.concat(self._parts).groupby(level=0).sum()]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return one row per day with date, sales, expenses, profit, rows and sales_sq."""
+        self._compact()
+        if not self._parts:
+            daily = pd.DataFrame(
+                {'sales': pd.Series(dtype='float64'),
+                 'expenses': pd.Series(dtype='float64'),
+                 'rows': pd.Series(dtype='int64'),
+                 'sales_sq': pd.Series(dtype='float64')},
+                index=pd.DatetimeIndex([], name='date'),
+            )
+        else:
+            daily = self._parts[0].sort_index()
+        daily.index.name = 'date'
+        daily = daily.reset_index()
+        daily['profit'] = daily['sales'] - daily['expenses']
+        return daily[['date', 'sales', 'expenses', 'profit', 'rows', 'sales_sq']]
+
+
+# ------------------- Line Splitting ------------------- #
+
+class _LineSplitter:
+    """
+    Splits a byte stream into runs of complete lines.
+
+    With quoted=True a run never ends inside a quoted field that spans
+    lines. Whether the buffered text ends inside quotes is carried from one
+    push to the next, so every byte's quotes are counted once; if no line
+    break outside quotes turns up within max_bytes (default
+    MAX_RECORD_BYTES), the text is cut at its last line break regardless.
+    """
+
+    def __init__(self, quoted=False, max_bytes=None):
+        self.quoted = quoted
+        self.max_bytes = max_bytes or MAX_RECORD_BYTES
+        self._buffer = bytearray()
+        self._inside = False
+
+    def push(self, data: bytes) -> bytes:
+        """Add data and return the complete lines buffered so far (b'' when there are none)."""
+        start = len(self._buffer)
+        self._buffer += data
+        if not self.quoted:
+            cut = self._buffer.rfind(b'\n', start)
+        else:
+            self._inside ^= bool(self._buffer.count(b'"', start) % 2)
+            cut = self._last_break_outside_quotes(start)
+            if cut == -1 and len(self._buffer) > self.max_bytes:
+                cut = self._buffer.rfind(b'\n')
+                if cut != -1:
+                    print(f"⚠️ No line break outside quotes in {len(self._buffer) / 1024 / 1024:.1f} MB "
+                          f"(unbalanced quote?); cutting at the last line break.")
+                    self._inside = bool(self._buffer.count(b'"', cut + 1) % 2)
+        if cut == -1:
+            return b''
+        block = bytes(self._buffer[:cut + 1])
+        del self._buffer[:cut + 1]
+        return block
+
+    def _last_break_outside_quotes(self, start):
+        # Walk back from the end one quote at a time: the parity only changes at a quote
+        end, inside = len(self._buffer), self._inside
+        while end > start:
+            quote = self._buffer.rfind(b'"', start, end)
+            if not inside:
+                cut = self._buffer.rfind(b'\n', max(quote + 1, start), end)
+                if cut != -1:
+                    return cut
+            if quote == -1:
+                break
+            inside, end = not inside, quote
+        return -1
+
+    def rest(self) -> bytes:
+        """Return and clear whatever is still buffered."""
+        rest = bytes(self._buffer)
+        self._buffer.clear()
+        self._inside = False
+        return rest
+
+
+# ------------------- Chunk Parsers ------------------- #
+
+class _ChunkParser:
+    """Turns complete lines of input into coerced (date, sales, expenses) frames."""
+
+    # Whether a record may span lines inside a quoted field.
+    quoted_newlines = False
+
+    def __init__(self):
+        self.date_col = self.sales_col = self.expenses_col = None
+        self.date_formats = []
+        self.stats = {'rows': 0, 'parsed': 0, 'dropped': 0, 'formats': {}, 'fallback': 0, 'seconds': 0.0}
+
+    def parse_block(self, block: bytes) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def coerce(self, raw: pd.DataFrame) -> pd.DataFrame:
+        dates, parse_stats = parse_dates(raw[self.date_col], formats=self.date_formats)
+        for key in ('rows', 'parsed', 'dropped', 'fallback', 'seconds'):
+            self.stats[key] += parse_stats[key]
+        for fmt, count in parse_stats['formats'].items():
+            self.stats['formats'][fmt] = self.stats['formats'].get(fmt, 0) + count
+            if fmt not in self.date_formats and fmt != 'fallback':
+                self.date_formats.append(fmt)
+
+        frame = pd.DataFrame({
+            'date': dates,
+            'sales': pd.to_numeric(raw[self.sales_col], errors='coerce').fillna(0),
+        })
+        if self.expenses_col:
+            frame['expenses'] = pd.to_numeric(raw[self.expenses_col], errors='coerce').fillna(0)
+        else:
+            frame['expenses'] = 0.0
+        return frame.dropna(subset=['date'])
+
+
+class _CSVChunkParser(_ChunkParser):
+
+    quoted_newlines = True
+
+    def __init__(self):
+        super().__init__()
+        self.header = None
+        self.usecols = None
+
+    def parse_block(self, block):
+        if self.header is None:
+            first_line, _, block = block.partition(b'\n')
+            self.header = next(csv.reader([first_line.decode('utf-8-sig').rstrip('\r')]))
+            self.date_col, self.sales_col, self.expenses_col = find_columns(self.header)
+            self.usecols = [col for col in (self.date_col, self.sales_col, self.expenses_col) if col]
+            if not block.strip():
+                return None
+        raw = pd.read_csv(
+            io.BytesIO(block), header=None, names=self.header, usecols=self.usecols, dtype=str,
+        )
+        return self.coerce(raw)
+
+
+class _JSONLinesChunkParser(_ChunkParser):
+
+    def parse_block(self, block):
+        if self.date_col is None:
+            first_line = block.lstrip().split(b'\n', 1)[0]
+            self.date_col, self.sales_col, self.expenses_col = find_columns(list(json.loads(first_line)))
+        raw = pd.read_json(io.BytesIO(block), lines=True, dtype=False, convert_dates=False)
+        for col in (self.date_col, self.sales_col, self.expenses_col):
+            if col and col not in raw.columns:
+                raw[col] = None
+        return self.coerce(raw)
+
+
+# ------------------- Upload Ingestion ------------------- #
+
+class UploadIngestor:
+    """
+    Consumes an upload chunk by chunk.
+
+    CSV and JSON-lines bodies are parsed as the bytes arrive: only complete
+    lines are handed to pandas, only the date/sales/expense columns are kept,
+    and every block is folded into per-day totals straight away, so nothing is
+    written to disk and memory does not grow with the file. Formats that need
+    the whole file (Excel, JSON arrays) are spooled to spool_dir instead, as
+    is everything when stream=False (e.g. when the analysis needs columns
+    beyond date, sales and expenses).
+    """
+
+    def __init__(self, filename, spool_dir=SPOOL_DIR, stream=True):
+        self.filename = os.path.basename(filename.lower())
+        self.spool_dir = spool_dir
+        self.stream = stream
+        self.spool_path = None
+        self.bytes_received = 0
+        self.digest = hashlib.sha256()
+        self.accumulator = PeriodAccumulator()
+        self._parser = None
+        self._lines = None
+        self._spool = None
+        self._buffer = b''
+        self._started = False
+
+    @property
+    def streaming(self):
+        return self._parser is not None
+
+    def _start(self, head):
+        self._started = True
+        if self.stream and self.filename.endswith('.csv'):
+            self._parser = _CSVChunkParser()
+        elif self.stream and (self.filename.endswith(('.jsonl', '.ndjson'))
+                              or self.filename.endswith('.json') and is_json_lines(head)):
+            self._parser = _JSONLinesChunkParser()
+        else:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self.spool_path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}_{self.filename}")
+            self._spool = open(self.spool_path, 'wb')
+            return
+        # Never split inside a quoted CSV field that spans lines
+        self._lines = _LineSplitter(quoted=self._parser.quoted_newlines)
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        self.bytes_received += len(chunk)
+        self.digest.update(chunk)
+        self._buffer += chunk
+
+        if not self._started:
+            # Decide how to ingest once the second line has started (or at SNIFF_BYTES),
+            # so a .json file can be told apart from a one-line JSON document
+            _, newline, rest = self._buffer.lstrip().partition(b'\n')
+            if not (newline and rest.strip()) and len(self._buffer) < SNIFF_BYTES:
+                return
+            self._start(self._buffer)
+
+        if self._spool is not None:
+            self._spool.write(self._buffer)
+            self._buffer = b''
+            return
+
+        block = self._lines.push(self._buffer)
+        self._buffer = b''
+        if block:
+            self._consume(block)
+
+    def _consume(self, block):
+        frame = self._parser.parse_block(block)
+        if frame is not None:
+            self.accumulator.add(frame)
+
+    def close(self) -> dict:
+        """
+        Finish the upload.
+
+        Returns {'table': daily_frame, 'stats': ..., 'digest': ...} for
+        streamed input or {'path': spool_path} for spooled input. digest is
+        the SHA-256 of the uploaded bytes, as computed by hash_file.
+        """
+        if not self._started and self._buffer.strip():
+            self._start(self._buffer)
+        if self._spool is not None:
+            self._spool.write(self._buffer)
+            self._spool.close()
+            self._buffer = b''
+            return {'path': self.spool_path}
+
+        if self._parser is None:
+            raise ValueError("❌ The uploaded file is empty.")
+        rest = self._lines.push(self._buffer) + self._lines.rest()
+        if rest.strip():
+            self._consume(rest)
+        self._buffer = b''
+
+        stats = dict(self._parser.stats, bytes=self.bytes_received)
+        formats = ', '.join(f"{fmt} ({count})" for fmt, count in stats['formats'].items()) or 'none'
+        print(f"📥 Streamed {stats['bytes']} bytes: parsed {stats['parsed']} of {stats['rows']} dates, "
+              f"dropped {stats['dropped']}. Formats: {formats}")
+        return {'table': self.accumulator.to_frame(), 'stats': stats, 'digest': self.digest.hexdigest()}
+
+    def abort(self):
+        """Drop anything spooled so far."""
+        if self._spool is not None:
+            self._spool.close()
+            if os.path.exists(self.spool_path):
+                os.remove(self.spool_path)
+
+
+# ------------------- Out-of-Core Analysis ------------------- #
+
+def _disk_row_bytes(filepath, fmt):
+    """Average bytes per row on disk, sampled from the head of a text file."""
+    if fmt not in ('csv', 'jsonl'):
+        return 0
+    with open(filepath, 'rb') as f:
+        head = f.read(HEADER_BYTES)
+    lines = head.count(b'\n')
+    return len(head) / lines if lines else len(head)
+
+
+def estimate_rows(filepath, fmt=None):
+    """Estimate a file's row count from its metadata or from its size and average line length."""
+    fmt = fmt or detect_format(filepath)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(filepath).metadata.num_rows
+    if fmt == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(filepath) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    row_bytes = _disk_row_bytes(filepath, fmt)
+    if row_bytes:
+        return int(os.path.getsize(filepath) / row_bytes)
+    # Excel and JSON arrays: assume a compact ~50 bytes per row
+    return os.path.getsize(filepath) // 50
+
+
+def should_chunk(filepath, memory_budget=MEMORY_BUDGET_BYTES):
+    """True when loading the whole file would likely need more than memory_budget."""
+    return estimate_rows(filepath) * IN_MEMORY_ROW_BYTES > memory_budget
+
+
+def chunk_rows_for(filepath, memory_budget=MEMORY_BUDGET_BYTES, fmt=None):
+    """Rows per chunk so that one chunk's working set stays within its share of the budget."""
+    fmt = fmt or detect_format(filepath)
+    per_row = _disk_row_bytes(filepath, fmt) + CHUNK_ROW_BYTES
+    return max(MIN_CHUNK_ROWS, int(memory_budget * CHUNK_BUDGET_SHARE / per_row))
+
+
+def iter_file_chunks(filepath, chunk_rows, fmt=None, typed=True, sheet=None, header_row=None, extra_columns=()):
+    """
+    Yield a file's date, sales and expense columns (plus any extra_columns, as
+    for load_file) as frames of about chunk_rows rows.
+
+    CSV and JSON-lines are cut into line-aligned byte blocks that pyarrow
+    parses one at a time (amounts typed as float64 unless typed=False),
+    Parquet is read by row batches and Arrow by slices of its memory-mapped
+    batches. Excel sheets and JSON arrays cannot
+    be read in pieces; their projected columns are loaded once and sliced.
+    """
+    fmt = fmt or detect_format(filepath)
+    if fmt in ('excel', 'json'):
+        frame = load_file(filepath, extra_columns=extra_columns, sheet=sheet, header_row=header_row)
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+        return
+
+    columns, amounts, extras = _projection(read_header(filepath, fmt), extra_columns)
+    import pyarrow as pa
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(filepath).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    if fmt == 'arrow':
+        with pa.memory_map(filepath) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                batch = reader.get_batch(index).select(columns)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(start, chunk_rows).to_pandas()
+        return
+
+    block_size = max(1 << 20, int(chunk_rows * _disk_row_bytes(filepath, fmt)))
+    if fmt == 'csv':
+        import pyarrow.csv as pa_csv
+        types = {col: pa.float64() if typed and col in amounts else pa.string() for col in columns}
+        header = None
+        for block in _line_blocks(filepath, block_size, quoted=True):
+            if header is None:
+                first_line, _, block = block.partition(b'\n')
+                header = next(csv.reader([first_line.decode('utf-8-sig').rstrip('\r')]))
+                if not block.strip():
+                    continue
+            table = pa_csv.read_csv(
+                pa.py_buffer(block),
+                read_options=pa_csv.ReadOptions(column_names=header),
+                convert_options=pa_csv.ConvertOptions(include_columns=columns, column_types=types),
+            )
+            yield table.to_pandas(categories=extras)
+        return
+
+    import pyarrow.json as pa_json
+    for block in _line_blocks(filepath, block_size):
+        if typed:
+            table = pa_json.read_json(pa.py_buffer(block), parse_options=_json_parse_options(columns[0]))
+            yield table.select([col for col in columns if col in table.column_names]).to_pandas()
+        else:
+            chunk = pd.read_json(io.BytesIO(block), lines=True, dtype=False, convert_dates=False)
+            yield chunk[[col for col in columns if col in chunk.columns]]
+
+
+def _line_blocks(filepath, block_size, quoted=False):
+    """
+    Yield a text file in blocks of about block_size bytes that end on a line break.
+
+    With quoted=True a block never ends inside a quoted field that spans
+    lines (see _LineSplitter). Reading the file ourselves keeps exactly one
+    block in memory; pyarrow's own streaming readers buffer far ahead of
+    the consumer.
+    """
+    lines = _LineSplitter(quoted)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(block_size), b''):
+            block = lines.push(chunk)
+            if block.strip():
+                yield block
+    rest = lines.rest()
+    if rest.strip():
+        yield rest
+
+
+def aggregate_file(filepath, memory_budget=MEMORY_BUDGET_BYTES, sheet=None, header_row=None,
+                   dimensions=()) -> dict:
+    """
+    Fold a file into per-day totals one bounded chunk at a time.
+
+    Each chunk is parsed, coerced like preprocess_data does (dates with
+    formats carried over from earlier chunks, amounts to numbers) and added
+    to a PeriodAccumulator, so memory is set by memory_budget and the number
+    of days rather than by the file. The daily table keeps row counts and
+    squared sales, so every report metric, std devs included, is the same
+    as an in-memory analysis. Returns {'table': daily_frame, 'stats': ...}
+    like UploadIngestor.close().
+
+    dimensions is a parse_dimensions list; when given, every chunk is also
+    grouped per day and dimension value and the summed dimension table is
+    returned as 'dimensions'.
+    """
+    fmt = detect_format(filepath)
+    chunk_rows = chunk_rows_for(filepath, memory_budget, fmt)
+    import pyarrow as pa
+
+    for typed in (True, False):
+        accumulator = PeriodAccumulator()
+        parser = _ChunkParser()
+        chunks, coerce_seconds, group_seconds = 0, 0.0, 0.0
+        resolved, dimension_parts = None, []
+        try:
+            for raw in iter_file_chunks(filepath, chunk_rows, fmt, typed, sheet, header_row, dimensions):
+                if parser.date_col is None:
+                    parser.date_col, parser.sales_col, parser.expenses_col = find_columns(raw.columns)
+                    # Named like preprocess_data names columns, so both modes report alike
+                    resolved = {str(dim).strip().lower(): dim for dim in resolve_dimensions(dimensions, raw.columns)}
+                for col in (parser.date_col, parser.sales_col, parser.expenses_col):
+                    if col and col not in raw.columns:
+                        raw[col] = None
+                start = time.perf_counter()
+                frame = parser.coerce(raw)
+                accumulator.add(frame)
+                coerce_seconds += time.perf_counter() - start
+                if resolved:
+                    start = time.perf_counter()
+                    frame = frame.assign(**{name: raw[dim] for name, dim in resolved.items()})
+                    dimension_parts.append(build_dimension_table(frame, list(resolved)))
+                    if len(dimension_parts) >= COMPACT_EVERY:
+                        dimension_parts = [combine_dimension_tables(dimension_parts)]
+                    group_seconds += time.perf_counter() - start
+                chunks += 1
+            break
+        except pa.ArrowInvalid:
+            # A value did not fit the typed reader (text in an amount column,
+            # mixed JSON types); start over reading everything as text
+            if not typed:
+                raise
+
+    stats = dict(parser.stats, bytes=os.path.getsize(filepath), chunks=chunks, chunk_rows=chunk_rows,
+                 coerce_seconds=coerce_seconds, group_seconds=group_seconds)
+    formats = ', '.join(f"{fmt} ({count})" for fmt, count in stats['formats'].items()) or 'none'
+    print(f"🧩 Aggregated {stats['rows']} rows in {chunks} chunk(s) of up to {chunk_rows} rows: "
+          f"parsed {stats['parsed']} dates, dropped {stats['dropped']}. Formats: {formats}")
+    ingested = {'table': accumulator.to_frame(), 'stats': stats}
+    if dimensions:
+        ingested['dimensions'] = combine_dimension_tables(dimension_parts)
+    return ingested
@@ -0,0 +1,272 @@
+import cProfile
+import io
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# ------------------- Settings ------------------- #
+
+# Per-request cProfile / tracemalloc capture is refused unless this is set.
+PROFILING_ENABLED = os.getenv("ANALYSIS_PROFILING", "").lower() in ("1", "true", "yes")
+PROFILE_MODES = ("cprofile", "tracemalloc")
+PROFILE_TOP = 40
+
+# Progress stages reported by the pipeline and the names they are timed under.
+STAGE_NAMES = {
+    'hashing': 'hash',
+    'reading': 'read',
+    'preprocessing': 'preprocess',
+    'caching': 'cache',
+    'grouping': 'groupby',
+    'aggregating': 'resample',
+    'forecasting': 'forecast',
+    'charting': 'chart',
+    'reporting': 'pdf',
+}
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(2 ** power for power in range(20, 36, 2))  # 1 MiB .. 32 GiB
+
+
+# ------------------- Stage Timing ------------------- #
+
+class StageTimer:
+    """
+    Drop-in progress callback that also times every stage.
+
+    Calling the timer with a stage name ends the previous stage and starts
+    the next one; the wrapped progress callback, if any, still receives the
+    name. finish() closes the last stage and returns the timings in seconds,
+    including the total.
+    """
+
+    def __init__(self, progress=None):
+        self.progress = progress
+        self.timings = {}
+        self._stage = None
+        self._started = self._start = time.perf_counter()
+
+    def __call__(self, stage):
+        self._close()
+        self._stage = STAGE_NAMES.get(stage, stage)
+        self._started = time.perf_counter()
+        if self.progress:
+            self.progress(stage)
+
+    def _close(self):
+        if self._stage is not None:
+            elapsed = time.perf_counter() - self._started
+            self.timings[self._stage] = self.timings.get(self._stage, 0.0) + elapsed
+            self._stage = None
+
+    def record(self, stage, seconds):
+        """Add a sub-stage measured elsewhere (e.g. date parsing inside preprocessing)."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def finish(self) -> dict:
+        self._close()
+        self.timings['total'] = time.perf_counter() - self._start
+        return {stage: round(seconds, 6) for stage, seconds in self.timings.items()}
+
+
+# ------------------- Peak Memory ------------------- #
+
+def reset_peak_memory():
+    """
+    Reset the process's resident-memory high-water mark where the OS allows it.
+
+    On Linux writing 5 to /proc/self/clear_refs resets VmHWM, so a pool
+    worker that runs many jobs still reports the peak of the current one.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory_bytes():
+    """Return the process's peak resident memory in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ------------------- Profiling ------------------- #
+
+def parse_profile_mode(value):
+    """Validate a requested profiling mode; returns None when profiling is off."""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value not in PROFILE_MODES:
+        raise ValueError(f"❌ Invalid profile mode. Choose from: {', '.join(PROFILE_MODES)}")
+    if not PROFILING_ENABLED:
+        raise ValueError("❌ Profiling is disabled on this server (set ANALYSIS_PROFILING=1).")
+    return value
+
+
+@contextmanager
+def profiled(mode, output_dir, capture):
+    """
+    Run the body under cProfile or tracemalloc and write the report to output_dir.
+
+    capture is a dict that receives the paths of the written files under
+    'profile'. With mode=None the body runs unprofiled.
+    """
+    if not mode:
+        yield
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stats_path = os.path.join(output_dir, "profile.prof")
+            text_path = os.path.join(output_dir, "profile.txt")
+            profiler.dump_stats(stats_path)
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            with open(text_path, "w") as f:
+                f.write(buffer.getvalue())
+            capture["profile"] = {"mode": mode, "stats": stats_path, "report": text_path}
+        return
+
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(25)
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+        text_path = os.path.join(output_dir, "tracemalloc.txt")
+        with open(text_path, "w") as f:
+            f.write(f"Traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+                f.write(f"{stat}\n")
+        capture["profile"] = {"mode": mode, "report": text_path, "traced_peak_bytes": peak}
+
+
+# ------------------- Prometheus Metrics ------------------- #
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics store rendered in the Prometheus text format.
+
+    Supports counters, gauges and histograms with labels; enough for the
+    API process without pulling in a client library.
+    """
+
+    def __init__(self, prefix="analyzer"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._values = {}
+        self._histograms = {}
+
+    def _declare(self, name, kind, help_text):
+        name = f"{self.prefix}_{name}"
+        self._types.setdefault(name, kind)
+        self._help.setdefault(name, help_text)
+        return name
+
+    def inc(self, name, amount=1, help_text="", **labels):
+        name = self._declare(name, "counter", help_text)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, help_text="", **labels):
+        name = self._declare(name, "gauge", help_text)
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, help_text="", **labels):
+        name = self._declare(name, "histogram", help_text)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets),
+                                                     "sum": 0.0, "count": 0}
+            for index, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted(self._types):
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {self._types[name]}")
+                for (metric, labels), value in sorted(self._values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(dict(labels))} {value}")
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = dict(labels)
+                    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                        lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {count}")
+                    lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {histogram['count']}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def record_ingest(stats):
+    """Record the date-parse time spent while an upload streamed in."""
+    metrics.observe("stage_seconds", stats.get("seconds", 0.0), help_text="Time spent per pipeline stage.",
+                    stage="date_parse_stream")
+
+
+def record_job(status, result, seconds):
+    """Record a finished job: its outcome, duration, stage timings, rows, bytes and peak memory."""
+    metrics.inc("jobs_total", help_text="Finished analysis jobs.", status=status)
+    metrics.observe("job_seconds", seconds, help_text="Wall time from submission to completion.")
+    telemetry = (result or {}).get("telemetry") or {}
+    for stage, stage_seconds in telemetry.get("timings", {}).items():
+        if stage != "total":
+            metrics.observe("stage_seconds", stage_seconds, help_text="Time spent per pipeline stage.", stage=stage)
+    if telemetry.get("rows"):
+        metrics.inc("rows_processed_total", telemetry["rows"], "Data rows analysed.")
+    if telemetry.get("bytes"):
+        metrics.inc("bytes_ingested_total", telemetry["bytes"], "Bytes of input analysed.")
+    if telemetry.get("peak_memory_bytes"):
+        metrics.observe("job_peak_memory_bytes", telemetry["peak_memory_bytes"], buckets=BYTES_BUCKETS,
+                        help_text="Peak resident memory of the worker per job.")
+    if telemetry.get("cached"):
+        metrics.inc("cache_hits_total", help_text="Jobs served from the result cache.")
@@ -1,19 +1,271 @@
-def load_file(filepath):
-    """Automatically loads CSV, Excel, or JSON files based on extension."""
+import csv
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from Release.analyzer import find_columns, resolve_dimensions
+from Release.cache import hash_file, result_cache
+from Release.excel import read_xls, read_xlsx, sheet_variant
+
+# CSVs at least this large are parsed with the multi-threaded pyarrow engine.
+CSV_ARROW_MIN_BYTES = int(os.getenv("CSV_ARROW_MIN_MB", 16)) * 1024 * 1024
+# Bytes read when sniffing a header or telling JSON-lines from a JSON array.
+HEADER_BYTES = 64 * 1024
+
+FILE_FORMATS = {
+    '.csv': 'csv',
+    '.xlsx': 'excel',
+    '.xls': 'excel',
+    '.json': 'json',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+}
+SUPPORTED_EXTENSIONS = tuple(FILE_FORMATS)
+
+
+def is_json_lines(head: bytes) -> bool:
+    """
+    Whether the start of a .json file is JSON-lines.
+
+    The first line must be a complete object with another record after
+    it. A lone object, such as pandas' default DataFrame.to_json() output
+    or a pretty-printed document, is read as one JSON document instead.
+    """
+    first_line, _, rest = head.lstrip().partition(b'\n')
+    if not first_line.startswith(b'{') or not rest.lstrip().startswith(b'{'):
+        return False
+    try:
+        return isinstance(json.loads(first_line), dict)
+    except ValueError:
+        return False
+
+
+def detect_format(filepath):
+    """Return the loader format for a file, telling JSON-lines from JSON documents by content."""
     ext = os.path.splitext(filepath)[1].lower()
+    fmt = FILE_FORMATS.get(ext)
+    if fmt is None:
+        raise ValueError("❌ Unsupported file type. Use CSV, XLSX, JSON, JSON-lines, Parquet or Arrow.")
+    if fmt == 'json':
+        with open(filepath, 'rb') as f:
+            if is_json_lines(f.read(HEADER_BYTES)):
+                fmt = 'jsonl'
+    return fmt
+
+
+# ------------------- Header Detection ------------------- #
+
+def read_header(filepath, fmt=None):
+    """
+    Return the column names of a file without loading its rows.
+
+    Columnar formats read their schema, text formats their first line or
+    record. JSON arrays have no header; None is returned and the columns
+    are projected after loading. Excel headers are found by Release.excel,
+    which knows the sheet and header row to use.
+    """
+    fmt = fmt or detect_format(filepath)
+    if fmt == 'csv':
+        with open(filepath, newline='', encoding='utf-8-sig', errors='replace') as f:
+            return next(csv.reader(f), [])
+    if fmt == 'jsonl':
+        with open(filepath, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    return list(json.loads(line))
+        return []
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(filepath).names
+    if fmt == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(filepath) as source:
+            return pa.ipc.open_file(source).schema.names
+    return None
+
+
+def _projection(names, extra_columns=()):
+    """
+    Pick the columns to load: date, sales, expenses plus any requested extras.
+
+    Extras are matched case-insensitively and skipped when absent; 'auto'
+    adds every column that looks like a dimension (store, SKU, region...).
+    Returns (columns, amounts, extras).
+    """
+    date_col, sales_col, expenses_col = find_columns(names, warn=False)
+    columns = [date_col, sales_col]
+    if expenses_col:
+        columns.append(expenses_col)
+    lowered = {str(name).strip().lower() for name in names}
+    wanted = [str(extra).strip().lower() for extra in extra_columns]
+    extras = resolve_dimensions([extra for extra in wanted if extra == 'auto' or extra in lowered], names)
+    extras = [name for name in extras if name not in columns]
+    amounts = [sales_col] + ([expenses_col] if expenses_col else [])
+    return columns + extras, amounts, extras
+
+
+# ------------------- Readers ------------------- #
+
+def _read_csv(filepath, columns, amounts, categories=()):
+    if os.path.getsize(filepath) >= CSV_ARROW_MIN_BYTES:
+        return _read_csv_arrow(filepath, columns, amounts, categories)
+    dtypes = {col: 'float64' if col in amounts else 'category' if col in categories else str for col in columns}
+    try:
+        return pd.read_csv(filepath, usecols=columns, dtype=dtypes)
+    except ValueError:
+        # Amounts with currency signs or text: load as text, preprocess_data coerces them
+        dtypes = {col: 'category' if col in categories else str for col in columns}
+        return pd.read_csv(filepath, usecols=columns, dtype=dtypes)
+
+
+def _read_csv_arrow(filepath, columns, amounts, categories=()):
+    """Parse with pyarrow's multi-threaded reader (faster than engine='pyarrow' with dtypes)."""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    def read(types):
+        options = pa_csv.ConvertOptions(include_columns=columns, column_types=types)
+        return pa_csv.read_csv(filepath, convert_options=options).to_pandas(categories=list(categories))
+
+    try:
+        return read({col: pa.float64() if col in amounts else pa.string() for col in columns})
+    except pa.ArrowInvalid:
+        return read({col: pa.string() for col in columns})
+
+
+def _json_parse_options(date_col):
+    """
+    pyarrow JSON options that read the date column as text.
+
+    pyarrow otherwise infers ISO strings as timestamps and folds their
+    offsets into UTC, moving sales to another day; parse_dates handles them.
+    """
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+    return pa_json.ParseOptions(explicit_schema=pa.schema([(date_col, pa.string())]))
+
+
+def _read_json_lines(filepath, columns):
+    try:
+        import pyarrow.json as pa_json
+        table = pa_json.read_json(filepath, parse_options=_json_parse_options(columns[0]))
+        return table.select([col for col in columns if col in table.column_names]).to_pandas()
+    except Exception:
+        # Mixed value types across records; pandas tolerates them
+        frame = pd.read_json(filepath, lines=True, dtype=False, convert_dates=False)
+        return frame[[col for col in columns if col in frame.columns]]
+
+
+def _read_json_array(filepath):
+    try:
+        frame = pd.read_json(filepath, dtype=False, convert_dates=False)
+    except ValueError:
+        # A single record on one line: JSON-lines with nothing after it
+        frame = pd.read_json(filepath, lines=True, dtype=False, convert_dates=False)
+    nested = [col for col in frame.columns if frame[col].map(lambda value: isinstance(value, dict)).any()]
+    if nested:
+        # Flatten nested records so e.g. {"totals": {"sales": 1}} becomes "totals.sales"
+        frame = pd.json_normalize(frame.to_dict(orient='records'))
+    return frame
+
+
+def _as_categories(frame, columns):
+    """Store the given columns as categoricals: one code per row instead of a string object."""
+    for col in columns:
+        if col in frame.columns and not isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype('category')
+    return frame
+
+
+def _read_excel(filepath, extra_columns=(), sheet=None, header_row=None, use_cache=True, digest=None):
+    """
+    Read the projected columns of an Excel sheet, converting each sheet only once.
+
+    The converted columns are cached as Parquet under the file's digest, the
+    sheet, the header row and the requested extras, so analysing the same
+    workbook again (another period, another report type) skips the sheet XML.
+    """
+    def pick_columns(names):
+        return _projection(names, extra_columns)[0]
+
+    reader = read_xls if filepath.lower().endswith('.xls') else read_xlsx
+    if not use_cache:
+        return reader(filepath, pick_columns, sheet, header_row)
+
+    digest = digest or hash_file(filepath)
+    extras = ",".join(str(extra).strip().lower() for extra in extra_columns)
+    variant = f"xlsx-{sheet_variant(sheet, header_row) or 'default'}"
+    if extras:
+        variant += "-" + hashlib.sha1(extras.encode()).hexdigest()[:8]
+    frame = result_cache.get_frame(digest, variant)
+    if frame is not None:
+        print(f"♻️ Reusing converted sheet for {os.path.basename(filepath)}")
+        return frame
+    frame = reader(filepath, pick_columns, sheet, header_row)
+    result_cache.put_frame(digest, frame, variant)
+    return frame
+
+
+def load_file(filepath, project=True, extra_columns=(), sheet=None, header_row=None, use_cache=True, digest=None):
+    """
+    Load a CSV, Excel, JSON, JSON-lines, Parquet or Arrow file.
+
+    With project=True the date, sales and expense columns are detected from
+    the header first and only those (plus extra_columns, when present) are
+    read, with amounts typed as float64 up front instead of inferred and
+    extras as categoricals. extra_columns may include 'auto' to add every
+    column that looks like a dimension (store, SKU, region...).
+    Parquet and Arrow read just those columns from disk, and large CSVs go
+    through pyarrow's multi-threaded reader. project=False loads every column.
+
+    Excel files go through Release.excel: sheet picks a sheet by name or
+    0-based index and header_row is the 1-based header row (detected when
+    omitted). With use_cache the converted sheet is cached; digest is the
+    file's SHA-256 when the caller already has it.
+    """
+    fmt = detect_format(filepath)
+
+    try:
+        if fmt == 'json':
+            frame = _read_json_array(filepath)
+            if not project:
+                return frame
+            columns, _, extras = _projection(list(frame.columns), extra_columns)
+            return _as_categories(frame[columns], extras)
+
+        if not project:
+            if fmt == 'csv':
+                return pd.read_csv(filepath)
+            if fmt == 'excel':
+                sheet_name = int(sheet) if isinstance(sheet, str) and sheet.isdigit() else (sheet or 0)
+                return pd.read_excel(filepath, sheet_name=sheet_name, header=(header_row or 1) - 1)
+            if fmt == 'jsonl':
+                return pd.read_json(filepath, lines=True, dtype=False, convert_dates=False)
+            if fmt == 'parquet':
+                return pd.read_parquet(filepath)
+            return pd.read_feather(filepath)
+
+        if fmt == 'excel':
+            frame = _read_excel(filepath, extra_columns, sheet, header_row, use_cache, digest)
+            core = find_columns(frame.columns, warn=False)
+            return _as_categories(frame, [col for col in frame.columns if col not in core])
 
-    if ext == '.csv':
-        return pd.read_csv(filepath)
-    elif ext in ['.xls', '.xlsx']:
-        return pd.read_excel(filepath)
-    elif ext == '.json':
-        try:
-            data = pd.read_json(filepath)
-            # If nested, attempt normalization
-            if isinstance(data.iloc[0], dict):
-                data = pd.json_normalize(data.to_dict(orient='records'))
-            return data
-        except Exception as e:
-            raise ValueError(f"❌ Error loading JSON: {e}")
-    else:
-        raise ValueError("❌ Unsupported file type. Use CSV, XLSX, or JSON.")
+        columns, amounts, extras = _projection(read_header(filepath, fmt), extra_columns)
+        if fmt == 'csv':
+            return _read_csv(filepath, columns, amounts, extras)
+        if fmt == 'jsonl':
+            frame = _read_json_lines(filepath, columns)
+        elif fmt == 'parquet':
+            frame = pd.read_parquet(filepath, columns=columns)
+        else:
+            frame = pd.read_feather(filepath, columns=columns)
+        return _as_categories(frame, extras)
+    except ValueError as e:
+        if str(e).startswith("❌"):
+            raise
+        raise ValueError(f"❌ Error loading {fmt.upper()} file: {e}")
@@ -1,12 +1,44 @@
-from fastapi import FastAPI, File, UploadFile, Form
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import shutil
-import os
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from python_multipart.multipart import MultipartParser, parse_options_header
 import logging
-from Release.main import analyze_data  # Import your updated analyze_data
+import os
+from Release.analyzer import parse_dimensions, parse_report_types, parse_top_n
+from Release.batch import BatchRunner
+from Release.charts import CHART_FORMAT, CHART_FORMATS
+from Release.excel import parse_header_row
+from Release.incremental import dataset_metrics, validate_dataset_id
+from Release.jobs import JobManager, QueueFullError, append_job
+from Release.main import analyze_metrics
+from Release.storage import (
+    CHARTS_DIR, REPORTS_DIR, RUN_DEPTH, SPOOL_DIR, ArtifactSweeper, artifact_etag, etag_matches,
+)
+from Release.streaming import UploadIngestor
+from Release.telemetry import metrics, parse_profile_mode, record_ingest
+from Release.utils import SUPPORTED_EXTENSIONS
+
+jobs = JobManager()
+batches = BatchRunner(jobs=jobs)
+# Retention and disk quotas for spooled uploads, per-run reports and charts, job and batch outputs
+sweeper = ArtifactSweeper(
+    roots=(SPOOL_DIR, (REPORTS_DIR, RUN_DEPTH), (CHARTS_DIR, RUN_DEPTH), jobs.jobs_dir, batches.output_dir),
+    active=lambda: jobs.active_paths() + batches.active_paths(),
+)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    sweeper.start()
+    yield
+    sweeper.stop()
+    jobs.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for Wix domain
 app.add_middleware(
@@ -20,46 +52,399 @@ app.add_middleware(
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), analysis_type: str = Form("monthly")):
+async def stream_upload(request: Request):
+    """
+    Read a multipart/form-data body as it arrives.
+
+    The "file" part is fed to an UploadIngestor chunk by chunk, so CSV and
+    JSON-lines uploads are aggregated without ever being written to disk.
+    Every other part is collected as a text form field. A "dimensions" field
+    sent before the file makes the upload spool to disk instead, since the
+    grouping needs the full rows. Returns (fields, ingestor); raises
+    ValueError for a malformed or rejected upload.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("❌ Expected a multipart/form-data upload.")
+
+    events = []
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": lambda: events.append(("part_begin", b"")),
+        "on_part_data": lambda data, start, end: events.append(("part_data", data[start:end])),
+        "on_header_field": lambda data, start, end: events.append(("header_field", data[start:end])),
+        "on_header_value": lambda data, start, end: events.append(("header_value", data[start:end])),
+        "on_header_end": lambda: events.append(("header_end", b"")),
+        "on_headers_finished": lambda: events.append(("headers_finished", b"")),
+        "on_part_end": lambda: events.append(("part_end", b"")),
+    })
+
+    fields, ingestor = {}, None
+    part_headers, header_field, header_value = {}, b"", b""
+    part_name, part_value, is_file = None, b"", False
+
     try:
-        filename = file.filename.lower()
-        upload_path = f"uploads/{filename}"
-        os.makedirs("uploads", exist_ok=True)
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, data in events:
+                if kind == "part_begin":
+                    part_headers, header_field, header_value = {}, b"", b""
+                    part_name, part_value, is_file = None, b"", False
+                elif kind == "header_field":
+                    header_field += data
+                elif kind == "header_value":
+                    header_value += data
+                elif kind == "header_end":
+                    part_headers[header_field.lower()] = header_value
+                    header_field, header_value = b"", b""
+                elif kind == "headers_finished":
+                    _, options = parse_options_header(part_headers.get(b"content-disposition", b""))
+                    part_name = options.get(b"name", b"").decode("latin-1")
+                    if part_name == "file" and b"filename" in options:
+                        filename = options[b"filename"].decode("utf-8", "replace").lower()
+                        # File type validation
+                        if not filename.endswith(SUPPORTED_EXTENSIONS):
+                            raise ValueError("❌ Only CSV, Excel, JSON, Parquet or Arrow files are supported.")
+                        ingestor = UploadIngestor(filename, stream=not parse_dimensions(fields.get("dimensions")))
+                        is_file = True
+                elif kind == "part_data":
+                    if is_file:
+                        await run_in_threadpool(ingestor.feed, data)
+                    else:
+                        part_value += data
+                elif kind == "part_end" and not is_file and part_name:
+                    # Repeated fields (e.g. several analysis_type values) are comma-joined
+                    value = part_value.decode("utf-8", "replace")
+                    fields[part_name] = f"{fields[part_name]},{value}" if part_name in fields else value
+            events.clear()
+        parser.finalize()
+    except Exception:
+        if ingestor is not None:
+            ingestor.abort()
+        raise
 
-        # File type validation
-        if not filename.endswith((".csv", ".xlsx", ".xls", ".json")):
+    if ingestor is None:
+        raise ValueError("❌ No file was uploaded.")
+    return fields, ingestor
+
+
+@app.post("/upload")
+async def upload_file(request: Request):
+    ingestor = None
+    try:
+        # Back-pressure: refuse before reading the body when the queue is full
+        if jobs.is_full():
             return JSONResponse(
-                content={"error": "❌ Only CSV, Excel, or JSON files are supported."},
-                status_code=400,
+                content={"error": "❌ Server is busy. Please retry shortly."},
+                status_code=429,
+                headers={"Retry-After": "10"},
             )
 
-        # Report type validation
-        valid_types = ["weekly", "monthly", "quarterly", "yearly"]
-        if analysis_type not in valid_types:
-            return JSONResponse(
-                content={"error": f"❌ Invalid report type. Choose from: {', '.join(valid_types)}"},
-                status_code=400,
+        # CSV / JSON-lines are aggregated while the body streams in;
+        # Excel and JSON arrays are spooled to uploads/ and removed after the job
+        try:
+            fields, ingestor = await stream_upload(request)
+            # Report type validation: one type, a comma-separated list, or "all"
+            analysis_type = parse_report_types(fields.get("analysis_type", "monthly"))
+
+            # Chart format validation: "png" (pre-sized) or "svg"
+            chart_format = fields.get("chart_format", CHART_FORMAT).lower()
+            if chart_format not in CHART_FORMATS:
+                raise ValueError(f"❌ Invalid chart format. Choose from: {', '.join(CHART_FORMATS)}")
+
+            # Optional per-request profiling: "cprofile" or "tracemalloc"
+            profile = parse_profile_mode(fields.get("profile"))
+
+            # Excel only: sheet name or 0-based index, 1-based header row
+            sheet = fields.get("sheet") or None
+            header_row = parse_header_row(fields.get("header_row"))
+
+            # Optional breakdown by store / SKU / region: "auto" or column names, plus the top N to rank
+            dimensions = parse_dimensions(fields.get("dimensions"))
+            top_n = parse_top_n(fields.get("top_n"))
+
+            ingested = await run_in_threadpool(ingestor.close)
+            if dimensions and "table" in ingested:
+                raise ValueError("❌ Send the 'dimensions' field before the file.")
+        except ValueError as e:
+            if ingestor is not None:
+                ingestor.abort()
+            return JSONResponse(content={"error": str(e)}, status_code=400)
+
+        # Queue the analysis
+        options = {"chart_format": chart_format, "profile": profile}
+        if "table" in ingested:
+            record_ingest(ingested["stats"])
+            job_id = jobs.submit(
+                ingested["table"], analysis_type, digest=ingested["digest"],
+                input_bytes=ingested["stats"]["bytes"], **options,
             )
+        else:
+            if dimensions:
+                options.update(dimensions=dimensions, top_n=top_n)
+            job_id = jobs.submit(ingested["path"], analysis_type, cleanup=True, sheet=sheet, header_row=header_row,
+                                 **options)
 
-        # Save the uploaded file
-        with open(upload_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        return JSONResponse(
+            content={
+                "job_id": job_id,
+                "status_url": f"/jobs/{job_id}",
+                "result_url": f"/jobs/{job_id}/result",
+            },
+            status_code=202,
+        )
+
+    except QueueFullError as e:
+        if ingestor is not None:
+            ingestor.abort()
+        return JSONResponse(content={"error": str(e)}, status_code=429, headers={"Retry-After": "10"})
+    except Exception as e:
+        if ingestor is not None:
+            ingestor.abort()
+        return JSONResponse(content={"error": str(e)}, status_code=500)
 
-        # Analyze the uploaded file
-        result = analyze_data(upload_path, analysis_type=analysis_type)
+
+@app.post("/analyze")
+@app.post("/analyze/", include_in_schema=False)
+async def analyze_upload(request: Request):
+    """
+    Return an upload's metrics as JSON in the response itself.
+
+    Nothing is drawn or written: only the totals, margin, insights,
+    per-period series and forecasts come back. The analysis runs on the job
+    workers and counts against the job queue (429 when it is full). Takes
+    the /upload fields apart from chart_format and profile; "report_type"
+    (as sent by the upload form) is accepted for "analysis_type".
+    """
+    ingestor = None
+    try:
+        if jobs.is_full():
+            return JSONResponse(
+                content={"error": "❌ Server is busy. Please retry shortly."},
+                status_code=429,
+                headers={"Retry-After": "10"},
+            )
+        try:
+            fields, ingestor = await stream_upload(request)
+            analysis_type = parse_report_types(
+                fields.get("analysis_type") or fields.get("report_type") or "monthly")
+            sheet = fields.get("sheet") or None
+            header_row = parse_header_row(fields.get("header_row"))
+            dimensions = parse_dimensions(fields.get("dimensions"))
+            top_n = parse_top_n(fields.get("top_n"))
+            ingested = await run_in_threadpool(ingestor.close)
+            if dimensions and "table" in ingested:
+                raise ValueError("❌ Send the 'dimensions' field before the file.")
+            if "table" in ingested:
+                record_ingest(ingested["stats"])
+                result = await asyncio.wrap_future(jobs.call(
+                    analyze_metrics, ingested["table"], analysis_type, digest=ingested["digest"],
+                    input_bytes=ingested["stats"]["bytes"],
+                ))
+            else:
+                try:
+                    result = await asyncio.wrap_future(jobs.call(
+                        analyze_metrics, ingested["path"], analysis_type, sheet=sheet, header_row=header_row,
+                        dimensions=dimensions, top_n=top_n,
+                    ))
+                finally:
+                    ingestor.abort()
+            if "error" in result:
+                raise ValueError(result["error"])
+        except ValueError as e:
+            if ingestor is not None:
+                ingestor.abort()
+            return JSONResponse(content={"error": str(e)}, status_code=400)
 
         return JSONResponse(
             content={
-                "pdf_report": result.get("pdf_report", ""),
-                "chart_image": result.get("chart_image", ""),
-                "summary": result.get("summary", "✅ Analysis completed successfully."),
+                "summary": result["summary"],
+                "analysis_types": result["analysis_types"],
+                "metrics": result["metrics"],
+                "dimensions": result.get("dimensions", {}),
+                "telemetry": result.get("telemetry", {}),
             }
         )
 
+    except QueueFullError as e:
+        if ingestor is not None:
+            ingestor.abort()
+        return JSONResponse(content={"error": str(e)}, status_code=429, headers={"Retry-After": "10"})
     except Exception as e:
+        if ingestor is not None:
+            ingestor.abort()
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = jobs.status(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "❌ Unknown job ID."}, status_code=404)
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = jobs.result(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "❌ Unknown job ID."}, status_code=404)
+    if job["status"] == "failed":
+        return JSONResponse(content={"job_id": job_id, "error": job["error"]}, status_code=500)
+    if job["status"] != "done":
+        return JSONResponse(content={"job_id": job_id, "status": job["status"]}, status_code=202)
+
+    result = job["result"]
+    chart_images = result.get("chart_images", {})
+    return JSONResponse(
+        content={
+            "job_id": job_id,
+            "pdf_url": _artifact_url(job_id, result.get("pdf_report")),
+            "chart_urls": {name: _artifact_url(job_id, path) for name, path in chart_images.items()},
+            "pdf_report": result.get("pdf_report", ""),
+            "chart_image": result.get("chart_image", ""),
+            "chart_images": chart_images,
+            "chart_timings": result.get("chart_timings", {}),
+            "summary": result.get("summary", "✅ Analysis completed successfully."),
+            "metrics": result.get("metrics", {}),
+            "dimensions": result.get("dimensions", {}),
+            "telemetry": result.get("telemetry", {}),
+        }
+    )
+
+
+def _artifact_url(job_id, path):
+    return f"/jobs/{job_id}/artifacts/{os.path.basename(path)}" if path else ""
+
+
+@app.api_route("/jobs/{job_id}/artifacts/{name}", methods=["GET", "HEAD"])
+async def job_artifact(job_id: str, name: str, request: Request):
+    """
+    Stream a finished job's PDF or chart.
+
+    Supports Range requests (so downloads can resume) and a content-hashed
+    ETag: a matching If-None-Match gets 304 with no body. Artifacts removed
+    by the sweeper answer 404.
+    """
+    path = jobs.artifact(job_id, name)
+    try:
+        stat_result = os.stat(path) if path else None
+    except OSError:
+        stat_result = None
+    if stat_result is None:
+        return JSONResponse(content={"error": "❌ Unknown or expired artifact."}, status_code=404)
+
+    etag = await run_in_threadpool(artifact_etag, path, stat_result)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers, filename=name, stat_result=stat_result,
+                        content_disposition_type="inline")
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage timings, rows, bytes and peak memory per job in the Prometheus text format."""
+    metrics.set("jobs_pending", jobs.pending_count(), "Jobs queued or running.")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/batch")
+async def start_batch(request: Request):
+    """
+    Analyse every file in a directory or glob under BATCH_ROOT in the background.
+
+    The JSON body holds "path" (directory or glob, relative to BATCH_ROOT)
+    and optionally "analysis_type", "chart_format", "force", "dimensions"
+    and "top_n". Only one batch runs at a time; its files are analysed by
+    the job workers, and it is refused (429) while the job queue is full.
+    """
+    try:
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError("❌ Expected a JSON object.")
+        analysis_type = parse_report_types(body.get("analysis_type", "monthly"))
+        chart_format = str(body.get("chart_format", CHART_FORMAT)).lower()
+        if chart_format not in CHART_FORMATS:
+            raise ValueError(f"❌ Invalid chart format. Choose from: {', '.join(CHART_FORMATS)}")
+        dimensions = parse_dimensions(body.get("dimensions"))
+        top_n = parse_top_n(body.get("top_n"))
+        batch_id = batches.submit(body.get("path"), analysis_type, chart_format, bool(body.get("force", False)),
+                                  dimensions, top_n)
+    except QueueFullError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=429, headers={"Retry-After": "60"})
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    return JSONResponse(content={"batch_id": batch_id, "status_url": f"/batch/{batch_id}"}, status_code=202)
+
+
+@app.get("/batch/{batch_id}")
+async def batch_status(batch_id: str):
+    batch = batches.status(batch_id)
+    if batch is None:
+        return JSONResponse(content={"error": "❌ Unknown batch ID."}, status_code=404)
+    return batch
+
+
+@app.post("/datasets/{dataset_id}/append")
+async def append_dataset(dataset_id: str, request: Request):
+    """
+    Append an upload to a persistent dataset and return its updated metrics.
+
+    Only the new rows are aggregated; the dataset's stored period tables and
+    running statistics are updated in place, so earlier uploads are never
+    re-read. The merge runs on the job workers and counts against the job
+    queue (429 when it is full).
+    """
+    ingestor = None
+    try:
+        if jobs.is_full():
+            return JSONResponse(
+                content={"error": "❌ Server is busy. Please retry shortly."},
+                status_code=429,
+                headers={"Retry-After": "10"},
+            )
+        try:
+            validate_dataset_id(dataset_id)
+            fields, ingestor = await stream_upload(request)
+            analysis_type = parse_report_types(fields.get("analysis_type", "monthly"))
+            ingested = await run_in_threadpool(ingestor.close)
+            if "table" in ingested:
+                result = await asyncio.wrap_future(jobs.call(append_job, dataset_id, ingested["table"],
+                                                             analysis_type))
+            else:
+                try:
+                    result = await asyncio.wrap_future(jobs.call(append_job, dataset_id, ingested["path"],
+                                                                 analysis_type))
+                finally:
+                    ingestor.abort()
+        except ValueError as e:
+            if ingestor is not None:
+                ingestor.abort()
+            return JSONResponse(content={"error": str(e)}, status_code=400)
+        return result
+
+    except QueueFullError as e:
+        if ingestor is not None:
+            ingestor.abort()
+        return JSONResponse(content={"error": str(e)}, status_code=429, headers={"Retry-After": "10"})
+    except Exception as e:
+        if ingestor is not None:
+            ingestor.abort()
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/datasets/{dataset_id}")
+async def get_dataset(dataset_id: str, analysis_type: str = "monthly"):
+    try:
+        validate_dataset_id(dataset_id)
+        report_types = parse_report_types(analysis_type)
+        result = await run_in_threadpool(dataset_metrics, dataset_id, report_types)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    if result is None:
+        return JSONResponse(content={"error": "❌ Unknown dataset ID."}, status_code=404)
+    return result
+
+
 # ✅ Add this root GET route for testing
 @app.get("/")
 async def root():
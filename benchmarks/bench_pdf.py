@@ -0,0 +1,71 @@
+"""
+PDF report latency benchmark.
+
+Builds synthetic metrics with a growing number of periods and times
+write_business_report, with and without an embedded chart. The first
+report of the process is reported separately because it includes font
+registration.
+
+Usage: python -m benchmarks.bench_pdf [--periods 12 120 1200 5200] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from Release.analyzer import build_daily_table, rollup_periods, summarize_periods, chart_spec
+from Release.charts import render_line_chart
+from Release.reports import write_business_report
+
+
+def synthetic_metrics(periods, seed=0):
+    """Weekly metrics with the given number of periods, plus the chart's PNG bytes."""
+    rng = np.random.default_rng(seed)
+    days = periods * 7
+    rows = pd.DataFrame({
+        'date': pd.date_range('2000-01-04', periods=days, freq='D'),
+        'sales': rng.gamma(2.0, 500.0, days),
+        'expenses': rng.gamma(2.0, 250.0, days),
+    })
+    table = rollup_periods(build_daily_table(rows), 'weekly')
+    chart = render_line_chart(**chart_spec(table, 'weekly', fmt='png'))['data']
+    return summarize_periods(table, 'weekly'), chart
+
+
+def run(period_counts, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'report.pdf')
+        metrics, chart = synthetic_metrics(period_counts[0])
+
+        start = time.perf_counter()
+        write_business_report(path, {'weekly': metrics}, {'weekly': chart})
+        print(f"🥶 First report (includes font setup): {time.perf_counter() - start:.4f}s")
+
+        print(f"{'periods':>8} {'chart':>6} {'median s':>10} {'p95 s':>10} {'pages':>6} {'KB':>8}")
+        for count in period_counts:
+            metrics, chart = synthetic_metrics(count)
+            for charts in (None, {'weekly': chart}):
+                timings = [write_business_report(path, {'weekly': metrics}, charts) for _ in range(repeat)]
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+                with open(path, 'rb') as f:
+                    pages = f.read().count(b'/Type /Page\n')
+                print(f"{len(metrics['periods']):>8} {'yes' if charts else 'no':>6} "
+                      f"{statistics.median(timings):>10.4f} {p95:>10.4f} {pages:>6} "
+                      f"{os.path.getsize(path) / 1024:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure PDF report generation latency.")
+    parser.add_argument('--periods', type=int, nargs='+', default=[12, 120, 1200, 5200])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.periods, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
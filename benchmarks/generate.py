@@ -0,0 +1,147 @@
+"""
+Synthetic sales/expense data for benchmarks.
+
+Rows are produced in chunks and appended to the output file, so anything
+from 10k to 50M rows can be written without holding the data in memory.
+Dates run in order across the requested span, the way exported sales
+ledgers usually look.
+
+Usage: python -m benchmarks.generate --rows 1000000 --format csv parquet
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ('csv', 'xlsx', 'json', 'jsonl', 'parquet')
+EXTENSIONS = {'csv': 'csv', 'xlsx': 'xlsx', 'json': 'json', 'jsonl': 'json', 'parquet': 'parquet'}
+CHUNK_ROWS = 500_000
+# One sheet holds 1,048,576 rows including the header.
+XLSX_MAX_ROWS = 1_048_575
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+PRODUCTS = [f'Product {letter}' for letter in 'ABCDEFGH']
+REGIONS = ['North', 'South', 'East', 'West']
+
+
+def generate_chunks(rows, seed=0, start='2018-01-01', days=5 * 365, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames (Date, Product, Region, Sales, Expenses, Customers) totalling rows."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(start, 'D')
+    for offset in range(0, rows, chunk_rows):
+        count = min(chunk_rows, rows - offset)
+        position = np.arange(offset, offset + count)
+        dates = start + (position * days // max(rows, 1)).astype('timedelta64[D]')
+        sales = np.round(rng.gamma(2.0, 250.0, count), 2)
+        yield pd.DataFrame({
+            'Date': dates,
+            'Product': np.asarray(PRODUCTS)[rng.integers(0, len(PRODUCTS), count)],
+            'Region': np.asarray(REGIONS)[rng.integers(0, len(REGIONS), count)],
+            'Sales': sales,
+            'Expenses': np.round(sales * rng.uniform(0.3, 0.8, count), 2),
+            'Customers': rng.poisson(20, count),
+        })
+
+
+def _text_dates(chunk, date_format):
+    chunk = chunk.copy()
+    if date_format == 'iso':
+        chunk['Date'] = np.datetime_as_string(chunk['Date'].to_numpy(dtype='datetime64[D]'))
+    else:
+        chunk['Date'] = chunk['Date'].dt.strftime(date_format)
+    return chunk
+
+
+def write_dataset(path, rows, fmt, seed=0, date_format='iso', chunk_rows=CHUNK_ROWS):
+    """
+    Write a synthetic dataset to path and return the path.
+
+    fmt is one of FORMATS: 'json' writes an array of records and 'jsonl'
+    one record per line. date_format is 'iso' or a strftime pattern used for
+    the text formats; Excel and Parquet store real dates.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"❌ Unsupported format '{fmt}'. Choose from: {', '.join(FORMATS)}")
+    if fmt == 'xlsx' and rows > XLSX_MAX_ROWS:
+        raise ValueError(f"❌ Excel sheets hold at most {XLSX_MAX_ROWS:,} rows.")
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    chunks = generate_chunks(rows, seed, chunk_rows=chunk_rows)
+
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    elif fmt == 'xlsx':
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Sales')
+        sheet.append(['Date', 'Product', 'Region', 'Sales', 'Expenses', 'Customers'])
+        for chunk in chunks:
+            chunk = chunk.assign(Date=chunk['Date'].dt.date)
+            for row in chunk.itertuples(index=False):
+                sheet.append(list(row))
+        workbook.save(tmp_path)
+    else:
+        with open(tmp_path, 'w', newline='') as f:
+            if fmt == 'json':
+                f.write('[')
+            for index, chunk in enumerate(chunks):
+                chunk = _text_dates(chunk, date_format)
+                if fmt == 'csv':
+                    chunk.to_csv(f, header=index == 0, index=False)
+                elif fmt == 'jsonl':
+                    f.write(chunk.to_json(orient='records', lines=True))
+                else:
+                    body = chunk.to_json(orient='records')[1:-1]
+                    f.write(f",\n{body}" if index else body)
+            if fmt == 'json':
+                f.write(']\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def dataset_path(rows, fmt, seed=0, date_format='iso', data_dir=DATA_DIR):
+    """Return the canonical file path for a generated dataset."""
+    tag = 'iso' if date_format == 'iso' else re.sub(r'\W', '', date_format)
+    return os.path.join(data_dir, f"sales_{rows}_s{seed}_{tag}_{fmt}.{EXTENSIONS[fmt]}")
+
+
+def ensure_dataset(rows, fmt, seed=0, date_format='iso', data_dir=DATA_DIR):
+    """Return the path of a generated dataset, writing it only if it is missing."""
+    path = dataset_path(rows, fmt, seed, date_format, data_dir)
+    if not os.path.exists(path):
+        print(f"🧪 Generating {rows:,} rows as {fmt} -> {path}")
+        write_dataset(path, rows, fmt, seed, date_format)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic sales/expense datasets.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000])
+    parser.add_argument('--format', nargs='+', default=['csv'], choices=FORMATS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--date-format', default='iso', help="'iso' or a strftime pattern, e.g. %%d/%%m/%%Y")
+    parser.add_argument('--out', default=DATA_DIR)
+    args = parser.parse_args()
+
+    written = [
+        ensure_dataset(rows, fmt, args.seed, args.date_format, args.out)
+        for rows in args.rows for fmt in args.format
+    ]
+    print(json.dumps(written, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Stage-by-stage benchmark of analyze_data.
+
+Generates (or reuses) synthetic datasets, runs the full analysis on each
+and reads the per-stage timings from the result's telemetry: read,
+preprocess (and its date_parse share), resample, chart and pdf. Medians
+are compared against the baseline stored in benchmarks/baselines.json; a
+stage that got slower than the tolerance allows, or a result that changed,
+is reported as a regression and the exit code is 1. A case without a stored
+baseline is an error (exit code 2) rather than a silent pass; record one
+with --save-baseline. The committed baseline covers the default cases (CSV,
+10k and 100k rows, monthly); its timings are from the machine noted in each
+entry, so re-record it when benchmarking on different hardware.
+
+Usage:
+    python -m benchmarks.run --rows 10000 1000000 --format csv parquet
+    python -m benchmarks.run --rows 1000000 --save-baseline
+    python -m benchmarks.run --rows 2000000 --chunked   # out-of-core mode
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks.generate import FORMATS, XLSX_MAX_ROWS, ensure_dataset
+from Release.main import analyze_data
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+# Slowdowns smaller than this many seconds are treated as noise.
+MIN_DELTA = 0.05
+
+
+def time_stages(path, analysis_type='monthly', chunked=False):
+    """Run analyze_data once without the cache and return (stage timings, result)."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        result = analyze_data(path, analysis_type, output_dir=output_dir, use_cache=False, chunked=chunked)
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    return result['telemetry']['timings'], result
+
+
+def _fingerprint(result, analysis_type):
+    metrics = result['metrics'][analysis_type]
+    return {
+        'rows': metrics['rows'],
+        'total_revenue': round(metrics['total_revenue'], 2),
+        'total_expenses': round(metrics['total_expenses'], 2),
+        'periods': len(metrics['periods']),
+    }
+
+
+def run_case(rows, fmt, repeat, analysis_type, chunked=False):
+    path = ensure_dataset(rows, fmt)
+    runs = [time_stages(path, analysis_type, chunked) for _ in range(repeat)]
+    stages = {name: statistics.median(run[0][name] for run in runs) for name in runs[0][0]}
+    return {
+        'rows': rows,
+        'format': fmt,
+        'bytes': os.path.getsize(path),
+        'stages': stages,
+        'rows_per_second': rows / stages['total'] if stages['total'] else None,
+        'check': _fingerprint(runs[0][1], analysis_type),
+    }
+
+
+def compare(case, baseline, tolerance):
+    """Return a list of regression messages for one case against its baseline."""
+    problems = []
+    if baseline['check'] != case['check']:
+        problems.append(f"result changed: {baseline['check']} -> {case['check']}")
+    for name, seconds in case['stages'].items():
+        before = baseline['stages'].get(name)
+        if before is None:
+            continue
+        if seconds > before * (1 + tolerance) and seconds - before > MIN_DELTA:
+            problems.append(f"{name} {before:.3f}s -> {seconds:.3f}s (+{(seconds / before - 1) * 100:.0f}%)")
+    return problems
+
+
+def _print_case(case, baseline):
+    stages = case['stages']
+    line = ' '.join(f"{name}={seconds:.3f}s" for name, seconds in stages.items())
+    print(f"⏱️ {case['format']:>7} {case['rows']:>11,} rows: {line} "
+          f"({case['rows_per_second']:,.0f} rows/s)")
+    if baseline:
+        deltas = ' '.join(
+            f"{name}={(stages[name] / before - 1) * 100:+.0f}%"
+            for name, before in baseline['stages'].items() if name in stages and before
+        )
+        print(f"   vs baseline: {deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analyze_data stage by stage.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--format', nargs='+', default=['csv'], choices=FORMATS)
+    parser.add_argument('--analysis-type', default='monthly')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--chunked', action='store_true', help="force the out-of-core (chunked) mode")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown per stage (0.25 = 25%%)")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    results, regressions, missing = {}, {}, []
+    for fmt in args.format:
+        for rows in args.rows:
+            if fmt == 'xlsx' and rows > XLSX_MAX_ROWS:
+                print(f"⚠️ Skipping xlsx with {rows:,} rows (sheet limit).")
+                continue
+            key = f"{fmt}-{rows}-{args.analysis_type}" + ("-chunked" if args.chunked else "")
+            case = run_case(rows, fmt, args.repeat, args.analysis_type, args.chunked)
+            results[key] = case
+            _print_case(case, baselines.get(key))
+            if args.save_baseline:
+                continue
+            if key not in baselines:
+                missing.append(key)
+                continue
+            problems = compare(case, baselines[key], args.tolerance)
+            if problems:
+                regressions[key] = problems
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        recorded = {'recorded_at': datetime.now().isoformat(timespec='seconds'), 'machine': platform.platform()}
+        baselines.update({key: dict(case, **recorded) for key, case in results.items()})
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if regressions:
+        for key, problems in regressions.items():
+            for problem in problems:
+                print(f"❌ {key}: {problem}")
+        return 1
+    if missing:
+        print(f"❌ No baseline stored in {args.baseline} for: {', '.join(missing)}. "
+              f"Record one with --save-baseline.")
+        return 2
+    print("✅ No regressions against the baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
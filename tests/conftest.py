@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep the result cache of test runs (and of the workers they spawn) out of the working tree
+os.environ.setdefault("RESULT_CACHE_DIR", tempfile.mkdtemp(prefix="analyzer-test-cache-"))
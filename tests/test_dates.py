@@ -0,0 +1,51 @@
+"""
+Vectorized date parsing against the per-value pd.to_datetime it replaced.
+"""
+import warnings
+
+import pandas as pd
+import pytest
+
+from Release.analyzer import detect_date_formats, parse_dates
+
+MIXED = ['2023-01-05', '2023-01-06T10:00', '01/07/2023', 'Jan 8, 2023', '9 January 2023',
+         'n/a', '', None, '2023-02-30']
+DAY_FIRST = ['13/01/2023', '14/01/2023', '25/12/2023', '31/03/2023']
+MONTH_FIRST = ['01/13/2023', '02/14/2023', '12/25/2023', '03/31/2023']
+
+
+def baseline(values):
+    """What preprocessing did before: pd.to_datetime on each value on its own."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return pd.to_datetime(values.map(lambda value: pd.to_datetime(value, errors='coerce')))
+
+
+@pytest.mark.parametrize("values", [MIXED, DAY_FIRST, MONTH_FIRST, MIXED * 200],
+                         ids=["mixed", "day-first", "month-first", "mixed-large"])
+def test_parse_dates_matches_the_per_value_baseline(values):
+    column = pd.Series(values, dtype=object)
+    parsed, stats = parse_dates(column)
+    pd.testing.assert_series_equal(parsed, baseline(column), check_names=False)
+    assert stats['parsed'] + stats['dropped'] == len(column)
+    assert stats['parsed'] == baseline(column).notna().sum()
+
+
+def test_detects_day_first_and_month_first_columns():
+    assert detect_date_formats(pd.Series(DAY_FIRST)) == ['%d/%m/%Y']
+    assert detect_date_formats(pd.Series(MONTH_FIRST)) == ['%m/%d/%Y']
+
+
+def test_ambiguous_dates_follow_the_columns_order():
+    # Per value, 05/02 would be read month-first; the rest of the column says day-first
+    column = pd.Series(DAY_FIRST + ['05/02/2023'])
+    parsed, stats = parse_dates(column)
+    assert parsed.iloc[-1] == pd.Timestamp('2023-02-05')
+    assert stats['formats'] == {'%d/%m/%Y': 5}
+
+
+def test_unparseable_rows_are_counted_as_dropped():
+    column = pd.Series(['2023-01-01', 'not a date', '', None, '2023-13-45'], dtype=object)
+    parsed, stats = parse_dates(column)
+    assert parsed.notna().tolist() == [True, False, False, False, False]
+    assert (stats['rows'], stats['parsed'], stats['dropped']) == (5, 1, 4)
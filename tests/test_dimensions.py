@@ -0,0 +1,59 @@
+"""
+Per-store / product rankings: the top_n values and the 'other' line.
+"""
+import pandas as pd
+import pytest
+
+from Release.analyzer import build_dimension_table, dimension_appendix, summarize_dimensions
+
+
+@pytest.fixture
+def rows():
+    """Two months of sales for stores A-E (A sells most) plus rows without a store."""
+    sales = {'A': 50.0, 'B': 40.0, 'C': 30.0, 'D': 20.0, 'E': 10.0}
+    records = [
+        {'date': pd.Timestamp(day), 'store': store, 'sales': amount, 'expenses': amount / 2}
+        for day in ('2023-01-05', '2023-01-20', '2023-02-10') for store, amount in sales.items()
+    ]
+    # In February E outsells everyone
+    records.append({'date': pd.Timestamp('2023-02-11'), 'store': 'E', 'sales': 500.0, 'expenses': 100.0})
+    records.append({'date': pd.Timestamp('2023-01-06'), 'store': None, 'sales': 5.0, 'expenses': 0.0})
+    return pd.DataFrame(records)
+
+
+def test_daily_table_sums_every_value(rows):
+    table = build_dimension_table(rows, ['store'])
+    totals = table.groupby('value', observed=True)[['sales', 'rows']].sum()
+    assert totals.loc['E'].tolist() == [530.0, 4]
+    assert totals.loc['(blank)'].tolist() == [5.0, 1]
+    assert table['sales'].sum() == rows['sales'].sum()
+
+
+def test_top_n_and_the_other_line(rows):
+    summary = summarize_dimensions(build_dimension_table(rows, ['store']), 'monthly', top_n=2)['store']
+    assert summary['values'] == 6
+    assert [(entry['rank'], entry['value']) for entry in summary['top']] == [(1, 'E'), (2, 'A')]
+    other = summary['other']
+    assert (other['values'], other['sales'], other['rows']) == (4, 275.0, 10)
+    assert other['share'] + sum(entry['share'] for entry in summary['top']) == pytest.approx(100.0)
+
+    january, february = summary['periods']
+    assert [entry['value'] for entry in january['top']] == ['A', 'B']
+    assert [entry['value'] for entry in february['top']] == ['E', 'A']
+    assert january['other']['values'] == 4 and january['other']['sales'] == 125.0
+
+
+def test_no_other_line_when_every_value_is_ranked(rows):
+    summary = summarize_dimensions(build_dimension_table(rows, ['store']), 'monthly', top_n=10)['store']
+    assert len(summary['top']) == 6 and summary['other'] is None
+    assert all(period['other'] is None for period in summary['periods'])
+
+
+def test_appendix_lists_the_other_line(rows):
+    sections = {'monthly': summarize_dimensions(build_dimension_table(rows, ['store']), 'monthly', top_n=2)}
+    overall, per_month = dimension_appendix(sections)
+    assert overall[2][-1] == ("Other (4 values)", "$275.00", "$140.00", "28.8%")
+    assert [row[0] for row in per_month[2]] == [
+        "2023-01-31  1. A", "2023-01-31  2. B", "2023-01-31  Other (4 values)",
+        "2023-02-28  1. E", "2023-02-28  2. A", "2023-02-28  Other (3 values)",
+    ]
@@ -0,0 +1,204 @@
+"""
+Release.excel's sheet scanner against openpyxl.
+
+Every workbook is read twice, by read_xlsx (the regex scanner) and by
+openpyxl, and the frames must match.
+"""
+import re
+import zipfile
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+from Release import excel
+from Release.excel import _columnar, read_xlsx
+from Release.utils import _projection
+
+
+# Error cells come back from openpyxl as their code; read_xlsx (like pd.read_excel) leaves them missing
+ERROR_CODES = {"#N/A", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#NULL!"}
+
+
+def pick_columns(names):
+    return _projection(names, ["auto"])[0]
+
+
+def reference(path, sheet=None, header_row=None):
+    """
+    The same sheet read through openpyxl, typed like read_xlsx's output.
+
+    The workbook is loaded in full: openpyxl's read-only mode (which
+    pd.read_excel uses) drops cells that are out of column order.
+    """
+    workbook = openpyxl.load_workbook(path, data_only=True)
+    worksheet = workbook[sheet] if isinstance(sheet, str) else workbook.worksheets[sheet or 0]
+    rows = list(worksheet.iter_rows(min_row=header_row or 1, values_only=True))
+    frame = pd.DataFrame(rows[1:], columns=[str(name) for name in rows[0]])
+    frame = frame[pick_columns(list(frame.columns))].map(
+        lambda value: None if value in ERROR_CODES else pd.Timestamp(value) if isinstance(value, datetime) else value)
+    return _columnar(frame.dropna(how="all").reset_index(drop=True))
+
+
+def missing_as_none(frame):
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def assert_same(path, sheet=None, header_row=None, reference_header_row=None):
+    scanned = read_xlsx(path, pick_columns, sheet, header_row)
+    expected = reference(path, sheet, reference_header_row or header_row)
+    pd.testing.assert_frame_equal(missing_as_none(scanned), missing_as_none(expected), check_dtype=False)
+    return scanned
+
+
+def write_workbook(path, rows, title="Sheet1", epoch=None, extra_sheets=()):
+    workbook = openpyxl.Workbook()
+    if epoch is not None:
+        workbook.epoch = epoch
+    sheet = workbook.active
+    sheet.title = title
+    for row in rows:
+        sheet.append(row)
+    for name, extra_rows in extra_sheets:
+        extra = workbook.create_sheet(name)
+        for row in extra_rows:
+            extra.append(row)
+    workbook.save(path)
+    return path
+
+
+def replace_sheet_xml(path, sheet_data):
+    """Swap the first sheet's <sheetData> for hand-written XML, keeping styles and the rest."""
+    with zipfile.ZipFile(path) as source:
+        parts = {name: source.read(name) for name in source.namelist()}
+    sheet = parts["xl/worksheets/sheet1.xml"]
+    parts["xl/worksheets/sheet1.xml"] = re.sub(rb"<sheetData>.*</sheetData>|<sheetData/>",
+                                              b"<sheetData>" + sheet_data + b"</sheetData>", sheet, flags=re.S)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as target:
+        for name, data in parts.items():
+            target.writestr(name, data)
+
+
+def date_style(path):
+    """The cell style index openpyxl gave the date cells of the first sheet."""
+    with zipfile.ZipFile(path) as source:
+        sheet = source.read("xl/worksheets/sheet1.xml")
+    return int(re.search(rb'<c r="A2" s="(\d+)"', sheet).group(1))
+
+
+SALES_ROWS = [
+    ["Date", "Sales", "Expenses", "Region"],
+    [datetime(2023, 1, 1), 100.5, 40, "North"],
+    [datetime(2023, 1, 2, 13, 45), 200, 80.25, "South & East"],
+    [datetime(2023, 2, 28), 0, None, "North"],
+    [datetime(2024, 2, 29), 1e6, 1, "Ünïcode <west>"],
+]
+
+
+def test_dates_numbers_and_shared_strings(tmp_path):
+    scanned = assert_same(write_workbook(tmp_path / "sales.xlsx", SALES_ROWS))
+    assert scanned["Date"].tolist()[1] == pd.Timestamp("2023-01-02 13:45")
+    assert scanned["Region"].tolist()[1] == "South & East"
+
+
+def test_1904_workbook(tmp_path):
+    path = write_workbook(tmp_path / "mac.xlsx", SALES_ROWS, epoch=CALENDAR_MAC_1904)
+    with zipfile.ZipFile(path) as source:
+        assert b"date1904" in source.read("xl/workbook.xml")
+    scanned = assert_same(path)
+    assert scanned["Date"].iloc[0] == pd.Timestamp("2023-01-01")
+
+
+def test_missing_cells(tmp_path):
+    rows = [
+        ["Date", "Sales", "Expenses"],
+        [datetime(2023, 1, 1), 10, 1],
+        [datetime(2023, 1, 2), None, 2],
+        [datetime(2023, 1, 3), 30, None],
+        [None, 40, 4],
+        [datetime(2023, 1, 5), 50, 5],
+    ]
+    assert_same(write_workbook(tmp_path / "sparse.xlsx", rows))
+
+
+def test_inline_strings_and_out_of_order_cells(tmp_path):
+    path = write_workbook(tmp_path / "inline.xlsx", SALES_ROWS[:2])
+    style = str(date_style(path)).encode()
+    replace_sheet_xml(path, (
+        b'<row r="1">'
+        b'<c r="B1" t="inlineStr"><is><t>Sales</t></is></c>'
+        b'<c r="A1" t="inlineStr"><is><t>Date</t></is></c>'
+        b'<c r="C1" t="str"><v>Expenses</v></c>'
+        b'<c r="D1" t="inlineStr"><is><r><t>Reg</t></r><r><t>ion</t></r></is></c>'
+        b'</row>'
+        b'<row r="2"><c r="C2"><v>4</v></c><c r="A2" s="' + style + b'"><v>44927</v></c>'
+        b'<c r="B2"><v>12.5</v></c><c r="D2" t="inlineStr"><is><t>North &amp; South</t></is></c></row>'
+        b'<row r="3"><c r="A3" s="' + style + b'"><v>44928.5</v></c><c r="B3"><v>7</v></c></row>'
+        b'<row r="5"><c r="D5" t="inlineStr"><is><t>West</t></is></c>'
+        b'<c r="A5" s="' + style + b'"><v>44930</v></c><c r="B5" t="e"><v>#N/A</v></c></row>'
+    ))
+    scanned = assert_same(path)
+    assert missing_as_none(scanned)["Region"].tolist() == ["North & South", None, "West"]
+    assert scanned["Date"].tolist()[1] == pd.Timestamp("2023-01-02 12:00")
+
+
+def test_sheets_by_name_and_index_with_header_below_title(tmp_path):
+    other = [["Report generated 2023-03-01"], [], ["Date", "Sales"], [datetime(2023, 3, 1), 5], [datetime(2023, 3, 2), 6]]
+    path = write_workbook(tmp_path / "multi.xlsx", SALES_ROWS, extra_sheets=[("Other", other)])
+    assert_same(path)
+    assert_same(path, sheet="Other", header_row=3)
+    # Auto-detection skips the title rows and finds the header on row 3
+    assert_same(path, sheet=1, reference_header_row=3)
+    with pytest.raises(ValueError, match="not found"):
+        read_xlsx(path, pick_columns, sheet="Missing")
+
+
+def prefix_sheet(path):
+    """Rewrite the first sheet with every element under an x: namespace prefix, as some exporters do."""
+    with zipfile.ZipFile(path) as source:
+        parts = {name: source.read(name) for name in source.namelist()}
+    sheet = parts["xl/worksheets/sheet1.xml"]
+    sheet = re.sub(rb"<(/?)([A-Za-z]+)(?=[\s>/])", rb"<\1x:\2", sheet)
+    parts["xl/worksheets/sheet1.xml"] = sheet.replace(b' xmlns="', b' xmlns:x="', 1)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as target:
+        for name, data in parts.items():
+            target.writestr(name, data)
+
+
+def test_namespace_prefixed_sheet_falls_back_to_openpyxl(tmp_path, capsys):
+    path = write_workbook(tmp_path / "prefixed.xlsx", SALES_ROWS)
+    prefix_sheet(path)
+    scanned = assert_same(path)
+    assert len(scanned) == len(SALES_ROWS) - 1
+    assert "Falling back to openpyxl" in capsys.readouterr().out
+
+
+def test_unusual_cells_below_the_header_fall_back(tmp_path, capsys, monkeypatch):
+    # Small blocks, so the odd row is only met after the header has been read
+    monkeypatch.setattr(excel, "READ_BLOCK_BYTES", 64)
+    path = write_workbook(tmp_path / "reordered.xlsx", SALES_ROWS[:2])
+    style = str(date_style(path)).encode()
+    replace_sheet_xml(path, (
+        b'<row r="1"><c r="A1" t="inlineStr"><is><t>Date</t></is></c>'
+        b'<c r="B1" t="inlineStr"><is><t>Sales</t></is></c></row>'
+        b'<row r="2"><c r="A2" s="' + style + b'"><v>44927</v></c><c r="B2"><v>1</v></c></row>'
+        # Attributes in another order: the fast scanner's patterns would skip this row
+        b'<row r="3"><c s="' + style + b'" r="A3"><v>44928</v></c><c r="B3"><v>2</v></c></row>'
+    ))
+    scanned = read_xlsx(path, pick_columns, header_row=1)
+    assert "Falling back to openpyxl" in capsys.readouterr().out
+    assert scanned["Sales"].tolist() == [1, 2]
+
+
+def test_iso_date_cells(tmp_path):
+    path = write_workbook(tmp_path / "iso.xlsx", SALES_ROWS[:2])
+    replace_sheet_xml(path, (
+        b'<row r="1"><c r="A1" t="inlineStr"><is><t>Date</t></is></c>'
+        b'<c r="B1" t="inlineStr"><is><t>Sales</t></is></c></row>'
+        b'<row r="2"><c r="A2" t="d"><v>2023-01-05T00:00:00</v></c><c r="B2"><v>3</v></c></row>'
+        b'<row r="3"><c r="A3" t="d"><v>2023-01-06T12:30:00</v></c><c r="B3"><v>4</v></c></row>'
+    ))
+    scanned = assert_same(path)
+    assert scanned["Date"].tolist() == [pd.Timestamp("2023-01-05"), pd.Timestamp("2023-01-06 12:30")]
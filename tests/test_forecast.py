@@ -0,0 +1,70 @@
+"""
+Forecasts: model choice, horizon length and warm starts from cached parameters.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from Release.forecast import forecast_matrix, forecast_report, horizon_for
+
+
+def monthly(values, start='2020-01-31'):
+    index = pd.date_range(start, periods=len(values), freq='ME', name='date')
+    return pd.DataFrame({'sales': np.asarray(values, dtype=float)}, index=index)
+
+
+def seasonal(periods=48, seed=0):
+    """Monthly sales with a strong yearly cycle and a little noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(periods)
+    return 1000 + 5 * t + 400 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 10, periods)
+
+
+def test_auto_picks_the_model_with_the_lower_holdout_error():
+    t = np.arange(48)
+    # A season on a level that jumps: only Holt-Winters follows the new level
+    shifted = seasonal() - 5 * t + np.where(t < 30, 0, 600)
+    trend = 500 + 20 * t + np.random.default_rng(1).normal(0, 5, 48)
+    fitted = forecast_matrix(np.vstack([shifted, trend]), 12, 6, model='auto')
+    assert fitted['model'] == ['holt_winters', 'linear']
+    assert fitted['mean'].shape == (2, 6)
+    assert np.isfinite(fitted['params'][0]).all() and np.isnan(fitted['params'][1]).all()
+
+
+def test_short_history_falls_back_to_linear():
+    fitted = forecast_matrix(seasonal(periods=18)[None, :], 12, 3, model='holt_winters')
+    assert fitted['model'] == ['linear']
+
+
+@pytest.mark.parametrize("report_type, expected", [("monthly", 12), ("weekly", 52), ("quarterly", 4), ("yearly", 1)])
+def test_horizon_is_converted_to_report_periods(report_type, expected):
+    assert horizon_for(report_type, horizon=12, frequency='monthly') == expected
+
+
+def test_report_forecasts_horizon_periods_after_the_last_complete_one():
+    table = monthly(seasonal(periods=36, seed=2))
+    forecast = forecast_report(table, 'monthly', last_day=pd.Timestamp('2022-12-15'), horizon=6, use_cache=False)
+    # December 2022 is still in progress, so the forecast starts there
+    assert forecast['horizon'] == 6 and len(forecast['periods']) == 6
+    assert forecast['periods'][0]['period'] == '2022-12-31'
+    assert all(p['lower'] <= p['sales'] <= p['upper'] for p in forecast['periods'])
+
+
+def test_second_upload_warm_starts_from_cached_parameters():
+    table = monthly(seasonal(periods=48, seed=3))
+    first = forecast_report(table, 'monthly', horizon=12, model='holt_winters')
+    # The next upload of the dataset has the same first periods and two more months
+    grown = monthly(np.append(table['sales'].to_numpy(), seasonal(periods=50, seed=3)[48:]))
+    second = forecast_report(grown, 'monthly', horizon=12, model='holt_winters')
+    assert not first['warm_start'] and second['warm_start']
+    assert second['model'] == first['model'] == 'holt_winters'
+
+
+def test_warm_start_searches_around_the_cached_parameters():
+    Y = seasonal()[None, :]
+    cold = forecast_matrix(Y, 12, 6, model='holt_winters')
+    warm = forecast_matrix(Y, 12, 6, model='holt_winters',
+                           warm=[{'model': 'holt_winters', 'params': cold['params'][0].tolist()}])
+    assert warm['warm'] == 1
+    assert np.abs(warm['params'][0] - cold['params'][0]).max() <= 0.05 + 1e-12
+    np.testing.assert_allclose(warm['mean'], cold['mean'], rtol=0.05)
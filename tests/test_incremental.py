@@ -0,0 +1,54 @@
+"""
+Datasets grown by appends against a full analysis of all their rows.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from Release.analyzer import REPORT_TYPES, build_period_table, summarize_periods
+from Release.incremental import append_to_dataset, dataset_metrics
+
+STD_KEYS = ('std_dev', 'row_std_dev')
+
+
+@pytest.fixture
+def rows():
+    """Preprocessed rows over a year, with whole amounts so every sum is exact."""
+    rng = np.random.default_rng(11)
+    count = 3_000
+    sales = rng.integers(0, 900, count).astype(float)
+    return pd.DataFrame({
+        'date': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365, count), unit='D'),
+        'sales': sales,
+        'expenses': (sales * rng.uniform(0.2, 0.9, count)).round(),
+    })
+
+
+def batches(rows):
+    """Appends that start mid-year, then reach later, earlier and back over days already stored."""
+    month = rows['date'].dt.month
+    return [rows[month.between(4, 8)], rows[month.between(7, 12)], rows[month.between(1, 5)],
+            rows.sample(200, random_state=3)]
+
+
+def assert_same_metrics(actual, expected):
+    for key in STD_KEYS:
+        assert actual.pop(key) == pytest.approx(expected.pop(key), rel=1e-9)
+    assert actual == expected
+
+
+def test_appends_match_a_full_reanalysis(rows, tmp_path):
+    parts = batches(rows)
+    seen = []
+    for part in parts:
+        seen.append(part)
+        result = append_to_dataset("shop", part, REPORT_TYPES, root=str(tmp_path))
+        assert result['appended_rows'] == len(part)
+        everything = pd.concat(seen)
+        for report_type in REPORT_TYPES:
+            expected = summarize_periods(build_period_table(everything, report_type), report_type)
+            assert_same_metrics(result['metrics'][report_type], expected)
+
+    stored = dataset_metrics("shop", ['monthly'], root=str(tmp_path))['metrics']['monthly']
+    assert stored['rows'] == sum(len(part) for part in parts)
+    assert_same_metrics(stored, summarize_periods(build_period_table(pd.concat(parts), 'monthly'), 'monthly'))
@@ -0,0 +1,47 @@
+"""
+JobManager admission control for untracked tasks and API batches.
+"""
+import os
+import shutil
+import time
+
+import pytest
+
+from Release.batch import analyze_batch
+from Release.jobs import JobManager, QueueFullError
+
+SALES_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "sales_data.csv")
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    manager = JobManager(max_workers=1, max_pending=2, jobs_dir=str(tmp_path / "jobs"))
+    yield manager
+    manager.shutdown()
+
+
+def test_run_tasks_hold_queue_slots(jobs):
+    first, second = jobs.run(time.sleep, 0.5), jobs.run(time.sleep, 0.5)
+    assert jobs.pending_count() == 2 and jobs.is_full()
+    with pytest.raises(QueueFullError):
+        jobs.run(time.sleep, 0)
+    first.result(), second.result()
+    time.sleep(0.1)
+    assert jobs.pending_count() == 0
+
+
+def test_api_batch_queues_one_file_per_worker(jobs, tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for index in range(3):
+        shutil.copy(SALES_CSV, data / f"store_{index}.csv")
+    seen = []
+
+    def submit(*args):
+        seen.append(jobs.pending_count())
+        return jobs.run(*args)
+
+    summary = analyze_batch(str(data), output_dir=str(tmp_path / "batch"), submit=submit, window=1)
+    assert summary["analysed"] == 3
+    # Every file waited for the previous one, leaving the other queue slot to uploads
+    assert len(seen) == 3 and max(seen) <= 1
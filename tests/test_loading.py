@@ -0,0 +1,64 @@
+"""
+Telling JSON-lines from JSON documents, on disk and in streamed uploads.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from Release.main import analyze_metrics
+from Release.streaming import UploadIngestor
+from Release.utils import detect_format, is_json_lines, load_file
+
+SALES_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "sales_data.csv")
+
+
+@pytest.fixture
+def sales():
+    return pd.read_csv(SALES_CSV)
+
+
+def stream(path, spool_dir, chunk_size=64):
+    ingestor = UploadIngestor(os.path.basename(path), spool_dir=str(spool_dir))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            ingestor.feed(chunk)
+    return ingestor.close()
+
+
+@pytest.mark.parametrize("head, expected", [
+    (b'{"date": "2023-01-01", "sales": 1}\n{"date": "2023-01-02", "sales": 2}\n', True),
+    (b'{"date": "2023-01-01", "sales": 1}\n', False),
+    (b'{"Date":{"0":"2023-01-01","1":"2023-01-02"},"Sales":{"0":1,"1":2}}', False),
+    (b'{\n  "date": "2023-01-01",\n  "sales": 1\n}\n', False),
+    (b'[{"date": "2023-01-01", "sales": 1}]', False),
+])
+def test_is_json_lines(head, expected):
+    assert is_json_lines(head) is expected
+
+
+def test_column_oriented_json_reads_every_row(sales, tmp_path):
+    path = tmp_path / "sales.json"
+    sales.to_json(path)
+    assert detect_format(str(path)) == "json"
+    assert len(load_file(str(path))) == len(sales)
+
+    ingested = stream(str(path), tmp_path / "spool")
+    assert "path" in ingested
+    result = analyze_metrics(ingested["path"], "monthly", use_cache=False)
+    assert result["metrics"]["monthly"]["rows"] == len(sales)
+
+
+def test_json_lines_upload_streams(sales, tmp_path):
+    path = tmp_path / "sales.json"
+    sales.to_json(path, orient="records", lines=True)
+    assert detect_format(str(path)) == "jsonl"
+    ingested = stream(str(path), tmp_path / "spool")
+    assert int(ingested["table"]["rows"].sum()) == len(sales)
+
+
+def test_no_parseable_rows_is_an_error(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("Date,Sales\nnot a date,1\nnor this,2\n")
+    result = analyze_metrics(str(path), "monthly", use_cache=False)
+    assert result["error"].startswith("❌ No valid rows")
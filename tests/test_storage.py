@@ -0,0 +1,165 @@
+"""
+Artifact retention: the sweeper, ETags and the result cache's restored files.
+"""
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as api
+from Release.batch import BatchRunner
+from Release.cache import ResultCache
+from Release.storage import ArtifactSweeper, artifact_etag, etag_matches, sweep_directory
+
+DAY = 24 * 3600
+
+
+def write_file(path, size=10, age=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return str(path)
+
+
+def cached_report(tmp_path, age=0):
+    """Store a one-PDF result in a fresh cache and age its files by age seconds."""
+    cache = ResultCache(root=str(tmp_path / "cache"))
+    pdf = write_file(tmp_path / "run" / "business_analysis_report.pdf")
+    cache.put_result("digest", "monthly.png", {"pdf_report": pdf, "summary": "ok"})
+    stamp = time.time() - age
+    for folder, _, names in os.walk(cache.results_dir):
+        for name in names:
+            os.utime(os.path.join(folder, name), (stamp, stamp))
+    return cache
+
+
+def test_restored_artifacts_outlive_an_old_cache_entry(tmp_path):
+    cache = cached_report(tmp_path, age=2 * DAY)
+    jobs_dir = tmp_path / "jobs"
+    result = cache.get_result("digest", "monthly.png", str(jobs_dir / "job"))
+    sweep_directory(str(jobs_dir), max_age=DAY, max_bytes=10 ** 9)
+    assert os.path.exists(result["pdf_report"])
+
+
+def test_cached_artifacts_survive_a_rewrite_of_the_run_directory(tmp_path):
+    cache = cached_report(tmp_path)
+    # A later run into the same folder (as batch runs do) rewrites the file in place
+    with open(tmp_path / "run" / "business_analysis_report.pdf", "wb") as f:
+        f.write(b"new content")
+    result = cache.get_result("digest", "monthly.png", str(tmp_path / "run"))
+    with open(result["pdf_report"], "rb") as f:
+        assert f.read() == b"x" * 10
+
+
+def test_sweep_keeps_the_state_and_latest_outputs_of_a_batch(tmp_path):
+    batch_dir = tmp_path / "batch"
+    source, gone = write_file(tmp_path / "data" / "a.csv"), str(tmp_path / "data" / "gone.csv")
+    kept_report = write_file(batch_dir / "files" / "a" / "report.pdf", age=2 * DAY)
+    stale_report = write_file(batch_dir / "files" / "gone" / "report.pdf", age=2 * DAY)
+    consolidated = write_file(batch_dir / "consolidated" / "report.pdf", age=2 * DAY)
+    state = {source: {"output_dir": str(batch_dir / "files" / "a")},
+             gone: {"output_dir": str(batch_dir / "files" / "gone")}}
+    state_file = write_file(batch_dir / "batch_state.json")
+    with open(state_file, "w") as f:
+        json.dump(state, f)
+    os.utime(state_file, (time.time() - 2 * DAY,) * 2)
+
+    runner = BatchRunner(output_dir=str(batch_dir))
+    sweep_directory(str(batch_dir), max_age=DAY, max_bytes=10 ** 9, keep=runner.active_paths())
+    assert all(os.path.exists(path) for path in (state_file, kept_report, consolidated))
+    assert not os.path.exists(stale_report)
+
+
+def test_sweep_deletes_expired_files_and_spares_kept_ones(tmp_path):
+    old = write_file(tmp_path / "run_a" / "report.pdf", age=2 * DAY)
+    kept = write_file(tmp_path / "run_b" / "report.pdf", age=2 * DAY)
+    fresh = write_file(tmp_path / "run_c" / "report.pdf", age=60)
+    result = sweep_directory(str(tmp_path), max_age=DAY, max_bytes=10 ** 9, keep=[str(tmp_path / "run_b")])
+    assert (result['files'], result['bytes'], result['remaining_bytes']) == (1, 10, 20)
+    assert not os.path.exists(old) and os.path.exists(kept) and os.path.exists(fresh)
+    # The emptied run folder goes too
+    assert not os.path.exists(tmp_path / "run_a")
+
+
+def test_quota_removes_the_oldest_files_outside_the_grace_period(tmp_path):
+    oldest = write_file(tmp_path / "a.pdf", size=100, age=3600)
+    older = write_file(tmp_path / "b.pdf", size=100, age=1800)
+    newer = write_file(tmp_path / "c.pdf", size=100, age=900)
+    writing = write_file(tmp_path / "d.pdf", size=100, age=10)
+    result = sweep_directory(str(tmp_path), max_age=DAY, max_bytes=250, grace=300)
+    assert result['files'] == 2 and result['remaining_bytes'] == 200
+    assert [os.path.exists(path) for path in (oldest, older, newer, writing)] == [False, False, True, True]
+
+    # Files still being written are never trimmed, even over the quota
+    result = sweep_directory(str(tmp_path), max_age=DAY, max_bytes=50, grace=3600)
+    assert result['files'] == 0 and result['remaining_bytes'] == 200
+
+
+def test_sweeper_leaves_files_above_the_run_depth(tmp_path):
+    reports = tmp_path / "reports"
+    tracked = write_file(reports / "readme.pdf", age=2 * DAY)
+    run = write_file(reports / "2023-01-01" / "run" / "report.pdf", age=2 * DAY)
+    sweeper = ArtifactSweeper(roots=[(str(reports), 2), str(tmp_path / "missing")], max_age=DAY)
+    results = sweeper.sweep()
+    assert [result['files'] for result in results] == [1, 0]
+    assert os.path.exists(tracked) and not os.path.exists(run)
+
+
+def test_etag_follows_the_content(tmp_path):
+    first, same = write_file(tmp_path / "a.pdf"), write_file(tmp_path / "b.pdf")
+    assert artifact_etag(first) == artifact_etag(same)
+    etag = artifact_etag(first)
+    with open(first, "wb") as f:
+        f.write(b"a different report")
+    assert artifact_etag(first) != etag
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False), ("", False), ('"abc"', True), ('W/"abc"', True),
+    ('"old", "abc"', True), ('"old"', False), ("*", True),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """An API client whose job "job1" has one report."""
+    pdf = write_file(tmp_path / "job1" / "business_analysis_report.pdf", size=1000)
+    artifacts = {("job1", "business_analysis_report.pdf"): pdf}
+    monkeypatch.setattr(api.jobs, "artifact", lambda job_id, name: artifacts.get((job_id, name)))
+    return TestClient(api.app), pdf
+
+
+def test_artifact_endpoint_answers_304_for_a_matching_etag(client):
+    client, pdf = client
+    url = "/jobs/job1/artifacts/business_analysis_report.pdf"
+    response = client.get(url)
+    assert response.status_code == 200 and response.content == b"x" * 1000
+    etag = response.headers["etag"]
+    assert etag == artifact_etag(pdf)
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b"" and cached.headers["etag"] == etag
+    assert client.head(url, headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+
+    # A rewritten report gets a new tag, so the old one no longer matches
+    with open(pdf, "wb") as f:
+        f.write(b"y" * 1000)
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+
+
+def test_artifact_endpoint_serves_ranges_and_404s_swept_files(client):
+    client, pdf = client
+    url = "/jobs/job1/artifacts/business_analysis_report.pdf"
+    partial = client.get(url, headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206 and len(partial.content) == 100
+    assert client.get("/jobs/job1/artifacts/other.pdf").status_code == 404
+    os.remove(pdf)
+    assert client.get(url).status_code == 404
@@ -0,0 +1,105 @@
+"""
+Chunked and streamed aggregation against the in-memory analysis of the same file.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from Release import streaming
+from Release.analyzer import RESAMPLE_RULES, preprocess_data, rollup_periods, sample_std
+from Release.streaming import UploadIngestor, _line_blocks, _LineSplitter, aggregate_file
+
+BLOCK_BYTES = 1 << 20
+
+
+def sales_csv(path, rows=40_000):
+    """
+    Write a CSV a little over one read block, with a quoted note that spans
+    several lines across the block boundary.
+    """
+    rng = np.random.default_rng(7)
+    days = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D')
+    sales, expenses = rng.gamma(2.0, 150.0, rows).round(2), rng.gamma(2.0, 60.0, rows).round(2)
+    lines, size, placed = ["date,sales,expenses,note\n"], 25, False
+    for day, sale, expense in zip(days.strftime('%m/%d/%Y'), sales, expenses):
+        note = "ok"
+        if not placed and size > BLOCK_BYTES - 120:
+            # Line breaks every few bytes, on both sides of the block boundary
+            note, placed = '"' + "\n".join(["returned, then\nre-sold"] * 6) + '"', True
+        line = f"{day},{sale},{expense},{note}\n"
+        lines.append(line)
+        size += len(line)
+    assert placed and size > BLOCK_BYTES
+    path.write_text("".join(lines))
+    return path
+
+
+@pytest.fixture
+def chunked(monkeypatch, tmp_path):
+    """The CSV plus its chunked daily table, read in blocks of 1 MiB."""
+    monkeypatch.setattr(streaming, "MIN_CHUNK_ROWS", 1)
+    path = sales_csv(tmp_path / "sales.csv")
+    ingested = aggregate_file(str(path), memory_budget=1)
+    assert ingested["stats"]["chunks"] > 1
+    return path, ingested["table"].set_index("date")
+
+
+@pytest.mark.parametrize("report_type", ["weekly", "monthly", "quarterly"])
+def test_chunked_periods_match_the_in_memory_analysis(chunked, report_type):
+    path, daily = chunked
+    rows = preprocess_data(pd.read_csv(path))
+    expected = rows.resample(RESAMPLE_RULES[report_type], on="date")["sales"].agg(["sum", "size", "std"])
+    periods = rollup_periods(daily, report_type)
+
+    assert periods["rows"].sum() == len(rows) == 40_000
+    pd.testing.assert_series_equal(periods["rows"], expected["size"], check_names=False, check_dtype=False)
+    pd.testing.assert_series_equal(periods["sales"], expected["sum"], check_names=False, check_freq=False)
+    stds = [sample_std(*values) for values in periods[["sales", "sales_sq", "rows"]].itertuples(index=False)]
+    np.testing.assert_allclose(stds, expected["std"], rtol=1e-9)
+
+
+def test_streamed_upload_matches_the_chunked_table(chunked, tmp_path):
+    path, daily = chunked
+    ingestor = UploadIngestor("sales.csv", spool_dir=str(tmp_path / "spool"))
+    with open(path, "rb") as f:
+        # 64 KiB feeds: one of them ends inside the quoted note at the 1 MiB mark
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            ingestor.feed(chunk)
+    streamed = ingestor.close()["table"].set_index("date")
+    pd.testing.assert_frame_equal(streamed, daily)
+
+
+def test_quotes_are_carried_across_pushes():
+    lines = _LineSplitter(quoted=True)
+    assert lines.push(b'date,note\n2023-01-01,"two\n') == b'date,note\n'
+    assert lines.push(b'lines"\n2023-01-02,"open') == b'2023-01-01,"two\nlines"\n'
+    assert lines.push(b'\nstill open\n') == b''
+    assert lines.push(b'"\n') == b'2023-01-02,"open\nstill open\n"\n'
+    assert lines.rest() == b''
+
+
+def test_a_stray_quote_does_not_hold_back_the_rest_of_the_file(tmp_path):
+    rows = ["date,sales,note", '2023-01-01,5,12" pizza'] + [f"2023-01-02,{i},ok" for i in range(20_000)]
+    path = tmp_path / "stray.csv"
+    path.write_text("\n".join(rows) + "\n")
+
+    lines = _LineSplitter(quoted=True, max_bytes=64 * 1024)
+    with open(path, "rb") as f:
+        blocks = [lines.push(chunk) for chunk in iter(lambda: f.read(4096), b"")] + [lines.rest()]
+        assert len(lines._buffer) == 0
+    assert b"".join(blocks) == path.read_bytes()
+    assert max(len(block) for block in blocks) <= 64 * 1024 + 4096
+
+    assert sum(block.count(b"\n") for block in _line_blocks(str(path), 4096, quoted=True)) == len(rows)
+
+
+def test_a_stray_quote_in_an_upload_keeps_every_row(monkeypatch, tmp_path):
+    monkeypatch.setattr(streaming, "MAX_RECORD_BYTES", 64 * 1024)
+    rows = ["date,sales,note", '2023-01-01,5,12" pizza'] + [f"2023-01-02,1,ok" for _ in range(20_000)]
+    ingestor = UploadIngestor("stray.csv", spool_dir=str(tmp_path / "spool"))
+    body = ("\n".join(rows) + "\n").encode()
+    for start in range(0, len(body), 4096):
+        ingestor.feed(body[start:start + 4096])
+        assert len(ingestor._lines._buffer) <= 64 * 1024 + 4096
+    table = ingestor.close()["table"]
+    assert table["rows"].tolist() == [1, 20_000] and table["sales"].tolist() == [5.0, 20_000.0]